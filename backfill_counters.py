@@ -0,0 +1,48 @@
+"""Rebuild the aggregate docs the services maintain on write from the records they summarize.
+
+Run once after deploying the change that introduced an aggregate, so history written before it is included:
+
+    python backfill_counters.py analytics history
+
+Each backfill overwrites its aggregates from a full read, so rerunning it is safe.
+"""
+import argparse
+import asyncio
+
+from config.firebase_config import initialize_firebase, close_db
+from services.analytics_service import AnalyticsService
+from services.history_service import HistoryService
+
+
+async def backfill_analytics(db) -> None:
+    """analytics_daily/* and analytics_totals/global, from the analytics records."""
+    games = await AnalyticsService(db).rebuild_counters()
+    print(f"Rebuilt analytics counters from {games} games.")
+
+
+async def backfill_history(db) -> None:
+    """player_ids/player_pair/total_moves on game_history docs, and opening_counters/*, from the archived games."""
+    counts = await HistoryService(db).rebuild_history_aggregates()
+    print(f"Read {counts['games']} archived games, added lookup fields to {counts['games_updated']}, "
+          f"rebuilt {counts['openings']} opening counters.")
+
+
+BACKFILLS = {
+    'analytics': backfill_analytics,
+    'history': backfill_history,
+}
+
+
+async def main(names) -> None:
+    db = initialize_firebase()
+    try:
+        for name in names:
+            await BACKFILLS[name](db)
+    finally:
+        await close_db()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Rebuild aggregate Firestore docs from their source records.")
+    parser.add_argument('backfills', nargs='+', choices=sorted(BACKFILLS), help="Which aggregates to rebuild")
+    asyncio.run(main(parser.parse_args().backfills))
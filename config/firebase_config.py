@@ -1,20 +1,25 @@
+import inspect
+import logging
 import os
 
 import firebase_admin
 from dotenv import load_dotenv
 from google.cloud.firestore_v1.async_client import AsyncClient
 
-# Load environment variables
-load_dotenv()
+# Load environment variables from .env (deployments inject them directly and set DISABLE_DOTENV)
+if not os.getenv("DISABLE_DOTENV"):
+    load_dotenv()
 
-_db_client: AsyncClient = None  # Cache the client instance
+logger = logging.getLogger(__name__)
+
+_db_client: AsyncClient = None  # Cache the client instance (one gRPC channel pool per process)
 
 
 def initialize_firebase():
     """Initialize Firebase Admin SDK and return an Async Firestore client."""
     global _db_client
     if _db_client:
-        print("Using cached Firestore AsyncClient.")
+        logger.debug("Using cached Firestore AsyncClient.")
         return _db_client
 
     try:
@@ -22,12 +27,12 @@ def initialize_firebase():
         service_account_path = os.getenv('FIREBASE_SERVICE_ACCOUNT_PATH',
                                          'config/firebase_service_account.json')  # Default path
 
-        if os.path.exists(service_account_path):
+        try:
             cred = firebase_admin.credentials.Certificate(service_account_path)
-            print(f"Initializing Firebase from path: {service_account_path}...")
-        else:
+        except FileNotFoundError as e:
             raise ValueError(
-                "Firebase credentials not found. Set FIREBASE_SERVICE_ACCOUNT_PATH or FIREBASE_CONFIG_STRING.")
+                "Firebase credentials not found. Set FIREBASE_SERVICE_ACCOUNT_PATH or FIREBASE_CONFIG_STRING.") from e
+        logger.info("Initializing Firebase from path: %s", service_account_path)
 
         # Initialize Firebase Admin SDK only if not already initialized
         if not firebase_admin._apps:
@@ -36,18 +41,33 @@ def initialize_firebase():
                 # 'databaseURL': os.getenv('FIREBASE_DATABASE_URL'),
                 # 'storageBucket': os.getenv('FIREBASE_STORAGE_BUCKET')
             })
-            print("Firebase Admin App Initialized.")
+            logger.info("Firebase Admin App Initialized.")
         else:
-            print("Firebase Admin App already initialized.")
+            logger.debug("Firebase Admin App already initialized.")
 
-        # Initialize Firestore Async client
-        # Pass the project ID explicitly if needed, often inferred from creds
-        from google.auth import default
-        credentials, project_id = default()
-        _db_client = AsyncClient(project=project_id, credentials=credentials)  # Use AsyncClient
-        print(f"Firestore AsyncClient Initialized for project: {_db_client.project}")
+        # Initialize Firestore Async client from the service account already loaded above,
+        # instead of re-probing the environment/metadata server via google.auth.default()
+        _db_client = AsyncClient(project=cred.project_id, credentials=cred.get_credential())  # Use AsyncClient
+        logger.info("Firestore AsyncClient Initialized for project: %s", _db_client.project)
 
         return _db_client
-    except Exception as e:
-        print(f"Error initializing Firebase/Firestore: {e}")
+    except Exception:
+        logger.exception("Error initializing Firebase/Firestore")
         raise
+
+
+def get_db() -> AsyncClient:
+    """Return the process-wide Firestore AsyncClient, initializing it on first use."""
+    return _db_client or initialize_firebase()
+
+
+async def close_db() -> None:
+    """Close the shared Firestore client's channels on application shutdown."""
+    global _db_client
+    if not _db_client:
+        return
+    result = _db_client.close()
+    if inspect.isawaitable(result):  # Coroutine on google-cloud-firestore versions with an async transport close
+        await result
+    _db_client = None
+    logger.info("Firestore AsyncClient closed.")
@@ -0,0 +1,23 @@
+import logging
+import os
+import queue
+from logging.handlers import QueueHandler, QueueListener
+
+
+def setup_logging() -> QueueListener:
+    """Route application logs through a queue so handler I/O runs on a background thread.
+
+    Request handlers only enqueue records; the returned listener writes them to stderr.
+    Start it on application startup and stop it on shutdown so queued records are flushed.
+    """
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+
+    root = logging.getLogger()
+    root.handlers = [QueueHandler(log_queue)]
+    root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+
+    listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    listener.start()
+    return listener
@@ -1,12 +1,38 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
+
+from config.firebase_config import close_db
+from config.logging_config import setup_logging
 from middleware.auth_middleware import FirebaseAuthMiddleware
+from middleware.static_response_middleware import StaticResponseMiddleware
 from routes import profile_routes, friend_routes, history_routes, analytics_routes, auth_routes
 
+ROOT_INFO = {
+    "name": "Portal Gambit Backend API",
+    "version": "1.0.0",
+    "status": "running"
+}
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    log_listener = setup_logging()
+    # The Firestore client is created once at import (utils.dependencies) and shared by every request
+    yield
+    await close_db()
+    log_listener.stop()
+
+
 app = FastAPI(
     title="Portal Gambit Backend",
     description="Backend API for Portal Gambit chess variant game",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse  # orjson encodes responses several times faster than stdlib json
 )
 
 # Configure CORS
@@ -19,14 +45,14 @@ app.add_middleware(
 )
 
 # Configure Firebase Authentication Middleware
-# Add paths that should be excluded from authentication
-excluded_paths = [
-    r"^/$",  # Root path
-    r"^/docs$",  # Swagger UI
-    r"^/openapi.json$",  # OpenAPI schema
-    r"^/redoc$",  # ReDoc UI
-]
-app.add_middleware(FirebaseAuthMiddleware, exclude_paths=excluded_paths)
+# The root path, docs, OpenAPI schema and /auth/token are excluded by the middleware's defaults
+app.add_middleware(FirebaseAuthMiddleware)
+
+# Compress larger JSON bodies (stats, game lists) for clients that send Accept-Encoding: gzip
+app.add_middleware(GZipMiddleware, minimum_size=1000)
+
+# Outermost: health checks on / are answered from pre-encoded bytes without routing or auth
+app.add_middleware(StaticResponseMiddleware, responses={"/": ROOT_INFO})
 
 # Include routers
 app.include_router(profile_routes.router)
@@ -38,12 +64,10 @@ app.include_router(auth_routes.router)
 @app.get("/")
 async def root():
     """Root endpoint returning API information."""
-    return {
-        "name": "Portal Gambit Backend API",
-        "version": "1.0.0",
-        "status": "running"
-    }
+    # Normally served by StaticResponseMiddleware; kept for the OpenAPI schema and cross-origin requests
+    return ROOT_INFO
 
 if __name__ == '__main__':
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8080)
+    # Same event loop and HTTP parser as run.sh, so local runs match production
+    uvicorn.run(app, host="0.0.0.0", port=8080, loop="uvloop", http="httptools")
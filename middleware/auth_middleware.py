@@ -2,19 +2,53 @@
 
 import logging
 import re
-from typing import Optional, List
+from typing import Optional, List, Tuple, FrozenSet, Pattern
 
-from fastapi import Request, HTTPException
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi import HTTPException
 from starlette import status
 # Import Response and JSONResponse
 from starlette.responses import JSONResponse
 
-from utils.jwt_utils import verify_token
+from utils.jwt_utils import verify_token_async
 
-security = HTTPBearer()
 logger = logging.getLogger(__name__)
 
+# An exclude pattern of the form ^<literal>$ (only escaped metacharacters) names a single path
+_LITERAL_PATH_PATTERN = re.compile(r"\^((?:[^\\^$.*+?{}\[\]|()]|\\[^A-Za-z0-9])*)\$")
+_REGEX_ESCAPE = re.compile(r"\\(.)")
+
+
+def _compile_exclude_paths(patterns: List[str]) -> Tuple[FrozenSet[str], Optional[Pattern[str]]]:
+    """Split exclude patterns into a set of literal paths and one fused regex for the rest."""
+    literal_paths = set()
+    regex_patterns = []
+    for pattern in patterns:
+        literal_match = _LITERAL_PATH_PATTERN.fullmatch(pattern)
+        if literal_match:
+            literal_paths.add(_REGEX_ESCAPE.sub(r"\1", literal_match.group(1)))
+        else:
+            regex_patterns.append(pattern)
+    fused_regex = re.compile("|".join(f"(?:{pattern})" for pattern in regex_patterns)) if regex_patterns else None
+    return frozenset(literal_paths), fused_regex
+
+
+def _authorization_header(scope) -> Optional[str]:
+    """Read the Authorization header from raw ASGI headers (names are already lower-cased)."""
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            return value.decode("latin-1")
+    return None
+
+
+def _bearer_token(authorization: Optional[str]) -> str:
+    """Extract the token from an Authorization header, mirroring fastapi.security.HTTPBearer's errors."""
+    scheme, _, credentials = (authorization or "").partition(" ")
+    if not (authorization and scheme and credentials):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authenticated")
+    if scheme.lower() != "bearer":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid authentication credentials")
+    return credentials
+
 
 class FirebaseAuthMiddleware:
     def __init__(self, app, exclude_paths: Optional[List[str]] = None):
@@ -24,12 +58,18 @@ class FirebaseAuthMiddleware:
             r"^/auth/token$",
             r"^/$",
             r"^/docs$",
-            r"^/openapi.json$",
+            r"^/openapi\.json$",
             r"^/redoc$",
             r"^/favicon\.ico$",
         ]
         self.exclude_paths = (exclude_paths or []) + default_exclude_paths
-        self.exclude_patterns = [re.compile(pattern) for pattern in self.exclude_paths]
+        # Exact paths become an O(1) set lookup; anything else is matched by a single regex
+        self._excluded_literals, self._excluded_regex = _compile_exclude_paths(self.exclude_paths)
+
+    def _is_excluded(self, path: str) -> bool:
+        if path in self._excluded_literals:
+            return True
+        return self._excluded_regex is not None and self._excluded_regex.match(path) is not None
 
     async def __call__(self, scope, receive, send):
         """Process each request through the middleware."""
@@ -37,24 +77,23 @@ class FirebaseAuthMiddleware:
             await self.app(scope, receive, send)
             return
 
-        request = Request(scope, receive=receive)
-        path = request.url.path
+        path = scope["path"]
 
-        if any(pattern.match(path) for pattern in self.exclude_patterns) or request.method == "OPTIONS":
+        if self._is_excluded(path) or scope["method"] == "OPTIONS":
             await self.app(scope, receive, send)
             return
 
-        # --- Explicitly handle potential exceptions from security() and verify_token() ---
+        # --- Explicitly handle potential exceptions from _bearer_token() and verify_token() ---
         try:
-            credentials: HTTPAuthorizationCredentials = await security(request)
-            token = credentials.credentials
-            decoded_token = verify_token(token)
-            request.state.user = decoded_token
+            token = _bearer_token(_authorization_header(scope))
+            decoded_token = await verify_token_async(token)
+            # Request.state is a view over scope["state"], so this is what request.state.user reads
+            scope.setdefault("state", {})["user"] = decoded_token
             # Proceed only if token is valid
             await self.app(scope, receive, send)
 
         except HTTPException as http_exc:
-            # If security() or verify_token() raised an HTTPException (403 or 401),
+            # If _bearer_token() or verify_token() raised an HTTPException (403 or 401),
             # construct and send the response manually.
             response = JSONResponse(
                 status_code=http_exc.status_code,
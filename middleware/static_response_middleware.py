@@ -0,0 +1,45 @@
+# middleware/static_response_middleware.py
+
+from typing import Any, Dict, List, Tuple
+
+import orjson
+
+
+def _prebuild_response(content: Any) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Encode a JSON body once and return the ASGI start/body messages that send it."""
+    body = orjson.dumps(content)
+    start = {
+        "type": "http.response.start",
+        "status": 200,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode("latin-1")),
+        ],
+    }
+    return start, {"type": "http.response.body", "body": body}
+
+
+def _has_origin(headers: List[Tuple[bytes, bytes]]) -> bool:
+    for name, _ in headers:
+        if name == b"origin":
+            return True
+    return False
+
+
+class StaticResponseMiddleware:
+    def __init__(self, app, responses: Dict[str, Any]):
+        """Serve GET requests for the given paths from JSON responses encoded at startup."""
+        self.app = app
+        self._responses = {path: _prebuild_response(content) for path, content in responses.items()}
+
+    async def __call__(self, scope, receive, send):
+        """Answer fixed-content paths directly; delegate everything else."""
+        if scope["type"] == "http" and scope["method"] == "GET":
+            prebuilt = self._responses.get(scope["path"])
+            # Cross-origin requests still go through the app so CORSMiddleware can add its headers
+            if prebuilt is not None and not _has_origin(scope["headers"]):
+                start, body = prebuilt
+                await send(start)
+                await send(body)
+                return
+        await self.app(scope, receive, send)
@@ -0,0 +1,6 @@
+from datetime import datetime, timezone
+
+
+def utcnow() -> datetime:
+    """Timezone-aware current UTC time; the default_factory for the models' timestamp fields."""
+    return datetime.now(timezone.utc)
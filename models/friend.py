@@ -1,8 +1,10 @@
-from datetime import datetime, timezone  # Import timezone
+from datetime import datetime
 from enum import Enum
 from typing import Optional
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
+
+from models._time import utcnow
 
 
 class FriendRequestStatus(str, Enum):
@@ -11,34 +13,36 @@ class FriendRequestStatus(str, Enum):
     REJECTED = "rejected"
 
 
+_FRIEND_REQUEST_EXAMPLE = {
+    "request_id": "req123",
+    "sender_id": "user1",
+    "receiver_id": "user2",
+    "status": "pending",
+    "message": "Let's play some chess!"
+}
+
+
 class FriendRequest(BaseModel):
     request_id: str = Field(..., description="Unique request identifier")
     sender_id: str = Field(..., description="UID of the request sender")
     receiver_id: str = Field(..., description="UID of the request receiver")
     status: FriendRequestStatus = Field(default=FriendRequestStatus.PENDING)
-    # FIX: Use datetime.now(timezone.utc) for default factory
-    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
-    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    created_at: datetime = Field(default_factory=utcnow)
+    updated_at: datetime = Field(default_factory=utcnow)
     message: Optional[str] = None
 
-    class Config:
-        json_schema_extra = {
-            "example": {
-                "request_id": "req123",
-                "sender_id": "user1",
-                "receiver_id": "user2",
-                "status": "pending",
-                "message": "Let's play some chess!"
-            }
-        }
+    model_config = ConfigDict(
+        defer_build=True,
+        json_schema_extra={"example": _FRIEND_REQUEST_EXAMPLE}
+    )
 
 
 class FriendStatus(BaseModel):
     user_id: str
     friend_id: str
-    # FIX: Use datetime.now(timezone.utc) for default factory
-    became_friends: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    became_friends: datetime = Field(default_factory=utcnow)
     games_played: int = Field(default=0)
     last_game: Optional[str] = None  # Reference to last game_id
-    # FIX: Use datetime.now(timezone.utc) for default factory
-    last_interaction: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    last_interaction: datetime = Field(default_factory=utcnow)
+
+    model_config = ConfigDict(defer_build=True)
@@ -1,8 +1,10 @@
-from datetime import datetime, timezone  # Import timezone
+from datetime import datetime
 from enum import Enum
 from typing import Optional, List
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
+
+from models._time import utcnow
 
 
 class GameResult(str, Enum):
@@ -12,12 +14,25 @@ class GameResult(str, Enum):
     ABANDONED = "abandoned"
 
 
+_GAME_HISTORY_EXAMPLE = {
+    "game_id": "game123",
+    "white_player_id": "user1",
+    "black_player_id": "user2",
+    "result": "white_win",
+    "winner_id": "user1",
+    "moves": ["e4", "e5", "Nf3"],
+    "white_rating": 1200,
+    "black_rating": 1150,
+    "rating_change": {"white": 8, "black": -8},
+    "time_control": {"initial": 600, "increment": 5}
+}
+
+
 class GameHistory(BaseModel):
     game_id: str = Field(..., description="Unique game identifier")
     white_player_id: str = Field(..., description="UID of white player")
     black_player_id: str = Field(..., description="UID of black player")
-    # FIX: Use datetime.now(timezone.utc) for default factory
-    start_time: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    start_time: datetime = Field(default_factory=utcnow)
     end_time: datetime  # Should be set when game ends
     result: GameResult
     winner_id: Optional[str] = None
@@ -29,18 +44,7 @@ class GameHistory(BaseModel):
     game_type: str = Field(default="portal_gambit", description="Variant type")
     time_control: dict = Field(..., description="Time control settings")
 
-    class Config:
-        json_schema_extra = {
-            "example": {
-                "game_id": "game123",
-                "white_player_id": "user1",
-                "black_player_id": "user2",
-                "result": "white_win",
-                "winner_id": "user1",
-                "moves": ["e4", "e5", "Nf3"],
-                "white_rating": 1200,
-                "black_rating": 1150,
-                "rating_change": {"white": 8, "black": -8},
-                "time_control": {"initial": 600, "increment": 5}
-            }
-        }
+    model_config = ConfigDict(
+        defer_build=True,
+        json_schema_extra={"example": _GAME_HISTORY_EXAMPLE}
+    )
@@ -1,6 +1,21 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from typing import Optional, List
-from datetime import datetime, timezone  # Import timezone
+from datetime import datetime
+
+from models._time import utcnow
+
+
+_USER_PROFILE_EXAMPLE = {
+    "uid": "abc123",
+    "username": "chessMaster",
+    "email": "user@example.com",
+    "display_name": "Chess Master",
+    "rating": 1200,
+    "games_played": 0,
+    "wins": 0,
+    "losses": 0,
+    "draws": 0
+}
 
 
 class UserProfile(BaseModel):
@@ -14,25 +29,13 @@ class UserProfile(BaseModel):
     wins: int = Field(default=0)
     losses: int = Field(default=0)
     draws: int = Field(default=0)
-    # FIX: Use datetime.now(timezone.utc) for default factory
-    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
-    # FIX: Use datetime.now(timezone.utc) for default factory
-    last_active: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    created_at: datetime = Field(default_factory=utcnow)
+    last_active: datetime = Field(default_factory=utcnow)
     friends: List[str] = Field(default_factory=list, description="List of friend UIDs")
     achievements: List[str] = Field(default_factory=list)
     preferences: dict = Field(default_factory=dict)
 
-    class Config:
-        json_schema_extra = {
-            "example": {
-                "uid": "abc123",
-                "username": "chessMaster",
-                "email": "user@example.com",
-                "display_name": "Chess Master",
-                "rating": 1200,
-                "games_played": 0,
-                "wins": 0,
-                "losses": 0,
-                "draws": 0
-            }
-        }
+    model_config = ConfigDict(
+        defer_build=True,
+        json_schema_extra={"example": _USER_PROFILE_EXAMPLE}
+    )
@@ -1,4 +1,4 @@
-from datetime import datetime
+from datetime import datetime, timezone
 
 from fastapi import APIRouter, Depends, HTTPException, status  # import status
 
@@ -15,6 +15,9 @@ from utils.dependencies import get_current_user, get_analytics_service
 
 router = APIRouter(prefix="/analytics", tags=["analytics"])
 
+# The success response is fixed, so build (and validate) it once
+_ANALYTICS_RECORDED = AnalyticsResponse(status="success", message="Game analytics recorded successfully")
+
 
 @router.post("/games/{game_id}", response_model=AnalyticsResponse)
 async def record_game_analytics(
@@ -25,35 +28,39 @@ async def record_game_analytics(
 ):
     """Record analytics data for a completed game."""
     # Verify that the current user was a participant in the game
-    if current_user.uid not in [game_data.white_player_id, game_data.black_player_id]:
+    if current_user.uid != game_data.white_player_id and current_user.uid != game_data.black_player_id:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
                             detail="Can only record analytics for games you participated in")
 
-    # FIX: Use model_dump() instead of dict()
-    game_dict = game_data.model_dump()
-    # Add game_id from path parameter, as it might not be in the body schema required by FastAPI
-    game_dict['game_id'] = game_id
+    # Shallow field mapping: the schema is flat, so model_dump()'s recursive copy (e.g. of 'moves') isn't needed.
+    # game_id comes from the path parameter, as it might not be in the body schema required by FastAPI
+    game_dict = {**dict(game_data), 'game_id': game_id}
 
     success = await analytics_service.record_game_analytics(game_dict)
     if not success:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to record game analytics")
 
-    return AnalyticsResponse(
-        status="success",
-        message="Game analytics recorded successfully"
-    )
+    return _ANALYTICS_RECORDED
 
 
 @router.get("/daily/{date}", response_model=DailyStats)
 async def get_daily_stats(
-        date: datetime,  # FastAPI handles path param conversion
+        date: str,  # YYYY-MM-DD, or a full ISO datetime (only its calendar day is used)
         current_user: TokenData = Depends(get_current_user),
         analytics_service: AnalyticsService = Depends(get_analytics_service)
 ):
     """Get aggregated statistics for a specific day."""
+    # fromisoformat rejects malformed values and impossible days such as 2024-02-30.
+    # Days are bucketed in UTC, so an aware datetime is converted before taking its day.
+    try:
+        moment = datetime.fromisoformat(date)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Invalid date")
+    day = (moment.astimezone(timezone.utc) if moment.tzinfo else moment).date()
+
     # Add try-except block if service method can raise specific errors
     try:
-        stats = await analytics_service.get_daily_stats(date)
+        stats = await analytics_service.get_daily_stats(day)
         return stats
     except Exception as e:
         # Log the error e
@@ -1,7 +1,6 @@
 from fastapi import APIRouter, HTTPException, Depends
-from firebase_admin import auth
 from schemas.auth_schemas import FirebaseTokenRequest, TokenResponse, TokenData
-from utils.jwt_utils import create_tokens_for_user, verify_token
+from utils.jwt_utils import create_tokens_for_user, verify_token_async, verify_firebase_token_async
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 
 router = APIRouter(prefix="/auth", tags=["authentication"])
@@ -12,8 +11,8 @@ security = HTTPBearer()
 async def get_token(request: FirebaseTokenRequest):
     """Exchange Firebase token for backend JWT token."""
     try:
-        # Verify Firebase token
-        decoded_token = auth.verify_id_token(request.firebase_token)
+        # Verify Firebase token locally against Google's cached signing certificates
+        decoded_token = await verify_firebase_token_async(request.firebase_token)
 
         # Create our own JWT token
         tokens = create_tokens_for_user(decoded_token)
@@ -29,7 +28,7 @@ async def get_token(request: FirebaseTokenRequest):
 @router.get("/verify", response_model=TokenData)
 async def verify_access_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
     """Verify the backend JWT token."""
-    payload = verify_token(credentials.credentials)
+    payload = await verify_token_async(credentials.credentials)
     return TokenData(
         uid=payload["uid"],
         email=payload.get("email"),
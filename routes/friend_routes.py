@@ -1,6 +1,7 @@
 from typing import List
 
 from fastapi import APIRouter, Depends, HTTPException, status  # Import status
+from pydantic import TypeAdapter
 
 from models.friend import FriendRequest, FriendStatus
 from schemas.auth_schemas import TokenData
@@ -12,9 +13,21 @@ from schemas.friend_schemas import (
 )
 from services.friend_service import FriendService
 from utils.dependencies import get_current_user, get_friend_service
+from utils.responses import validated_json_response
 
 router = APIRouter(prefix="/friends", tags=["friends"])
 
+# Success responses are fixed, so build (and validate) them once
+_REQUEST_SENT = FriendResponse(status="success", message="Friend request sent successfully")
+_REQUEST_ACCEPTED = FriendResponse(status="success", message="Friend request accepted successfully")
+_REQUEST_REJECTED = FriendResponse(status="success", message="Friend request rejected successfully")
+_FRIEND_REMOVED = FriendResponse(status="success", message="Friend removed successfully")
+_INTERACTION_UPDATED = FriendResponse(status="success", message="Interaction updated successfully")
+
+# Service results are already validated models; serialize them without a second validation pass
+_REQUEST_LIST_ADAPTER = TypeAdapter(List[FriendRequest])
+_STATUS_LIST_ADAPTER = TypeAdapter(List[FriendStatus])
+
 
 @router.post("/requests", response_model=FriendResponse)
 async def send_friend_request(
@@ -35,10 +48,7 @@ async def send_friend_request(
             detail="Failed to send friend request (already friends or pending request exists)"
         )
 
-    return FriendResponse(
-        status="success",
-        message="Friend request sent successfully"
-    )
+    return _REQUEST_SENT
 
 
 @router.get("/requests/pending", response_model=List[FriendRequest])
@@ -47,7 +57,8 @@ async def get_pending_requests(
         friend_service: FriendService = Depends(get_friend_service)
 ):
     """Get all pending friend requests for the current user."""
-    return await friend_service.get_pending_requests(current_user.uid)
+    requests = await friend_service.get_pending_requests(current_user.uid)
+    return validated_json_response(_REQUEST_LIST_ADAPTER, requests)
 
 
 @router.post("/requests/{request_id}/respond", response_model=FriendResponse)
@@ -59,26 +70,19 @@ async def respond_to_request(
         friend_service: FriendService = Depends(get_friend_service)
 ):
     """Accept or reject a friend request."""
-    # ... (rest of the logic remains the same, use action.accept now)
-    request_obj = await friend_service.get_friend_request(request_id)  # Renamed variable
-    if not request_obj:
+    # Ownership and pending checks happen inside the same transaction as the write
+    outcome = await friend_service.respond_to_request_checked(request_id, current_user.uid, action.accept)
+    if outcome == 'not_found':
         raise HTTPException(status_code=404, detail="Friend request not found")
-
-    if request_obj.receiver_id != current_user.uid:
+    if outcome == 'forbidden':
         raise HTTPException(status_code=403, detail="Cannot respond to requests for other users")
-
-    # Use action.accept here
-    success = await friend_service.respond_to_request(request_id, action.accept)
-    # Return 400 if service fails (e.g., request wasn't pending)
-    if not success:
+    # Return 400 if the request wasn't pending or the transaction failed
+    if outcome != 'ok':
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Failed to respond to friend request (e.g., request not pending or db error)"
         )
-    return FriendResponse(
-        status="success",
-        message=f"Friend request {action.accept and 'accepted' or 'rejected'} successfully"
-    )
+    return _REQUEST_ACCEPTED if action.accept else _REQUEST_REJECTED
 
 
 @router.get("/list", response_model=List[FriendStatus])
@@ -87,7 +91,8 @@ async def get_friends(
         friend_service: FriendService = Depends(get_friend_service)
 ):
     """Get all friends of the current user."""
-    return await friend_service.get_friends(current_user.uid)
+    friends = await friend_service.get_friends(current_user.uid)
+    return validated_json_response(_STATUS_LIST_ADAPTER, friends)
 
 
 @router.delete("/{friend_id}", response_model=FriendResponse)
@@ -104,10 +109,7 @@ async def remove_friend(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Failed to remove friend (e.g., not friends or db error)"
         )
-    return FriendResponse(
-        status="success",
-        message="Friend removed successfully"
-    )
+    return _FRIEND_REMOVED
 
 
 @router.post("/{friend_id}/interactions", response_model=FriendResponse)
@@ -126,7 +128,4 @@ async def update_friend_interaction(
     # FIX: Route already raises 400 on failure, which is correct. Keep as is.
     if not success:
         raise HTTPException(status_code=400, detail="Failed to update interaction")
-    return FriendResponse(
-        status="success",
-        message="Interaction updated successfully"
-    )
+    return _INTERACTION_UPDATED
@@ -1,6 +1,7 @@
 from typing import List
 
 from fastapi import APIRouter, Depends, HTTPException
+from pydantic import TypeAdapter
 
 from models.game_history import GameHistory
 from schemas.auth_schemas import TokenData
@@ -15,9 +16,18 @@ from schemas.history_schemas import (
 )
 from services.history_service import HistoryService
 from utils.dependencies import get_current_user, get_history_service
+from utils.responses import validated_json_response
 
 router = APIRouter(prefix="/history", tags=["history"])
 
+# Archive outcomes are fixed, so build (and validate) them once
+_GAME_ARCHIVED = GameHistoryResponse(status="success", message="Game archived successfully")
+_GAME_ARCHIVE_FAILED = GameHistoryResponse(status="error", message="Failed to archive game")
+
+# Games come back from the service as validated models; serialize them without a second validation pass
+_GAME_ADAPTER = TypeAdapter(GameHistory)
+_GAME_LIST_ADAPTER = TypeAdapter(List[GameHistory])
+
 
 @router.post("/games", response_model=GameHistoryResponse)
 async def archive_game(
@@ -27,13 +37,12 @@ async def archive_game(
 ):
     """Archive a completed game."""
     # Verify that the current user was a participant in the game
-    if current_user.uid not in [game.white_player_id, game.black_player_id]:
+    if current_user.uid != game.white_player_id and current_user.uid != game.black_player_id:
         raise HTTPException(status_code=403, detail="Can only archive games you participated in")
+    # Written before responding: on Cloud Run, CPU is throttled once the response is sent, so work
+    # left for after it can stall; and the client only hears "success" once the game is stored
     success = await history_service.archive_game(game)
-    return GameHistoryResponse(
-        status="success" if success else "error",
-        message="Game archived successfully" if success else "Failed to archive game"
-    )
+    return _GAME_ARCHIVED if success else _GAME_ARCHIVE_FAILED
 
 
 @router.get("/games/{game_id}", response_model=GameHistory)
@@ -46,7 +55,7 @@ async def get_game(
     game = await history_service.get_game(game_id)
     if not game:
         raise HTTPException(status_code=404, detail="Game not found")
-    return game
+    return validated_json_response(_GAME_ADAPTER, game)
 
 
 @router.get("/users/{user_id}/games", response_model=List[GameHistory])
@@ -56,8 +65,9 @@ async def get_user_games(
         current_user: TokenData = Depends(get_current_user),
         history_service: HistoryService = Depends(get_history_service)
 ):
-    """Get recent games for a user."""
-    return await history_service.get_user_games(user_id, params.limit)
+    """Get recent games for a user, newest first; pass the last game's end_time as start_after for the next page."""
+    games = await history_service.get_user_games(user_id, params.limit, start_after=params.start_after)
+    return validated_json_response(_GAME_LIST_ADAPTER, games)
 
 
 @router.get("/games/between/{player1_id}/{player2_id}", response_model=List[GameHistory])
@@ -68,8 +78,10 @@ async def get_games_between_players(
         current_user: TokenData = Depends(get_current_user),
         history_service: HistoryService = Depends(get_history_service)
 ):
-    """Get recent games between two specific players."""
-    return await history_service.get_games_between_players(player1_id, player2_id, params.limit)
+    """Get recent games between two specific players, paged like the user's games."""
+    games = await history_service.get_games_between_players(player1_id, player2_id, params.limit,
+                                                            start_after=params.start_after)
+    return validated_json_response(_GAME_LIST_ADAPTER, games)
 
 
 @router.get("/users/{user_id}/stats", response_model=UserGameStats)
@@ -1,6 +1,7 @@
 from typing import List
 
 from fastapi import APIRouter, Depends, HTTPException, Path, status  # Import status
+from pydantic import TypeAdapter
 
 from models.user_profile import UserProfile
 from schemas.auth_schemas import TokenData
@@ -12,9 +13,23 @@ from schemas.profile_schemas import (
 )
 from services.profile_service import ProfileService
 from utils.dependencies import get_current_user, get_profile_service
+from utils.responses import validated_json_response
 
 router = APIRouter(prefix="/profiles", tags=["profiles"])
 
+MIN_SEARCH_PREFIX_LENGTH = 2
+# Seconds a viewed profile may be served from the service's cache (its own writes evict it sooner)
+PROFILE_VIEW_TTL = 30
+
+# Success responses are fixed, so build (and validate) them once
+_PROFILE_CREATED = ProfileResponse(status="success", message="Profile created successfully")
+_PROFILE_UPDATED = ProfileResponse(status="success", message="Profile updated successfully")
+_ACHIEVEMENT_ADDED = ProfileResponse(status="success", message="Achievement added successfully")
+
+# Profiles come back from the service as validated models; serialize them without a second validation pass
+_PROFILE_ADAPTER = TypeAdapter(UserProfile)
+_PROFILE_LIST_ADAPTER = TypeAdapter(List[UserProfile])
+
 
 @router.post("/", response_model=ProfileResponse,
              status_code=status.HTTP_201_CREATED)  # Use 201 for successful creation
@@ -37,10 +52,7 @@ async def create_profile(
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                             detail="Failed to create profile in database")
 
-    return ProfileResponse(
-        status="success",
-        message="Profile created successfully"
-    )
+    return _PROFILE_CREATED
 
 
 @router.get("/{uid}", response_model=UserProfile)
@@ -50,10 +62,10 @@ async def get_profile(
         profile_service: ProfileService = Depends(get_profile_service)
 ):
     """Get a user profile by UID."""
-    profile = await profile_service.get_profile(uid)
+    profile = await profile_service.get_profile(uid, ttl=PROFILE_VIEW_TTL)
     if not profile:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found")
-    return profile
+    return validated_json_response(_PROFILE_ADAPTER, profile)
 
 
 @router.patch("/{uid}", response_model=ProfileResponse)
@@ -77,10 +89,7 @@ async def update_profile(
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                             detail="Failed to update profile in database")
 
-    return ProfileResponse(
-        status="success",
-        message="Profile updated successfully"
-    )
+    return _PROFILE_UPDATED
 
 
 @router.get("/search/{username_prefix}", response_model=List[UserProfile])
@@ -91,10 +100,12 @@ async def search_profiles(
         profile_service: ProfileService = Depends(get_profile_service)
 ):
     """Search for profiles by username prefix."""
-    if not username_prefix or len(username_prefix) < 1:  # Add basic validation
+    # Single-character prefixes match a large slice of the collection; require a narrower range
+    if len(username_prefix) < MIN_SEARCH_PREFIX_LENGTH:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
-                            detail="Username prefix must be at least 1 character")
-    return await profile_service.search_profiles(username_prefix, params.limit)
+                            detail=f"Username prefix must be at least {MIN_SEARCH_PREFIX_LENGTH} characters")
+    profiles = await profile_service.search_profiles(username_prefix, params.limit)
+    return validated_json_response(_PROFILE_LIST_ADAPTER, profiles)
 
 
 @router.get("/leaderboard/top", response_model=List[UserProfile])
@@ -104,7 +115,8 @@ async def get_leaderboard(
         profile_service: ProfileService = Depends(get_profile_service)
 ):
     """Get the top rated players."""
-    return await profile_service.get_leaderboard(params.limit)
+    profiles = await profile_service.get_leaderboard(params.limit)
+    return validated_json_response(_PROFILE_LIST_ADAPTER, profiles)
 
 
 @router.post("/{uid}/achievements/{achievement_id}", response_model=ProfileResponse)
@@ -126,7 +138,4 @@ async def add_achievement(
     if not success:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to add achievement")
 
-    return ProfileResponse(
-        status="success",
-        message="Achievement added successfully"
-    )
+    return _ACHIEVEMENT_ADDED
@@ -6,5 +6,5 @@ set -e
 # Convert Firebase config
 config/convert.sh FIREBASE_CONFIG config/firebase_service_account.json
 
-# Start the application using uvicorn
-exec uvicorn main:app --host 0.0.0.0 --port "${PORT:-8080}"
\ No newline at end of file
+# Start the application using uvicorn (uvloop event loop and httptools parser, from uvicorn[standard])
+exec uvicorn main:app --host 0.0.0.0 --port "${PORT:-8080}" --loop uvloop --http httptools
\ No newline at end of file
@@ -1,7 +1,7 @@
 from datetime import datetime
 from typing import Dict, Any, Optional, List
 
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 
 
 class GameAnalyticsCreate(BaseModel):
@@ -55,5 +55,7 @@ class GlobalStats(BaseModel):
 
 class AnalyticsResponse(BaseModel):
     """Schema for generic analytics operation response."""
+    model_config = ConfigDict(frozen=True)  # Routes return shared module-level instances
+
     status: str
     message: Optional[str] = None
@@ -1,6 +1,6 @@
 from typing import Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 
 
 class FriendRequestCreate(BaseModel):
@@ -17,6 +17,8 @@ class FriendRequestResponse(BaseModel):
 
 class FriendResponse(BaseModel):
     """Schema for generic friend operation response."""
+    model_config = ConfigDict(frozen=True)  # Routes return shared module-level instances
+
     status: str
     message: Optional[str] = None
 
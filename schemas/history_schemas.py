@@ -1,41 +1,58 @@
+from datetime import datetime
 from typing import Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict, Field
 
 
 class GameHistoryParams(BaseModel):
     """Schema for game history query parameters."""
-    limit: int = 50
+    model_config = ConfigDict(frozen=True)
+
+    limit: int = Field(50, ge=1, le=200)  # Bounds the documents read and held per request
     days: Optional[int] = 30
+    start_after: Optional[datetime] = None  # end_time of the previous page's last game
 
 class GamesBetweenPlayersParams(BaseModel):
     """Schema for querying games between players."""
+    model_config = ConfigDict(frozen=True)
+
     player1_id: str
     player2_id: str
-    limit: int = 10
+    limit: int = Field(10, ge=1, le=100)
+    start_after: Optional[datetime] = None  # end_time of the previous page's last game
 
 class UserStatsParams(BaseModel):
     """Schema for user stats query parameters."""
+    model_config = ConfigDict(frozen=True)
+
     user_id: str
     days: int = 30
 
 class PopularOpeningsParams(BaseModel):
     """Schema for popular openings query parameters."""
+    model_config = ConfigDict(frozen=True)
+
     limit: int = 10
 
 class GameHistoryResponse(BaseModel):
     """Schema for game history operation response."""
+    model_config = ConfigDict(frozen=True)  # Routes return shared module-level instances
+
     status: str
     message: Optional[str] = None
 
 class OpeningStats(BaseModel):
     """Schema for opening statistics."""
+    model_config = ConfigDict(frozen=True)
+
     moves: str
     count: int
     wins: int
 
 class UserGameStats(BaseModel):
     """Schema for user game statistics."""
+    model_config = ConfigDict(frozen=True)
+
     total_games: int
     wins: int
     losses: int
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict, Field
 from typing import Dict, Any, Optional
 
 class ProfileUpdate(BaseModel):
@@ -9,18 +9,26 @@ class ProfileUpdate(BaseModel):
 
 class ProfileResponse(BaseModel):
     """Schema for generic profile operation response."""
+    model_config = ConfigDict(frozen=True)  # Routes return shared module-level instances
+
     status: str
     message: Optional[str] = None
 
 class LeaderboardParams(BaseModel):
     """Schema for leaderboard query parameters."""
-    limit: int = 100
+    model_config = ConfigDict(frozen=True)
+
+    limit: int = Field(100, ge=1, le=200)  # Bounds the documents read and held per request
 
 class SearchProfilesParams(BaseModel):
     """Schema for profile search parameters."""
+    model_config = ConfigDict(frozen=True)
+
     username_prefix: str
     limit: int = 10
 
 class AchievementParams(BaseModel):
     """Schema for achievement parameters."""
+    model_config = ConfigDict(frozen=True)
+
     achievement_id: str 
\ No newline at end of file
@@ -1,17 +1,84 @@
-from datetime import datetime, timedelta, timezone
+import functools
+from collections import Counter
+from datetime import date as Date, datetime, timedelta, timezone
 from typing import Dict, Any
 
-from firebase_admin import firestore
+from google.cloud.firestore_v1 import Increment
+from google.cloud.firestore_v1.async_client import AsyncClient
 
 from models.game_history import GameResult
-from .base_service import BaseService
+from utils.result_cache import cached_result
+from .base_service import BaseService, MAX_BATCH_WRITES
+
+# Counter field incremented for each game result; anything else counts as abandoned
+_RESULT_COUNTERS = {
+    GameResult.WHITE_WIN: 'white_wins',
+    GameResult.BLACK_WIN: 'black_wins',
+    GameResult.DRAW: 'draws',
+}
+
+# The result that counts as a win for a player of each colour
+_WINNING_RESULT = {'white': GameResult.WHITE_WIN, 'black': GameResult.BLACK_WIN}
+
+# Seconds a doc from cache_collection is reused in-process before it is read from Firestore again
+_CACHE_DOC_TTL = 300
+
+
+@functools.lru_cache(maxsize=256)
+def _format_time_control(initial: int, increment: int) -> str:
+    return f"{initial}/{increment}"
+
+
+def _time_control_key(game: Dict[str, Any]) -> str:
+    """Label a game's time control as 'initial/increment', e.g. '300/5'."""
+    tc_key = game.get('tc_key')  # Precomputed by record_game_analytics; absent on older docs
+    if tc_key is None:
+        tc_key = _format_time_control(game['time_control']['initial'], game['time_control']['increment'])
+    return tc_key
+
+
+def _counter_key(label: str) -> str:
+    """Map a client-supplied label to a legal Firestore map key: empty and __reserved__ names are not."""
+    if label.startswith('__') and label.endswith('__'):
+        label = label.strip('_')
+    return label or 'unknown'
+
+
+def _empty_counters() -> Dict[str, Any]:
+    return {
+        'total_games': 0, 'total_duration': 0, 'total_moves': 0,
+        'white_wins': 0, 'black_wins': 0, 'draws': 0, 'abandoned': 0,
+        'game_types': Counter(), 'time_controls': Counter(), 'last_updated': None,
+    }
+
+
+def _fold_game(counters: Dict[str, Any], game: Dict[str, Any]) -> None:
+    """Add one raw analytics record to rebuilt counters, as _counter_increments does on write."""
+    counters['total_games'] += 1
+    counters['total_duration'] += game['duration']
+    counters['total_moves'] += game['total_moves']
+    counters[_RESULT_COUNTERS.get(game['result'], 'abandoned')] += 1
+    counters['game_types'][_counter_key(game['game_type'])] += 1
+    time_control = game['time_control']
+    if 'tc_key' in game or ('initial' in time_control and 'increment' in time_control):
+        counters['time_controls'][_counter_key(_time_control_key(game))] += 1
+    if counters['last_updated'] is None or game['timestamp'] > counters['last_updated']:
+        counters['last_updated'] = game['timestamp']
+
+
+def _counters_doc(counters: Dict[str, Any]) -> Dict[str, Any]:
+    return {**counters, 'game_types': dict(counters['game_types']), 'time_controls': dict(counters['time_controls'])}
 
 
 class AnalyticsService(BaseService):
-    def __init__(self, db: firestore.Client):
+    def __init__(self, db: AsyncClient):
         super().__init__(db)
         self.collection = 'analytics'
         self.cache_collection = 'analytics_cache'
+        # Aggregates maintained on write: one counters doc per UTC day, plus an all-time doc
+        self.daily_collection = 'analytics_daily'
+        self.totals_collection = 'analytics_totals'
+        self.global_totals_id = 'global'
 
     async def record_game_analytics(self, game_data: Dict[str, Any]) -> bool:
         """Record analytics data for a completed game."""
@@ -28,14 +95,87 @@ class AnalyticsService(BaseService):
             'game_type': game_data['game_type'],
             'time_control': game_data['time_control']
         }
-        return await self.set_document(self.collection, analytics_id, analytics)
+        time_control = analytics['time_control']
+        if 'initial' in time_control and 'increment' in time_control:
+            analytics['tc_key'] = _format_time_control(time_control['initial'], time_control['increment'])
+        counters = self._counter_increments(analytics)
+
+        # The game record and both aggregates commit together, so reads never see one without the others.
+        # create, not set: a retried record of the same game fails the batch instead of counting it twice
+        success = await self.batch_write([
+            ('create', self.collection, analytics_id, analytics),
+            ('merge', self.daily_collection, analytics['timestamp'].strftime('%Y-%m-%d'), counters),
+            ('merge', self.totals_collection, self.global_totals_id, counters),
+        ])
+        if not success:
+            # Already recorded (e.g. a client retry after a lost response): report it as done
+            return await self.get_document(self.collection, analytics_id) is not None
+
+        # Both players' cached performance (any `days` window) now misses this game
+        players = {analytics['white_player_id'], analytics['black_player_id']}
+        AnalyticsService.get_player_performance.evict(self, lambda key: key[0] in players)
+        return True
+
+    @staticmethod
+    def _counter_increments(analytics: Dict[str, Any]) -> Dict[str, Any]:
+        """Build the merge-set payload that folds one game into an aggregate counters doc."""
+        counters = {
+            'total_games': Increment(1),
+            'total_duration': Increment(analytics['duration']),
+            'total_moves': Increment(analytics['total_moves']),
+            _RESULT_COUNTERS.get(analytics['result'], 'abandoned'): Increment(1),
+            'game_types': {_counter_key(analytics['game_type']): Increment(1)},
+            'last_updated': analytics['timestamp'],
+        }
+        if 'tc_key' in analytics:
+            counters['time_controls'] = {_counter_key(analytics['tc_key']): Increment(1)}
+        return counters
+
+    async def rebuild_counters(self) -> int:
+        """Recompute every daily counters doc and the all-time doc from the raw analytics records.
 
-    async def get_daily_stats(self, date: datetime) -> Dict[str, Any]:
+        Backfills history recorded before counters were maintained on write. The counter docs are
+        overwritten, so it is safe to rerun; a game recorded while it runs may be missed until the next run.
+        Returns the number of games counted.
+        """
+        days: Dict[str, Dict[str, Any]] = {}
+        totals = _empty_counters()
+        async for game in self.stream_collection(self.collection):  # Raises rather than rebuilding from a partial read
+            day = days.setdefault(game['timestamp'].strftime('%Y-%m-%d'), _empty_counters())
+            _fold_game(day, game)
+            _fold_game(totals, game)
+
+        writes = [('set', self.daily_collection, date_key, _counters_doc(day)) for date_key, day in days.items()]
+        writes.append(('set', self.totals_collection, self.global_totals_id, _counters_doc(totals)))
+        for start in range(0, len(writes), MAX_BATCH_WRITES):
+            if not await self.batch_write(writes[start:start + MAX_BATCH_WRITES]):
+                raise RuntimeError("Failed to write rebuilt analytics counters")
+        return totals['total_games']
+
+    @cached_result(ttl=300)  # Past days are immutable; today's figures may lag by a few minutes
+    async def get_daily_stats(self, date: Date) -> Dict[str, Any]:
         """Get aggregated statistics for a specific day."""
-        cache_key = f"daily_stats_{date.strftime('%Y-%m-%d')}"
+        date_key = date.strftime('%Y-%m-%d')
+        counters = await self.get_document(self.daily_collection, date_key)
+        if counters:
+            total_games = counters.get('total_games', 0)
+            return {
+                'total_games': total_games,
+                'average_duration': counters.get('total_duration', 0) / total_games if total_games else 0,
+                'average_moves': counters.get('total_moves', 0) / total_games if total_games else 0,
+                'white_wins': counters.get('white_wins', 0),
+                'black_wins': counters.get('black_wins', 0),
+                'draws': counters.get('draws', 0),
+                'abandoned': counters.get('abandoned', 0),
+                'game_types': counters.get('game_types', {}),
+                'time_controls': counters.get('time_controls', {})
+            }
+
+        # Days recorded before counters existed: aggregate from the raw analytics docs
+        cache_key = f"daily_stats_{date_key}"
         
         # Try to get from cache first
-        cached_stats = await self.get_document(self.cache_collection, cache_key)
+        cached_stats = await self.get_document(self.cache_collection, cache_key, ttl=_CACHE_DOC_TTL)
         if cached_stats:
             return cached_stats
 
@@ -48,61 +188,36 @@ class AnalyticsService(BaseService):
         ]
         
         games = await self.query_collection(self.collection, filters=filters)
-        
+
+        # Counter and sum() tally in C rather than with per-game dict.get() calls
+        results = Counter(game['result'] for game in games)
         stats = {
             'total_games': len(games),
             'average_duration': 0,
             'average_moves': 0,
-            'white_wins': 0,
-            'black_wins': 0,
-            'draws': 0,
+            'white_wins': results[GameResult.WHITE_WIN],
+            'black_wins': results[GameResult.BLACK_WIN],
+            'draws': results[GameResult.DRAW],
             'abandoned': 0,
-            'game_types': {},
-            'time_controls': {}
+            'game_types': dict(Counter(game['game_type'] for game in games)),
+            'time_controls': dict(Counter(_time_control_key(game) for game in games))
         }
-        
-        total_duration = 0
-        total_moves = 0
-        
-        for game in games:
-            total_duration += game['duration']
-            total_moves += game['total_moves']
-            
-            if game['result'] == GameResult.WHITE_WIN:
-                stats['white_wins'] += 1
-            elif game['result'] == GameResult.BLACK_WIN:
-                stats['black_wins'] += 1
-            elif game['result'] == GameResult.DRAW:
-                stats['draws'] += 1
-            else:
-                stats['abandoned'] += 1
-            
-            # Count game types
-            game_type = game['game_type']
-            stats['game_types'][game_type] = stats['game_types'].get(game_type, 0) + 1
-            
-            # Count time controls
-            time_control = f"{game['time_control']['initial']}/{game['time_control']['increment']}"
-            stats['time_controls'][time_control] = stats['time_controls'].get(time_control, 0) + 1
-        
+        stats['abandoned'] = stats['total_games'] - stats['white_wins'] - stats['black_wins'] - stats['draws']
+
         if stats['total_games'] > 0:
-            stats['average_duration'] = total_duration / stats['total_games']
-            stats['average_moves'] = total_moves / stats['total_games']
+            stats['average_duration'] = sum(game['duration'] for game in games) / stats['total_games']
+            stats['average_moves'] = sum(game['total_moves'] for game in games) / stats['total_games']
         
         # Cache the results
         await self.set_document(self.cache_collection, cache_key, stats)
         
         return stats
 
+    @cached_result(ttl=300)  # Evicted for both players whenever this instance records one of their games
     async def get_player_performance(self, user_id: str, days: int = 30) -> Dict[str, Any]:
         """Get detailed performance analytics for a player."""
         start_date = datetime.now(timezone.utc) - timedelta(days=days)
         
-        filters = [
-            [('white_player_id', '==', user_id), ('timestamp', '>=', start_date)],
-            [('black_player_id', '==', user_id), ('timestamp', '>=', start_date)]
-        ]
-        
         performance = {
             'rating_progression': [],
             'average_game_duration': 0,
@@ -116,10 +231,12 @@ class AnalyticsService(BaseService):
             'average_moves_per_game': 0
         }
         
-        games = []
-        for filter_set in filters:
-            results = await self.query_collection(self.collection, filters=filter_set)
-            games.extend(results)
+        # One OR query covers games as white and as black (player_id + timestamp indexes in firestore.indexes.json)
+        games = await self.query_collection(
+            self.collection,
+            filters=[('timestamp', '>=', start_date)],
+            any_of=[('white_player_id', '==', user_id), ('black_player_id', '==', user_id)]
+        )
         
         if not games:
             return performance
@@ -129,29 +246,25 @@ class AnalyticsService(BaseService):
         
         total_duration = 0
         total_moves = 0
-        time_controls = {}
-        game_types = {}
+        time_controls = Counter()
+        game_types = Counter()
         
         for game in games:
             # Track rating progression
-            is_white = game['white_player_id'] == user_id
-            rating_change = game['rating_change']['white' if is_white else 'black']
+            color = 'white' if game['white_player_id'] == user_id else 'black'
             performance['rating_progression'].append({
                 'timestamp': game['timestamp'],
-                'rating_change': rating_change
+                'rating_change': game['rating_change'][color]
             })
             
             # Track color performance
-            color = 'white' if is_white else 'black'
-            performance['performance_by_color'][color]['games'] += 1
-            if (is_white and game['result'] == GameResult.WHITE_WIN) or \
-               (not is_white and game['result'] == GameResult.BLACK_WIN):
-                performance['performance_by_color'][color]['wins'] += 1
+            color_stats = performance['performance_by_color'][color]
+            color_stats['games'] += 1
+            color_stats['wins'] += game['result'] == _WINNING_RESULT[color]
             
             # Track time controls and game types
-            time_control = f"{game['time_control']['initial']}/{game['time_control']['increment']}"
-            time_controls[time_control] = time_controls.get(time_control, 0) + 1
-            game_types[game['game_type']] = game_types.get(game['game_type'], 0) + 1
+            time_controls[_time_control_key(game)] += 1
+            game_types[game['game_type']] += 1
             
             total_duration += game['duration']
             total_moves += game['total_moves']
@@ -162,8 +275,8 @@ class AnalyticsService(BaseService):
         performance['average_moves_per_game'] = total_moves / total_games
         
         # Find preferred time control and game type
-        performance['preferred_time_control'] = max(time_controls.items(), key=lambda x: x[1])[0]
-        performance['preferred_game_type'] = max(game_types.items(), key=lambda x: x[1])[0]
+        performance['preferred_time_control'] = time_controls.most_common(1)[0][0]
+        performance['preferred_game_type'] = game_types.most_common(1)[0][0]
         
         # Calculate overall win rate
         total_wins = sum(color['wins'] for color in performance['performance_by_color'].values())
@@ -171,25 +284,53 @@ class AnalyticsService(BaseService):
         
         return performance
 
+    @cached_result(ttl=60)  # Also skips the Firestore cache-document read
     async def get_global_stats(self) -> Dict[str, Any]:
         """Get global game statistics."""
+        counters = await self.get_document(self.totals_collection, self.global_totals_id)
+        if counters and counters.get('total_games'):
+            total_games = counters['total_games']
+            return {
+                'total_games': total_games,
+                'white_win_rate': counters.get('white_wins', 0) / total_games,
+                'average_game_duration': counters.get('total_duration', 0) / total_games,
+                'average_moves_per_game': counters.get('total_moves', 0) / total_games,
+                # most_common(n) selects with a heap instead of sorting every key
+                'popular_time_controls': dict(Counter(counters.get('time_controls', {})).most_common(5)),
+                'popular_game_types': dict(Counter(counters.get('game_types', {})).most_common(5)),
+                'last_updated': counters['last_updated']
+            }
+
+        # No totals doc yet: sample the most recent analytics docs instead
         cache_key = 'global_stats'
-        cached_stats = await self.get_document(self.cache_collection, cache_key)
+        cached_stats = await self.get_document(self.cache_collection, cache_key, ttl=_CACHE_DOC_TTL)
         
         # Return cached stats if less than 1 hour old
         if cached_stats and \
            (datetime.now(timezone.utc) - cached_stats['last_updated']).total_seconds() < 3600:
             return cached_stats
         
-        # Calculate new stats
-        results = await self.query_collection(
-            self.collection,
-            order_by=('timestamp', 'DESCENDING'),
-            limit=10000  # Get a good sample size
-        )
+        # Calculate new stats, folding each doc in as it arrives rather than holding the whole sample
+        total_games = 0
+        white_wins = 0
+        total_duration = 0
+        total_moves = 0
+        time_controls = Counter()
+        game_types = Counter()
+        async for game in self.stream_collection(
+                self.collection,
+                order_by=('timestamp', 'DESCENDING'),
+                limit=10000  # Get a good sample size
+        ):
+            total_games += 1
+            white_wins += game['result'] == GameResult.WHITE_WIN
+            total_duration += game['duration']
+            total_moves += game['total_moves']
+            time_controls[_time_control_key(game)] += 1
+            game_types[game['game_type']] += 1
         
         stats = {
-            'total_games': len(results),
+            'total_games': total_games,
             'white_win_rate': 0,
             'average_game_duration': 0,
             'average_moves_per_game': 0,
@@ -198,38 +339,16 @@ class AnalyticsService(BaseService):
             'last_updated': datetime.now(timezone.utc)
         }
         
-        if not results:
+        if not total_games:
             return stats
         
-        white_wins = 0
-        total_duration = 0
-        total_moves = 0
-        
-        for game in results:
-            if game['result'] == GameResult.WHITE_WIN:
-                white_wins += 1
-            
-            total_duration += game['duration']
-            total_moves += game['total_moves']
-            
-            time_control = f"{game['time_control']['initial']}/{game['time_control']['increment']}"
-            stats['popular_time_controls'][time_control] = \
-                stats['popular_time_controls'].get(time_control, 0) + 1
-            
-            stats['popular_game_types'][game['game_type']] = \
-                stats['popular_game_types'].get(game['game_type'], 0) + 1
-        
-        stats['white_win_rate'] = white_wins / stats['total_games']
-        stats['average_game_duration'] = total_duration / stats['total_games']
-        stats['average_moves_per_game'] = total_moves / stats['total_games']
-        
-        # Sort and limit popular lists
-        stats['popular_time_controls'] = dict(
-            sorted(stats['popular_time_controls'].items(), key=lambda x: x[1], reverse=True)[:5]
-        )
-        stats['popular_game_types'] = dict(
-            sorted(stats['popular_game_types'].items(), key=lambda x: x[1], reverse=True)[:5]
-        )
+        stats['white_win_rate'] = white_wins / total_games
+        stats['average_game_duration'] = total_duration / total_games
+        stats['average_moves_per_game'] = total_moves / total_games
+
+        # Top five of each, most popular first
+        stats['popular_time_controls'] = dict(time_controls.most_common(5))
+        stats['popular_game_types'] = dict(game_types.most_common(5))
         
         # Cache the results
         await self.set_document(self.cache_collection, cache_key, stats)
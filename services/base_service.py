@@ -1,95 +1,219 @@
-from typing import Optional, Any, Dict, List
+import asyncio
+import logging
+import time
+import weakref
+from typing import Optional, Any, AsyncIterator, Dict, List, Tuple
 
+from cachetools import LRUCache
 from firebase_admin import auth
 from google.cloud.firestore_v1 import FieldFilter, Query  # Keep for constants if needed
+from google.cloud.firestore_v1.base_query import Or
 from google.cloud.firestore_v1.async_client import AsyncClient
 from google.cloud.firestore_v1.async_query import AsyncQuery
 from google.cloud.firestore_v1.base_document import BaseDocumentReference  # For type hint
 from google.cloud.firestore_v1.types import WriteResult
 
+logger = logging.getLogger(__name__)
+
+# Firestore rejects a commit with more writes than this
+MAX_BATCH_WRITES = 500
+
 
 class BaseService:
     def __init__(self, db: AsyncClient):  # Correct type hint
         self.db = db
-        self._auth = auth  # auth is sync, okay here
+        self._auth = auth  # auth is sync; calls go through an executor
+        # Documents read with a ttl, as (collection, doc_id) -> (fetched_at, data); this instance's writes evict them
+        self._doc_cache: LRUCache = LRUCache(maxsize=1024)
+        # One lock per key being fetched, so concurrent misses share a single read
+        self._doc_locks: weakref.WeakValueDictionary = weakref.WeakValueDictionary()
+
+    async def get_document(self, collection: str, doc_id: str, ttl: float = 0) -> Optional[Dict[str, Any]]:
+        """Retrieve a document from Firestore.
+
+        With ttl > 0, a copy read by this instance within the last ttl seconds is returned without a round trip.
+        Only use it for documents that tolerate that staleness.
+        """
+        if ttl <= 0:
+            return await self._fetch_document(collection, doc_id)
 
-    async def get_document(self, collection: str, doc_id: str) -> Optional[Dict[str, Any]]:
-        """Retrieve a document from Firestore."""
+        key = (collection, doc_id)
+        cached = self._doc_cache.get(key)
+        if cached and time.monotonic() - cached[0] < ttl:
+            return cached[1]
+
+        lock = self._doc_locks.get(key)
+        if lock is None:
+            lock = self._doc_locks[key] = asyncio.Lock()
+        async with lock:
+            # Another caller may have fetched it while we waited
+            cached = self._doc_cache.get(key)
+            if cached and time.monotonic() - cached[0] < ttl:
+                return cached[1]
+            data = await self._fetch_document(collection, doc_id)
+            if data is not None:  # None may be a transient error; don't pin it
+                self._doc_cache[key] = (time.monotonic(), data)
+        return data
+
+    def _evict_document(self, collection: str, doc_id: str) -> None:
+        self._doc_cache.pop((collection, doc_id), None)
+
+    async def _fetch_document(self, collection: str, doc_id: str) -> Optional[Dict[str, Any]]:
         try:
             doc_ref: BaseDocumentReference = self.db.collection(collection).document(doc_id)
             # await the get() call
             doc = await doc_ref.get()
             return doc.to_dict() if doc.exists else None
-        except Exception as e:
-            print(f"Error getting document {collection}/{doc_id}: {e}")
+        except Exception:
+            logger.exception("Error getting document %s/%s", collection, doc_id)
             return None  # Return None on error
 
     async def set_document(self, collection: str, doc_id: str, data: Dict[str, Any]) -> bool:
         """Create or update a document in Firestore."""
+        self._evict_document(collection, doc_id)
         try:
             doc_ref: BaseDocumentReference = self.db.collection(collection).document(doc_id)
             # await the set() call
             _: WriteResult = await doc_ref.set(data)  # Result is not usually awaited
             return True
-        except Exception as e:
-            print(f"Error setting document {collection}/{doc_id}: {e}")
+        except Exception:
+            logger.exception("Error setting document %s/%s", collection, doc_id)
             return False  # Return False on error
 
     async def update_document(self, collection: str, doc_id: str, data: Dict[str, Any]) -> bool:
         """Update fields in a document."""
+        self._evict_document(collection, doc_id)
         try:
             doc_ref: BaseDocumentReference = self.db.collection(collection).document(doc_id)
             # await the update() call
             _: WriteResult = await doc_ref.update(data)  # Result is not usually awaited
             return True
-        except Exception as e:
-            print(f"Error updating document {collection}/{doc_id}: {e}")
+        except Exception:
+            logger.exception("Error updating document %s/%s", collection, doc_id)
             return False  # Return False on error
 
     async def delete_document(self, collection: str, doc_id: str) -> bool:
         """Delete a document from Firestore."""
+        self._evict_document(collection, doc_id)
         try:
             doc_ref: BaseDocumentReference = self.db.collection(collection).document(doc_id)
             # await the delete() call
             _: WriteResult = await doc_ref.delete()  # Result is not usually awaited
             return True
-        except Exception as e:
-            print(f"Error deleting document {collection}/{doc_id}: {e}")
+        except Exception:
+            logger.exception("Error deleting document %s/%s", collection, doc_id)
             return False  # Return False on error
 
-    async def query_collection(self, collection: str, filters: Optional[List[tuple]] = None,
-                               order_by: Optional[tuple] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
-        """Query a collection with optional filters, ordering, and limit."""
+    async def batch_write(self, operations: List[Tuple[str, str, str, Optional[Dict[str, Any]]]]) -> bool:
+        """Apply several writes atomically with a single commit.
+
+        Each operation is (op, collection, doc_id, data), where op is 'set', 'merge' (set with merge=True),
+        'create' (fails the batch if the document exists), 'update' or 'delete' (data is ignored).
+        """
+        batch = self.db.batch()
+        for op, collection, doc_id, data in operations:
+            self._evict_document(collection, doc_id)
+            doc_ref: BaseDocumentReference = self.db.collection(collection).document(doc_id)
+            if op == 'set':
+                batch.set(doc_ref, data)
+            elif op == 'merge':
+                batch.set(doc_ref, data, merge=True)
+            elif op == 'create':
+                batch.create(doc_ref, data)
+            elif op == 'update':
+                batch.update(doc_ref, data)
+            elif op == 'delete':
+                batch.delete(doc_ref)
+            else:
+                raise ValueError(f"Unknown batch operation: {op}")
         try:
-            query: AsyncQuery = self.db.collection(collection)
+            await batch.commit()
+            return True
+        except Exception:
+            logger.exception("Error committing batch of %d writes", len(operations))
+            return False  # Return False on error
+
+    def _build_query(self, collection: str, filters: Optional[List[tuple]] = None,
+                     order_by: Optional[tuple] = None, limit: Optional[int] = None,
+                     any_of: Optional[List[tuple]] = None,
+                     start_after: Optional[Dict[str, Any]] = None) -> AsyncQuery:
+        query: AsyncQuery = self.db.collection(collection)
+
+        if filters:
+            for field, op, value in filters:
+                # Use keyword filter= argument
+                query = query.where(filter=FieldFilter(field, op, value))
+
+        if any_of:
+            # One OR query replaces a union of per-branch queries (and their client-side merge)
+            query = query.where(filter=Or([FieldFilter(field, op, value) for field, op, value in any_of]))
+
+        if order_by:
+            field, direction_str = order_by
+            direction = Query.DESCENDING if direction_str == 'DESCENDING' else Query.ASCENDING
+            query = query.order_by(field, direction=direction)
+
+        if start_after:
+            # Keyset cursor: Firestore seeks past these order_by values instead of re-reading earlier pages
+            query = query.start_after(start_after)
+
+        if limit:
+            query = query.limit(limit)
 
-            if filters:
-                for field, op, value in filters:
-                    # Use keyword filter= argument
-                    query = query.where(filter=FieldFilter(field, op, value))
+        return query
 
-            if order_by:
-                field, direction_str = order_by
-                direction = Query.DESCENDING if direction_str == 'DESCENDING' else Query.ASCENDING
-                query = query.order_by(field, direction=direction)
+    async def query_collection(self, collection: str, filters: Optional[List[tuple]] = None,
+                               order_by: Optional[tuple] = None, limit: Optional[int] = None,
+                               select: Optional[List[str]] = None,
+                               any_of: Optional[List[tuple]] = None,
+                               start_after: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Query a collection with optional filters, ordering, and limit.
+
+        All `filters` must match; when `any_of` is given, at least one of its filters must match as well.
+        With `select`, Firestore returns only those fields, so each dict holds just them.
+        `start_after` maps the `order_by` field to a value from the previous page's last document.
+        """
+        try:
+            query = self._build_query(collection, filters, order_by, limit, any_of, start_after)
 
-            if limit:
-                query = query.limit(limit)
+            if select:
+                query = query.select(select)
 
             # Use await query.get()
             docs_snapshot = await query.get()
             return [doc.to_dict() for doc in docs_snapshot if doc.exists]
 
-        except Exception as e:
-            print(f"Error querying collection {collection}: {e}")
+        except Exception:
+            logger.exception("Error querying collection %s", collection)
             return []  # Return empty list on error
 
-    # verify_token remains the same (it's synchronous)
-    def verify_token(self, id_token: str) -> Optional[Dict[str, Any]]:
+    async def stream_collection(self, collection: str, filters: Optional[List[tuple]] = None,
+                                order_by: Optional[tuple] = None, limit: Optional[int] = None,
+                                select: Optional[List[str]] = None,
+                                any_of: Optional[List[tuple]] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Like query_collection, but yield documents one at a time so large scans can aggregate as they go.
+
+        Unlike query_collection, errors are re-raised (even mid-stream), so callers never fold a partial
+        read into totals that look complete.
+        """
+        try:
+            query = self._build_query(collection, filters, order_by, limit, any_of)
+            if select:
+                query = query.select(select)
+            async for doc in query.stream():
+                if doc.exists:
+                    yield doc.to_dict()
+        except Exception:
+            logger.exception("Error streaming collection %s", collection)
+            raise
+
+    async def verify_token(self, id_token: str) -> Optional[Dict[str, Any]]:
         """Verify Firebase ID token."""
         try:
-            decoded_token = self._auth.verify_id_token(id_token)
+            # firebase_admin's auth is sync (and may fetch public keys over HTTP); keep it off the event loop
+            decoded_token = await asyncio.get_running_loop().run_in_executor(
+                None, self._auth.verify_id_token, id_token)
             return decoded_token
         except Exception as e:
-            print(f"Error verifying token: {e}")
+            logger.warning("Error verifying token: %s", e)  # Expected for bad tokens; no traceback
             return None
@@ -1,17 +1,30 @@
+import asyncio
 import uuid
 from datetime import datetime, timezone
-from typing import Optional, List
+from typing import Optional, List, Literal
 
 # Import necessary types for async Firestore
 from google.cloud.firestore_v1.async_client import AsyncClient
 from google.cloud.firestore_v1.async_query import AsyncQuery
 from google.cloud.firestore_v1.transaction import Transaction # Correct import
-from google.cloud.firestore_v1 import FieldFilter, Increment, ArrayUnion, async_transactional
+from google.cloud.firestore_v1 import FieldFilter, Increment, async_transactional
+from pydantic import TypeAdapter
 # Keep models
 from models.friend import FriendRequest, FriendStatus, FriendRequestStatus
 from .base_service import BaseService
 
 
+# Validate a whole query result in one pydantic-core call instead of one model constructor call per document
+_REQUEST_LIST = TypeAdapter(List[FriendRequest])
+_STATUS_LIST = TypeAdapter(List[FriendStatus])
+
+# Status value every pending-request query filters on
+_PENDING = FriendRequestStatus.PENDING.value
+
+# Outcome of respond_to_request_checked, mapped to HTTP statuses by the route
+RespondOutcome = Literal['ok', 'not_found', 'forbidden', 'stale', 'error']
+
+
 class FriendService(BaseService):
     def __init__(self, db: AsyncClient): # Use AsyncClient
         super().__init__(db)
@@ -23,19 +36,14 @@ class FriendService(BaseService):
             print(f"Attempt to send friend request to self blocked: {sender_id}")
             return False
 
-        status_key = f"{sender_id}_{receiver_id}"
-        # Ensure get_document is awaited (fixed in BaseService)
-        existing_friendship = await self.get_document(self.friends_collection, status_key)
-        if existing_friendship:
-            print(f"Users {sender_id} and {receiver_id} are already friends.")
-            return False
+        status_ref = self.db.collection(self.friends_collection).document(f"{sender_id}_{receiver_id}")
 
         query1: AsyncQuery = self.db.collection(self.requests_collection).where(
             filter=FieldFilter('sender_id', '==', sender_id)
         ).where(
             filter=FieldFilter('receiver_id', '==', receiver_id)
         ).where(
-            filter=FieldFilter('status', '==', FriendRequestStatus.PENDING.value)
+            filter=FieldFilter('status', '==', _PENDING)
         ).limit(1)
 
         query2: AsyncQuery = self.db.collection(self.requests_collection).where(
@@ -43,84 +51,106 @@ class FriendService(BaseService):
         ).where(
             filter=FieldFilter('receiver_id', '==', sender_id)
         ).where(
-            filter=FieldFilter('status', '==', FriendRequestStatus.PENDING.value)
+            filter=FieldFilter('status', '==', _PENDING)
         ).limit(1)
 
-        # Await query.get()
-        existing_sent_docs = await query1.get()
-        existing_received_docs = await query2.get()
-
-        if existing_sent_docs or existing_received_docs:
-            print(f"Pending friend request already exists between {sender_id} and {receiver_id}.")
-            return False
-
         request = FriendRequest(
             request_id=f"req_{uuid.uuid4().hex}", # Add prefix for clarity
             sender_id=sender_id,
             receiver_id=receiver_id,
             message=message,
         )
-        # Ensure set_document is awaited (fixed in BaseService)
-        return await self.set_document(self.requests_collection, request.request_id,
-                                       request.model_dump(mode='json'))
+        request_ref = self.db.collection(self.requests_collection).document(request.request_id)
+
+        @async_transactional
+        async def send_in_transaction(transaction: Transaction) -> bool:
+            # Reading inside the transaction makes a concurrent send (in either direction) retry
+            # against the committed request instead of creating a duplicate
+            # The friendship read and the two direction checks are independent; run them concurrently
+            friendship, existing_sent_docs, existing_received_docs = await asyncio.gather(
+                status_ref.get(transaction=transaction),
+                query1.get(transaction=transaction),
+                query2.get(transaction=transaction)
+            )
+            if friendship.exists:
+                print(f"Users {sender_id} and {receiver_id} are already friends.")
+                return False
+            if existing_sent_docs or existing_received_docs:
+                print(f"Pending friend request already exists between {sender_id} and {receiver_id}.")
+                return False
+
+            transaction.set(request_ref, request.model_dump(mode='json'))
+            return True
+
+        try:
+            return await send_in_transaction(self.db.transaction())
+        except Exception as e:
+            print(f"Error sending friend request {sender_id} -> {receiver_id} in transaction: {e}")
+            return False
 
     async def get_friend_request(self, request_id: str) -> Optional[FriendRequest]:
         # Uses get_document (fixed in BaseService)
         data = await self.get_document(self.requests_collection, request_id)
-        return FriendRequest(**data) if data else None
+        return FriendRequest.model_validate(data) if data else None
 
     async def get_pending_requests(self, user_id: str) -> List[FriendRequest]:
         query: AsyncQuery = self.db.collection(self.requests_collection).where(
             filter=FieldFilter('receiver_id', '==', user_id)
         ).where(
-            filter=FieldFilter('status', '==', FriendRequestStatus.PENDING.value)
+            filter=FieldFilter('status', '==', _PENDING)
         )
         # Await query.get()
         results_docs = await query.get()
-        return [FriendRequest(**doc.to_dict()) for doc in results_docs if doc.exists]
+        return _REQUEST_LIST.validate_python([doc.to_dict() for doc in results_docs if doc.exists])
 
-    async def respond_to_request(self, request_id: str, accept: bool) -> bool:
-        # Await get_document (fixed in BaseService)
-        request_data = await self.get_document(self.requests_collection, request_id)
-        if not request_data:
-            return False
-        try:
-            request = FriendRequest(**request_data)
-        except Exception as e:
-             print(f"Error parsing friend request data {request_id}: {e}")
-             return False
-
-        if request.status != FriendRequestStatus.PENDING:
-            print(f"Request {request_id} is not pending, cannot respond.")
-            return False
-
-        status = FriendRequestStatus.ACCEPTED if accept else FriendRequestStatus.REJECTED
-        # Await update_document (fixed in BaseService)
-        update_success = await self.update_document(
+    async def get_pending_request_ids(self, user_id: str) -> List[str]:
+        # Projection query: only request_id comes back, and no FriendRequest models are built
+        docs = await self.query_collection(
             self.requests_collection,
-            request_id,
-            {'status': status.value, 'updated_at': datetime.now(timezone.utc)}
+            filters=[('receiver_id', '==', user_id), ('status', '==', _PENDING)],
+            select=['request_id']
         )
-        if not update_success:
-             print(f"Failed to update request status for {request_id}")
-             return False # Return early if update failed
+        return [doc['request_id'] for doc in docs]
+
+    async def respond_to_request(self, request_id: str, accept: bool) -> bool:
+        # Same read-check-write transaction as the checked variant, without restricting who may respond
+        return await self.respond_to_request_checked(request_id, None, accept) == 'ok'
 
-        if accept:
-            friend_status1 = FriendStatus(user_id=request.sender_id, friend_id=request.receiver_id)
-            friend_status2 = FriendStatus(user_id=request.receiver_id, friend_id=request.sender_id)
-            status_key1 = f"{request.sender_id}_{request.receiver_id}"
-            status_key2 = f"{request.receiver_id}_{request.sender_id}"
+    async def respond_to_request_checked(self, request_id: str, receiver_id: Optional[str],
+                                         accept: bool) -> RespondOutcome:
+        """Verify and apply a response to a friend request in one Firestore transaction.
 
-            # Await set_document (fixed in BaseService)
-            set1_success = await self.set_document(self.friends_collection, status_key1, friend_status1.model_dump(mode='json'))
-            set2_success = await self.set_document(self.friends_collection, status_key2, friend_status2.model_dump(mode='json'))
+        When receiver_id is given, only that user may respond.
+        """
+        request_ref = self.db.collection(self.requests_collection).document(request_id)
+        status = FriendRequestStatus.ACCEPTED if accept else FriendRequestStatus.REJECTED
 
-            if not (set1_success and set2_success):
-                print(f"Warning: Failed to create one or both friend status entries for request {request_id}")
-                # Consider cleanup logic here (e.g., delete the one that succeeded)
-                return False # Return False if setting friend status fails
+        @async_transactional
+        async def respond_in_transaction(transaction: Transaction) -> RespondOutcome:
+            snapshot = await request_ref.get(transaction=transaction)
+            if not snapshot.exists:
+                return 'not_found'
+            request = FriendRequest.model_validate(snapshot.to_dict())
+            if receiver_id is not None and request.receiver_id != receiver_id:
+                return 'forbidden'
+            if request.status != FriendRequestStatus.PENDING:
+                return 'stale'
+
+            # The status change and both friendship entries commit together (or not at all)
+            transaction.update(request_ref, {'status': status.value, 'updated_at': datetime.now(timezone.utc)})
+            if accept:
+                for user_id, friend_id in ((request.sender_id, request.receiver_id),
+                                           (request.receiver_id, request.sender_id)):
+                    friend_status = FriendStatus(user_id=user_id, friend_id=friend_id)
+                    status_ref = self.db.collection(self.friends_collection).document(f"{user_id}_{friend_id}")
+                    transaction.set(status_ref, friend_status.model_dump(mode='json'))
+            return 'ok'
 
-        return True # Return True only if all steps succeeded
+        try:
+            return await respond_in_transaction(self.db.transaction())
+        except Exception as e:
+            print(f"Error responding to friend request {request_id} in transaction: {e}")
+            return 'error'
 
     async def get_friends(self, user_id: str) -> List[FriendStatus]:
         query: AsyncQuery = self.db.collection(self.friends_collection).where(
@@ -128,7 +158,12 @@ class FriendService(BaseService):
         )
         # Await query.get()
         results_docs = await query.get()
-        return [FriendStatus(**doc.to_dict()) for doc in results_docs if doc.exists]
+        return _STATUS_LIST.validate_python([doc.to_dict() for doc in results_docs if doc.exists])
+
+    async def get_friend_ids(self, user_id: str) -> List[str]:
+        docs = await self.query_collection(self.friends_collection, filters=[('user_id', '==', user_id)],
+                                           select=['friend_id'])
+        return [doc['friend_id'] for doc in docs]
 
     async def remove_friend(self, user_id: str, friend_id: str) -> bool:
         status_key1 = f"{user_id}_{friend_id}"
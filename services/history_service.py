@@ -1,135 +1,197 @@
+import asyncio
+import logging
+from collections import Counter
 from datetime import datetime, timedelta, timezone  # Use timezone
 from typing import Optional, List, Dict, Any
+from urllib.parse import quote
 
 from google.cloud import firestore
+from google.cloud.firestore_v1 import Increment
+from pydantic import TypeAdapter
 
 from models.game_history import GameHistory, GameResult
-from .base_service import BaseService
-from services.profile_service import ProfileService  # Import at class level
+from .base_service import BaseService, MAX_BATCH_WRITES
+from services.profile_service import ProfileService
+from utils.result_cache import cached_result
+
+logger = logging.getLogger(__name__)
+
+# Query results are validated as one list, not game by game
+_GAME_LIST = TypeAdapter(List[GameHistory])
+
+
+def _player_pair(player1_id: str, player2_id: str) -> List[str]:
+    """Order-independent key for a pairing, stored on each game for equality lookups."""
+    return sorted((player1_id, player2_id))
+
+
+# The only fields get_user_stats reads; the move list is the bulk of a game doc and is left on the server
+_STATS_FIELDS = ['game_id', 'white_player_id', 'result', 'rating_change', 'start_time', 'end_time', 'total_moves']
+
+# The result that counts as a win for a player of each colour
+_WINNING_RESULT = {'white': GameResult.WHITE_WIN, 'black': GameResult.BLACK_WIN}
+
+
+def _as_datetime(value: Any) -> datetime:
+    """Firestore returns timestamps as datetimes; ISO strings come from JSON-serialized data."""
+    return value if isinstance(value, datetime) else datetime.fromisoformat(str(value))
+
+
+def _opening_key(moves: List[str]) -> Optional[str]:
+    """The first three moves, which is what opening statistics group games by."""
+    return ' '.join(moves[:3]) if len(moves) >= 3 else None
+
 
 class HistoryService(BaseService):
-    def __init__(self, db: firestore.AsyncClient):
+    def __init__(self, db: firestore.AsyncClient, profile_service: Optional[ProfileService] = None):
         super().__init__(db)
         self.collection = 'game_history'
+        # Pass the app's ProfileService so rating writes evict the profiles it caches
+        self.profile_service = profile_service or ProfileService(db)
+        # One counters doc per opening, maintained by archive_game
+        self.openings_collection = 'opening_counters'
 
     async def archive_game(self, game: GameHistory) -> bool:
         """Archive a completed game."""
         # FIX: Use model_dump() instead of dict()
-        success = await self.set_document(self.collection, game.game_id, game.model_dump())
-        
-        # If game was successfully archived, update player profiles
-        if success:
-            # Create profile service
-            profile_service = ProfileService(self.db)
-            
-            # Fetch current player profiles to get accurate ratings
-            white_profile = await profile_service.get_profile(game.white_player_id)
-            black_profile = await profile_service.get_profile(game.black_player_id)
-            
-            # Use current ratings from profiles if available, otherwise use game data
-            white_current_rating = white_profile.rating if white_profile else game.white_rating
-            black_current_rating = black_profile.rating if black_profile else game.black_rating
-            
-            # Calculate new ratings with rating changes
-            white_new_rating = white_current_rating + game.rating_change.get('white', 0)
-            black_new_rating = black_current_rating + game.rating_change.get('black', 0)
-            
-            # Update white player profile
-            white_result = {'result': 'win' if game.result == GameResult.WHITE_WIN else 
-                                     'loss' if game.result == GameResult.BLACK_WIN else 'draw'}
-            await profile_service.update_rating(
-                game.white_player_id, 
-                white_new_rating, 
-                white_result
-            )
-            
-            # Update black player profile
-            black_result = {'result': 'win' if game.result == GameResult.BLACK_WIN else 
-                                     'loss' if game.result == GameResult.WHITE_WIN else 'draw'}
-            await profile_service.update_rating(
-                game.black_player_id, 
-                black_new_rating, 
-                black_result
+        data = game.model_dump()
+        # Denormalized lookup keys: a player's games are one array_contains query, a pairing's one equality query
+        data['player_ids'] = [game.white_player_id, game.black_player_id]
+        data['player_pair'] = _player_pair(game.white_player_id, game.black_player_id)
+        data['total_moves'] = len(game.moves)  # Lets stats queries skip the move list
+        # create, not set: a retried archive of the same game fails the batch instead of counting it twice
+        writes = [('create', self.collection, game.game_id, data)]
+
+        # The game and its opening's counters commit together, so the counts never drift from the archive
+        opening_key = _opening_key(game.moves)
+        if opening_key:
+            counters = {'moves': opening_key, 'count': Increment(1)}
+            if game.result in (GameResult.WHITE_WIN, GameResult.BLACK_WIN):  # Decisive games only
+                counters['wins'] = Increment(1)
+            writes.append(('merge', self.openings_collection, quote(opening_key, safe=''), counters))
+        success = await self.batch_write(writes)
+        if not success:
+            # Already archived (e.g. a client retry after a lost response): report it as done, without
+            # applying the rating changes again
+            return await self.get_document(self.collection, game.game_id) is not None
+
+        # The game was archived by this call, so update player profiles
+        profile_service = self.profile_service
+
+        # Fetch current player profiles to get accurate ratings; the two reads are independent
+        white_profile, black_profile = await asyncio.gather(
+            profile_service.get_profile(game.white_player_id),
+            profile_service.get_profile(game.black_player_id)
+        )
+
+        white_result = {'result': 'win' if game.result == GameResult.WHITE_WIN else
+                                 'loss' if game.result == GameResult.BLACK_WIN else 'draw'}
+        black_result = {'result': 'win' if game.result == GameResult.BLACK_WIN else
+                                 'loss' if game.result == GameResult.WHITE_WIN else 'draw'}
+
+        # Both players' rating updates commit in one batch. A player without a profile has nothing
+        # to update (and an update of a missing document would fail the whole batch).
+        rating_updates = [
+            ('update', profile_service.collection, player_id,
+             profile_service.build_rating_update(profile.rating + game.rating_change.get(colour, 0), result))
+            for player_id, profile, colour, result in (
+                (game.white_player_id, white_profile, 'white', white_result),
+                (game.black_player_id, black_profile, 'black', black_result)
             )
-        
-        return success
+            if profile
+        ]
+        if rating_updates:
+            await profile_service.batch_write(rating_updates)
+
+        return True
+
+    async def rebuild_history_aggregates(self) -> Dict[str, int]:
+        """Backfill what archive_game maintains for games archived before it did.
+
+        Adds player_ids, player_pair and total_moves to games missing them, and recomputes every
+        opening counters doc from the archived games. Counters are overwritten, so it is safe to rerun.
+        Returns how many games were read, how many were updated, and how many openings were counted.
+        """
+        writes = []
+        games_read = 0
+        counts, wins = Counter(), Counter()
+        async for game_data in self.stream_collection(self.collection):  # Raises rather than counting a partial read
+            try:
+                game_id = game_data['game_id']
+                white_id, black_id = game_data['white_player_id'], game_data['black_player_id']
+                moves = game_data['moves']
+                result = game_data['result']
+            except Exception as e:
+                logger.warning("Skipping game data in backfill due to parsing error: %s, Error: %s",
+                               game_data.get('game_id'), e)
+                continue
+
+            games_read += 1
+            if not {'player_ids', 'player_pair', 'total_moves'} <= game_data.keys():
+                writes.append(('update', self.collection, game_id, {
+                    'player_ids': [white_id, black_id],
+                    'player_pair': _player_pair(white_id, black_id),
+                    'total_moves': len(moves),
+                }))
+            opening_key = _opening_key(moves)
+            if opening_key:
+                counts[opening_key] += 1
+                if result in (GameResult.WHITE_WIN, GameResult.BLACK_WIN):
+                    wins[opening_key] += 1
+
+        games_updated = len(writes)
+        writes.extend(('set', self.openings_collection, quote(key, safe=''),
+                       {'moves': key, 'count': count, 'wins': wins[key]})
+                      for key, count in counts.items())
+        for start in range(0, len(writes), MAX_BATCH_WRITES):
+            if not await self.batch_write(writes[start:start + MAX_BATCH_WRITES]):
+                raise RuntimeError("Failed to write game history backfill")
+        return {'games': games_read, 'games_updated': games_updated, 'openings': len(counts)}
 
     async def get_game(self, game_id: str) -> Optional[GameHistory]:
         """Retrieve a specific game by ID."""
         data = await self.get_document(self.collection, game_id)
-        return GameHistory(**data) if data else None
-
-    async def get_user_games(self, user_id: str, limit: int = 50) -> List[GameHistory]:
-        """Get recent games for a user."""
-        # BaseService query needs adjustment for OR logic simulation or use two queries
-        # Assuming BaseService query is adapted or this method runs two queries
-        # If using BaseService's current implementation, it might only query one field.
-        # Let's assume the service logic ORs the results from two queries if necessary.
-
-        # Query for games where user is white
-        filters_white = [('white_player_id', '==', user_id)]
-        white_games_data = await self.query_collection(
-            self.collection,
-            filters=filters_white,
-            order_by=('end_time', 'DESCENDING'),
-            limit=limit  # Apply limit here too, although final sort/limit is better
-        )
+        return GameHistory.model_validate(data) if data else None
 
-        # Query for games where user is black
-        filters_black = [('black_player_id', '==', user_id)]
-        black_games_data = await self.query_collection(
-            self.collection,
-            filters=filters_black,
-            order_by=('end_time', 'DESCENDING'),
-            limit=limit
-        )
+    async def get_user_games(self, user_id: str, limit: int = 50,
+                             start_after: Optional[datetime] = None) -> List[GameHistory]:
+        """Get recent games for a user.
 
-        # Combine, remove duplicates (if any, though unlikely with unique IDs), sort, and limit
-        all_games_data = {game['game_id']: game for game in white_games_data + black_games_data}
-        sorted_games = sorted(all_games_data.values(), key=lambda x: x['end_time'], reverse=True)
-
-        return [GameHistory(**data) for data in sorted_games[:limit]]
-
-    async def get_games_between_players(self, player1_id: str, player2_id: str, limit: int = 10) -> List[GameHistory]:
-        """Get recent games between two specific players."""
-        # Query for player1 as white, player2 as black
-        filters1 = [('white_player_id', '==', player1_id), ('black_player_id', '==', player2_id)]
-        games1_data = await self.query_collection(
+        For the next page, pass the end_time of the last game returned as start_after.
+        """
+        # Either colour: player_ids holds both players, so one indexed query replaces a white and a black query
+        # (composite index in firestore.indexes.json)
+        games_data = await self.query_collection(
             self.collection,
-            filters=filters1,
+            filters=[('player_ids', 'array_contains', user_id)],
             order_by=('end_time', 'DESCENDING'),
-            limit=limit
+            limit=limit,
+            start_after={'end_time': start_after} if start_after else None
         )
+        return _GAME_LIST.validate_python(games_data)
 
-        # Query for player2 as white, player1 as black
-        filters2 = [('white_player_id', '==', player2_id), ('black_player_id', '==', player1_id)]
-        games2_data = await self.query_collection(
+    async def get_games_between_players(self, player1_id: str, player2_id: str, limit: int = 10,
+                                        start_after: Optional[datetime] = None) -> List[GameHistory]:
+        """Get recent games between two specific players, paged like get_user_games."""
+        # player_pair is the same for both colour assignments, so one equality query covers them
+        # (composite index in firestore.indexes.json)
+        games_data = await self.query_collection(
             self.collection,
-            filters=filters2,
+            filters=[('player_pair', '==', _player_pair(player1_id, player2_id))],
             order_by=('end_time', 'DESCENDING'),
-            limit=limit
+            limit=limit,
+            start_after={'end_time': start_after} if start_after else None
         )
+        return _GAME_LIST.validate_python(games_data)
 
-        # Combine, sort by end_time descending, and take the top 'limit' results
-        all_games_data = {game['game_id']: game for game in games1_data + games2_data}
-        sorted_games = sorted(all_games_data.values(), key=lambda x: x['end_time'], reverse=True)
-
-        return [GameHistory(**data) for data in sorted_games[:limit]]
-
+    @cached_result(ttl=60)
     async def get_user_stats(self, user_id: str, days: int = 30) -> Dict[str, Any]:
         """Get user's game statistics for a specific time period."""
         # FIX: Use timezone.utc
         start_date = datetime.now(timezone.utc) - timedelta(days=days)
 
-        # Combine filters for BaseService or run two queries as above
-        # Running two queries for clarity:
-        filters_white = [('white_player_id', '==', user_id), ('end_time', '>=', start_date)]
-        white_games = await self.query_collection(self.collection, filters=filters_white)
-
-        filters_black = [('black_player_id', '==', user_id), ('end_time', '>=', start_date)]
-        black_games = await self.query_collection(self.collection, filters=filters_black)
-
-        all_user_games_data = {game['game_id']: game for game in white_games + black_games}
+        # Composite index in firestore.indexes.json
+        filters = [('player_ids', 'array_contains', user_id), ('end_time', '>=', start_date)]
 
         stats = {
             'total_games': 0, 'wins': 0, 'losses': 0, 'draws': 0,
@@ -138,84 +200,77 @@ class HistoryService(BaseService):
         }
         total_duration = 0
 
-        for game_data in all_user_games_data.values():
+        # The window is unbounded, so fold games in as they stream rather than holding them all
+        async for game_data in self.stream_collection(self.collection, filters=filters, select=_STATS_FIELDS):
+            # Read the stored fields directly: validating a whole GameHistory per row cost more than the sums.
+            # Everything a row contributes is extracted first, so a malformed row is skipped without partial counts.
             try:
-                game = GameHistory(**game_data)
-                stats['total_games'] += 1
-
-                is_white = game.white_player_id == user_id
-                if is_white:
-                    stats['white_games'] += 1
-                    stats['rating_change'] += game.rating_change.get('white', 0)  # Use .get for safety
-                else:
-                    stats['black_games'] += 1
-                    stats['rating_change'] += game.rating_change.get('black', 0)  # Use .get for safety
-
-                if game.result == GameResult.WHITE_WIN:
-                    if is_white:
-                        stats['wins'] += 1
-                    else:
-                        stats['losses'] += 1
-                elif game.result == GameResult.BLACK_WIN:
-                    if not is_white:
-                        stats['wins'] += 1
-                    else:
-                        stats['losses'] += 1
-                elif game.result == GameResult.DRAW:
-                    stats['draws'] += 1
-
-                stats['total_moves'] += len(game.moves)
-                # Ensure end_time and start_time are datetime objects
-                end_time = game.end_time if isinstance(game.end_time, datetime) else datetime.fromisoformat(
-                    str(game.end_time))
-                start_time = game.start_time if isinstance(game.start_time, datetime) else datetime.fromisoformat(
-                    str(game.start_time))
-                total_duration += (end_time - start_time).total_seconds()
+                colour = 'white' if game_data['white_player_id'] == user_id else 'black'
+                result = game_data['result']
+                rating_change = game_data['rating_change'].get(colour, 0)  # Use .get for safety
+                moves = game_data['total_moves']
+                duration = (_as_datetime(game_data['end_time']) - _as_datetime(game_data['start_time'])).total_seconds()
             except Exception as e:
-                print(f"Warning: Skipping game data due to parsing error: {game_data.get('game_id')}, Error: {e}")
+                logger.warning("Skipping game data due to parsing error: %s, Error: %s", game_data.get('game_id'), e)
                 continue  # Skip problematic game data
 
+            stats['total_games'] += 1
+            stats[f'{colour}_games'] += 1
+            stats['rating_change'] += rating_change
+            if result == _WINNING_RESULT[colour]:
+                stats['wins'] += 1
+            elif result in (GameResult.WHITE_WIN, GameResult.BLACK_WIN):
+                stats['losses'] += 1
+            elif result == GameResult.DRAW:
+                stats['draws'] += 1
+            stats['total_moves'] += moves
+            total_duration += duration
+
         if stats['total_games'] > 0:
             stats['average_game_length'] = total_duration / stats['total_games']
 
         return stats
 
+    @cached_result(ttl=120)
     async def get_popular_openings(self, limit: int = 10) -> List[Dict[str, Any]]:
-        """Get most popular opening moves from recent games."""
-        # Consider adding a date filter here for performance (e.g., last 30 days)
-        results = await self.query_collection(
-            self.collection,
-            order_by=('end_time', 'DESCENDING'),
-            limit=1000  # Sample size limit
+        """Get most popular opening moves across archived games."""
+        counters = await self.query_collection(
+            self.openings_collection,
+            order_by=('count', 'DESCENDING'),
+            limit=limit,
+            select=['moves', 'count', 'wins']
         )
+        if counters:
+            return [{'moves': c['moves'], 'count': c['count'], 'wins': c.get('wins', 0)} for c in counters]
 
-        openings = {}
-        for game_data in results:
-            try:
-                # Ensure data is parsed into the model
-                game = GameHistory(**game_data)
-                if len(game.moves) >= 3:  # Consider first 3 moves as opening
-                    opening_key = ' '.join(game.moves[:3])
-                    if opening_key not in openings:
-                        openings[opening_key] = {'count': 0, 'wins': 0}  # Initialize wins
-                    openings[opening_key]['count'] += 1
-
-                    # FIX: Correctly count wins based on result, regardless of winner_id presence
-                    # Count decisive wins (not draws or abandoned)
-                    if game.result == GameResult.WHITE_WIN or game.result == GameResult.BLACK_WIN:
-                        openings[opening_key]['wins'] += 1
+        # Nothing archived since counters existed: sample recent games instead
+        return await self._scan_popular_openings(limit)
 
+    async def _scan_popular_openings(self, limit: int) -> List[Dict[str, Any]]:
+        # Consider adding a date filter here for performance (e.g., last 30 days)
+        # Openings are keyed by move tuple and only joined into display strings for the ones returned
+        counts, wins = Counter(), Counter()
+        async for game_data in self.stream_collection(
+                self.collection,
+                order_by=('end_time', 'DESCENDING'),
+                limit=1000,  # Sample size limit
+                select=['game_id', 'moves', 'result']
+        ):
+            try:
+                # Only two fields are needed, so read them without validating a whole GameHistory
+                opening = tuple(game_data['moves'][:3])  # Consider first 3 moves as opening
+                result = game_data['result']
             except Exception as e:
-                print(
-                    f"Warning: Skipping game data in opening stats due to parsing error: "
-                    f"{game_data.get('game_id')}, Error: {e}")
+                logger.warning("Skipping game data in opening stats due to parsing error: %s, Error: %s",
+                               game_data.get('game_id'), e)
                 continue
 
-        # Sort by popularity
-        popular_openings = sorted(
-            [{'moves': k, **v} for k, v in openings.items()],
-            key=lambda x: x['count'],
-            reverse=True
-        )
+            if len(opening) == 3:
+                counts[opening] += 1
+                # Count decisive wins (not draws or abandoned)
+                if result in (GameResult.WHITE_WIN, GameResult.BLACK_WIN):
+                    wins[opening] += 1
 
-        return popular_openings[:limit]
+        # Most popular first
+        return [{'moves': ' '.join(opening), 'count': count, 'wins': wins[opening]}
+                for opening, count in counts.most_common(limit)]
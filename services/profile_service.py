@@ -1,11 +1,22 @@
 from datetime import datetime, timezone  # Use timezone
 from typing import Optional, Dict, Any, List
 
-from firebase_admin import firestore
 from google.cloud import firestore
+from pydantic import TypeAdapter
 from models.user_profile import UserProfile
+from utils.result_cache import cached_result
 from .base_service import BaseService
 
+# Validates a query result in a single call
+_PROFILE_LIST = TypeAdapter(List[UserProfile])
+
+# Counter increments for each game result, built once; update_rating only adds the new rating.
+# Anything other than a win or a loss counts as a draw.
+_WIN_UPDATE = {'games_played': firestore.Increment(1), 'wins': firestore.Increment(1)}
+_LOSS_UPDATE = {'games_played': firestore.Increment(1), 'losses': firestore.Increment(1)}
+_DRAW_UPDATE = {'games_played': firestore.Increment(1), 'draws': firestore.Increment(1)}
+_RESULT_UPDATES = {'win': _WIN_UPDATE, 'loss': _LOSS_UPDATE}
+
 
 class ProfileService(BaseService):
     def __init__(self, db: firestore.AsyncClient):
@@ -17,10 +28,13 @@ class ProfileService(BaseService):
         # FIX: Use model_dump() instead of dict()
         return await self.set_document(self.collection, profile.uid, profile.model_dump())
 
-    async def get_profile(self, uid: str) -> Optional[UserProfile]:
-        """Retrieve a user profile by UID."""
-        data = await self.get_document(self.collection, uid)
-        return UserProfile(**data) if data else None
+    async def get_profile(self, uid: str, ttl: float = 0) -> Optional[UserProfile]:
+        """Retrieve a user profile by UID.
+
+        Pass a ttl only for display reads; anything that writes back derived values (ratings) needs a fresh read.
+        """
+        data = await self.get_document(self.collection, uid, ttl=ttl)
+        return UserProfile.model_validate(data) if data else None
 
     async def update_profile(self, uid: str, updates: Dict[str, Any]) -> bool:
         """Update specific fields in a user profile."""
@@ -30,19 +44,12 @@ class ProfileService(BaseService):
 
     async def update_rating(self, uid: str, new_rating: int, game_result: Dict[str, Any]) -> bool:
         """Update user's rating and game statistics."""
-        updates = {
-            'rating': new_rating,
-            'games_played': firestore.Increment(1),
-        }
+        return await self.update_document(self.collection, uid, self.build_rating_update(new_rating, game_result))
 
-        if game_result['result'] == 'win':
-            updates['wins'] = firestore.Increment(1)
-        elif game_result['result'] == 'loss':
-            updates['losses'] = firestore.Increment(1)
-        else:
-            updates['draws'] = firestore.Increment(1)
-
-        return await self.update_document(self.collection, uid, updates)
+    @staticmethod
+    def build_rating_update(new_rating: int, game_result: Dict[str, Any]) -> Dict[str, Any]:
+        """Return the profile fields update_rating writes, for callers that batch it with other writes."""
+        return {'rating': new_rating, **_RESULT_UPDATES.get(game_result['result'], _DRAW_UPDATE)}
 
     async def search_profiles(self, username_prefix: str, limit: int = 10) -> List[UserProfile]:
         """Search for profiles by username prefix."""
@@ -56,8 +63,9 @@ class ProfileService(BaseService):
             order_by=('username', 'ASCENDING'),
             limit=limit
         )
-        return [UserProfile(**data) for data in results]
+        return _PROFILE_LIST.validate_python(results)
 
+    @cached_result(ttl=60)
     async def get_leaderboard(self, limit: int = 100) -> List[UserProfile]:
         """Get top rated players."""
         results = await self.query_collection(
@@ -65,7 +73,7 @@ class ProfileService(BaseService):
             order_by=('rating', 'DESCENDING'),
             limit=limit
         )
-        return [UserProfile(**data) for data in results]
+        return _PROFILE_LIST.validate_python(results)
 
     async def add_achievement(self, uid: str, achievement_id: str) -> bool:
         """Add an achievement to user's profile."""
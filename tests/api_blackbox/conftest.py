@@ -0,0 +1,68 @@
+# Filename: tests/api_blackbox/conftest.py
+
+import os
+from pathlib import Path
+
+import pytest
+import requests
+from requests.adapters import HTTPAdapter
+
+BASE_URL = os.getenv("TEST_BASE_URL", "http://localhost:8080").rstrip('/')
+VALID_FIREBASE_ID_TOKEN = os.getenv("TEST_FIREBASE_ID_TOKEN")
+USER1_TOKEN = os.getenv("TEST_USER1_BACKEND_TOKEN")
+
+_LIVE_FLOWS_DIR = Path(__file__).parent
+
+
+def pytest_collection_modifyitems(items):
+    """Keep every live flow on one xdist worker, in order (with --dist=loadgroup).
+
+    They share the same live accounts (archiving a game changes USER1's rating, which the profile
+    flow asserts on), so running them concurrently would make each other flaky.
+    """
+    for item in items:
+        if _LIVE_FLOWS_DIR in item.path.parents:
+            item.add_marker(pytest.mark.xdist_group("live_backend"))
+
+
+def _pooled_session():
+    """Creates a session that keeps connections to BASE_URL alive between requests."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=20, pool_maxsize=50, max_retries=0)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+@pytest.fixture(scope="session")
+def http():
+    """Shared keep-alive session, so each test reuses a connection instead of opening a new one."""
+    with _pooled_session() as session:
+        yield session
+
+
+@pytest.fixture(scope="session")
+def user1_headers():
+    """Authorization headers for User1's backend token, built once per session."""
+    return {"Authorization": f"Bearer {USER1_TOKEN}"}
+
+
+@pytest.fixture(scope="session")
+def auth_http(user1_headers):
+    """Keep-alive session that sends User1's backend token with every request."""
+    with _pooled_session() as session:
+        session.headers.update(user1_headers)
+        yield session
+
+
+@pytest.fixture(scope="session")
+def backend_token(http):
+    """
+    Exchanges the Firebase ID token for a backend access token once per session (once per xdist worker),
+    so tests that need it don't depend on running after the exchange test.
+    """
+    if not VALID_FIREBASE_ID_TOKEN:
+        pytest.skip("Requires TEST_FIREBASE_ID_TOKEN environment variable")
+    response = http.post(f"{BASE_URL}/auth/token", json={"firebase_token": VALID_FIREBASE_ID_TOKEN})
+    assert response.status_code == 200, f"Token exchange failed: {response.text}"
+    return response.json()["access_token"]
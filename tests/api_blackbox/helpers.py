@@ -0,0 +1,15 @@
+# Filename: tests/api_blackbox/helpers.py
+# Shared helpers for the black-box flows (kept out of conftest so test modules can import them).
+
+import time
+
+
+def wait_until(fn, timeout=2.0, interval=0.05):
+    """Calls fn with exponential backoff until it returns something truthy or timeout passes; returns the last result."""
+    deadline = time.monotonic() + timeout
+    while True:
+        result = fn()
+        if result or time.monotonic() >= deadline:
+            return result
+        time.sleep(interval)
+        interval = min(interval * 2, 0.5)
@@ -2,14 +2,13 @@
 
 import os
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone, timedelta
 
 import pytest
-import requests
 
 # --- Test Configuration ---
 BASE_URL = os.getenv("TEST_BASE_URL", "http://localhost:8080").rstrip('/')
-API_DELAY = float(os.getenv("TEST_API_DELAY", "0.5"))
 
 # !!! IMPORTANT: Requires valid token/UID for at least one user !!!
 USER1_TOKEN = os.getenv("TEST_USER1_BACKEND_TOKEN")
@@ -23,41 +22,71 @@ if not config_present:
         "\nWARNING: Missing environment variables for analytics flow tests (TEST_USER1_BACKEND_TOKEN, "
         "TEST_USER1_UID). Tests will be skipped.")
 
+pytestmark = pytest.mark.skipif(not config_present, reason="Requires token/UID for User1")
+
+
+# The read-only GETs below don't depend on each other; fetch them together once per module
+TODAY_ISO = datetime.now(timezone.utc).date().isoformat()  # The route takes a YYYY-MM-DD date (or a full datetime)
+DAILY_PATH = f"/analytics/daily/{TODAY_ISO}"
+SELF_PERFORMANCE_PATH = f"/analytics/players/{USER1_UID}/performance?days=30"
+OTHER_PERFORMANCE_PATH = f"/analytics/players/{USER2_UID}/performance?days=60"
+GLOBAL_PATH = "/analytics/global"
+
 
 # --- Helper ---
-def get_auth_headers(token):
-    return {"Authorization": f"Bearer {token}"} if token else {}
+def batch_get(session, paths):
+    """Issues independent GETs concurrently over the session's pool; returns responses keyed by path."""
+    with ThreadPoolExecutor(max_workers=len(paths)) as pool:
+        return dict(zip(paths, pool.map(lambda path: session.get(f"{BASE_URL}{path}"), paths)))
 
 
 # --- Global state for the flow ---
 recorded_game_ids = []  # Store IDs of games whose analytics were recorded
 
 
-# --- Test Cases ---
+@pytest.fixture(scope="module")
+def analytics_snapshot(auth_http):
+    """Responses of the read-only analytics routes, keyed by path (requested after the recording test runs)."""
+    return batch_get(auth_http, [DAILY_PATH, SELF_PERFORMANCE_PATH, OTHER_PERFORMANCE_PATH, GLOBAL_PATH])
+
 
-@pytest.mark.skipif(not config_present, reason="Requires token/UID for User1")
-def test_api_record_game_analytics_valid():
-    """Tests recording analytics for a valid game where the user participated."""
-    headers = get_auth_headers(USER1_TOKEN)
-    game_id = f"bb_ana_{uuid.uuid4().hex}"
+@pytest.fixture(scope="module")
+def base_payload():
+    """A valid GameAnalyticsCreate payload for a game User1 played as white, built once per module."""
     now = datetime.now(timezone.utc)
-    # Payload should match the GameAnalyticsCreate schema
-    analytics_payload = {
-        "game_id": game_id,  # Make sure schema matches this (or if it's only path param)
+    return {
+        "game_id": f"bb_ana_{uuid.uuid4().hex}",
         "white_player_id": USER1_UID,  # Authenticated user is white
         "black_player_id": USER2_UID,
         "start_time": (now - timedelta(minutes=10)).isoformat(),
         "end_time": now.isoformat(),
         "result": "black_win",  # Match GameResult enum values
         "moves": ["d4", "Nf6", "c4", "g6", "Nc3", "Bg7", "e4", "d6"],  # King's Indian start
-        "rating_change": {"white": -7, "black": 7},  # Schema expects dict, e.g. {"white": -7, "black": 7} or similar
+        "rating_change": {"white": -7, "black": 7},
         "game_type": "portal_gambit",
-        "time_control": {"initial": 300, "increment": 3}  # Schema expects dict, e.g. {"initial": 300, "increment": 3}
+        "time_control": {"initial": 300, "increment": 3}
     }
 
+
+# --- Test Cases ---
+
+@pytest.mark.parametrize("payload_mutator,expected_status", [
+    (lambda p: p, 200),
+    # A game the user did NOT participate in (black is the opponent, not USER1_UID)
+    (lambda p: {**p, "white_player_id": f"other-a-{uuid.uuid4().hex[:4]}"}, 403),
+    # Missing black_player_id, result, times, moves etc.
+    (lambda p: {"game_id": p["game_id"], "white_player_id": p["white_player_id"]}, 422),
+], ids=["valid", "forbidden", "missing_data"])
+def test_api_record_game_analytics(auth_http, base_payload, payload_mutator, expected_status):
+    """Tests recording analytics: accepted for a participant, rejected otherwise or when fields are missing."""
+    analytics_payload = payload_mutator(base_payload)
+    game_id = analytics_payload["game_id"]
+
     # Route: POST /analytics/games/{game_id}
-    response = requests.post(f"{BASE_URL}/analytics/games/{game_id}", headers=headers, json=analytics_payload)
-    assert response.status_code == 200, f"Record analytics failed: {response.text}"
+    response = auth_http.post(f"{BASE_URL}/analytics/games/{game_id}", json=analytics_payload)
+    assert response.status_code == expected_status, f"Unexpected status: {response.text}"
+    if expected_status != 200:
+        return
     data = response.json()
     # Response should match AnalyticsResponse schema
     assert data.get("status") == "success"
@@ -66,18 +95,10 @@ def test_api_record_game_analytics_valid():
     print(f"\nRecorded analytics for game ID: {game_id}")
 
 
-@pytest.mark.skipif(not config_present, reason="Requires token/UID for User1")
-def test_api_get_daily_stats():
+def test_api_get_daily_stats(analytics_snapshot):
     """Tests retrieving daily statistics for today."""
-    headers = get_auth_headers(USER1_TOKEN)
-    # Use today's date in the required format (likely ISO 8601 for the path param)
-    # The route expects a datetime, requests needs a string. FastAPI handles parsing.
-    # Sending just the date part might work depending on route implementation.
-    # Let's try sending a full ISO timestamp for today.
-    today_iso = datetime.now(timezone.utc).isoformat()
-
     # Route: GET /analytics/daily/{date}
-    response = requests.get(f"{BASE_URL}/analytics/daily/{today_iso}", headers=headers)
+    response = analytics_snapshot[DAILY_PATH]
     assert response.status_code == 200, f"Get daily stats failed: {response.text}"
     stats = response.json()
 
@@ -100,21 +121,16 @@ def test_api_get_daily_stats():
 
     # If the test game was recorded today, check for its contribution
     # (This is fragile as other games might exist)
-    # if recorded_game_ids and datetime.fromisoformat(today_iso).date() == datetime.now(timezone.utc).date():
+    # if recorded_game_ids and date.fromisoformat(TODAY_ISO) == datetime.now(timezone.utc).date():
     #    assert stats["total_games"] > 0
     #    assert "portal_gambit" in stats["game_types"]
     #    assert stats["game_types"]["portal_gambit"] > 0
 
 
-@pytest.mark.skipif(not config_present, reason="Requires token/UID for User1")
-def test_api_get_player_performance_self():
+def test_api_get_player_performance_self(analytics_snapshot):
     """Tests retrieving performance statistics for the authenticated user."""
-    headers = get_auth_headers(USER1_TOKEN)
-    user_id = USER1_UID
-    days = 30
-
     # Route: GET /analytics/players/{user_id}/performance
-    response = requests.get(f"{BASE_URL}/analytics/players/{user_id}/performance?days={days}", headers=headers)
+    response = analytics_snapshot[SELF_PERFORMANCE_PATH]
     assert response.status_code == 200, f"Get player performance failed: {response.text}"
     perf = response.json()
 
@@ -143,14 +159,9 @@ def test_api_get_player_performance_self():
     #    assert "rating_change" in perf["rating_progression"][0]
 
 
-@pytest.mark.skipif(not config_present, reason="Requires token/UID for User1")
-def test_api_get_player_performance_other():
+def test_api_get_player_performance_other(analytics_snapshot):
     """Tests retrieving performance statistics for another user (allowed)."""
-    headers = get_auth_headers(USER1_TOKEN)
-    user_id = USER2_UID  # Get stats for the opponent
-    days = 60
-
-    response = requests.get(f"{BASE_URL}/analytics/players/{user_id}/performance?days={days}", headers=headers)
+    response = analytics_snapshot[OTHER_PERFORMANCE_PATH]  # Stats for the opponent
     assert response.status_code == 200
     # Check structure again, data will be for USER2_UID
     perf = response.json()
@@ -158,13 +169,11 @@ def test_api_get_player_performance_other():
     assert "win_rate" in perf
 
 
-@pytest.mark.skipif(not config_present, reason="Requires token/UID for User1")
-def test_api_get_global_stats():
+def test_api_get_global_stats(analytics_snapshot):
     """Tests retrieving global game statistics."""
-    headers = get_auth_headers(USER1_TOKEN)
 
     # Route: GET /analytics/global
-    response = requests.get(f"{BASE_URL}/analytics/global", headers=headers)
+    response = analytics_snapshot[GLOBAL_PATH]
     assert response.status_code == 200, f"Get global stats failed: {response.text}"
     stats = response.json()
 
@@ -187,46 +196,8 @@ def test_api_get_global_stats():
 
 # --- Negative Test Cases ---
 
-@pytest.mark.skipif(not config_present, reason="Requires token/UID for User1")
-def test_api_record_game_analytics_forbidden():
-    """Tests recording analytics for a game the user did NOT participate in."""
-    headers = get_auth_headers(USER1_TOKEN)
-    game_id = f"bb_ana_forbidden_{uuid.uuid4().hex}"
-    now = datetime.now(timezone.utc)
-    analytics_payload = {
-        "game_id": game_id,
-        "white_player_id": f"other-a-{uuid.uuid4().hex[:4]}",  # Not USER1_UID
-        "black_player_id": f"other-b-{uuid.uuid4().hex[:4]}",  # Not USER1_UID
-        "start_time": (now - timedelta(minutes=8)).isoformat(),
-        "end_time": now.isoformat(),
-        "result": "draw",
-        "moves": ["Nf3", "Nf6"],
-        "rating_change": {"white": 0, "black": 0},
-        "game_type": "standard",
-        "time_control": {"initial": 60, "increment": 0}
-    }
-    response = requests.post(f"{BASE_URL}/analytics/games/{game_id}", headers=headers, json=analytics_payload)
-    assert response.status_code == 403  # Forbidden
-
-
-@pytest.mark.skipif(not config_present, reason="Requires token/UID for User1")
-def test_api_record_game_analytics_missing_data():
-    """Tests recording analytics with missing required fields."""
-    headers = get_auth_headers(USER1_TOKEN)
-    game_id = f"bb_ana_invalid_{uuid.uuid4().hex}"
-    analytics_payload = {
-        "game_id": game_id,
-        "white_player_id": USER1_UID,
-        # Missing black_player_id, result, times, moves etc.
-    }
-    response = requests.post(f"{BASE_URL}/analytics/games/{game_id}", headers=headers, json=analytics_payload)
-    assert response.status_code == 422  # Unprocessable Entity
-
-
-@pytest.mark.skipif(not config_present, reason="Requires token/UID for User1")
-def test_api_get_daily_stats_invalid_date():
+def test_api_get_daily_stats_invalid_date(auth_http):
     """Tests retrieving daily stats with an invalid date format."""
-    headers = get_auth_headers(USER1_TOKEN)
     invalid_date_str = "27th-October-2023"
-    response = requests.get(f"{BASE_URL}/analytics/daily/{invalid_date_str}", headers=headers)
+    response = auth_http.get(f"{BASE_URL}/analytics/daily/{invalid_date_str}")
     assert response.status_code == 422  # Unprocessable Entity due to path param validation
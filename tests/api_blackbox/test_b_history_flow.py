@@ -5,11 +5,9 @@ import uuid
 from datetime import datetime, timezone, timedelta
 
 import pytest
-import requests
 
 # --- Test Configuration ---
 BASE_URL = os.getenv("TEST_BASE_URL", "http://localhost:8080").rstrip('/')
-API_DELAY = float(os.getenv("TEST_API_DELAY", "0.5"))
 
 # !!! IMPORTANT: Requires valid token/UID for at least one user !!!
 USER1_TOKEN = os.getenv("TEST_USER1_BACKEND_TOKEN")
@@ -24,10 +22,6 @@ if not config_present:
         "Tests will be skipped.")
 
 
-# --- Helper ---
-def get_auth_headers(token):
-    return {"Authorization": f"Bearer {token}"} if token else {}
-
 
 # --- Global state for the flow ---
 # Store IDs of games archived during the tests for later retrieval/verification
@@ -41,9 +35,8 @@ archived_game_ids = []
 # --- Test Cases ---
 
 @pytest.mark.skipif(not config_present, reason="Requires token/UID for User1")
-def test_api_archive_game_valid():
+def test_api_archive_game_valid(auth_http):
     """Tests archiving a valid game where the user participated."""
-    headers = get_auth_headers(USER1_TOKEN)
     game_id = f"bb_hist_{uuid.uuid4().hex}"
     now = datetime.now(timezone.utc)
     # Payload must match the GameHistory model structure
@@ -64,7 +57,7 @@ def test_api_archive_game_valid():
         "time_control": {"initial": 900, "increment": 10}
     }
 
-    response = requests.post(f"{BASE_URL}/history/games", headers=headers, json=game_payload)
+    response = auth_http.post(f"{BASE_URL}/history/games", json=game_payload)
     assert response.status_code == 200, f"Archive game failed: {response.text}"
     data = response.json()
     assert data.get("status") == "success"
@@ -74,11 +67,10 @@ def test_api_archive_game_valid():
 
 
 @pytest.mark.skipif(not config_present or not archived_game_ids, reason="Requires token/UID and an archived game")
-def test_api_get_archived_game_valid():
+def test_api_get_archived_game_valid(auth_http):
     """Tests retrieving a specific game that was just archived."""
-    headers = get_auth_headers(USER1_TOKEN)
     game_id = archived_game_ids[-1]  # Get the most recently archived game
-    response = requests.get(f"{BASE_URL}/history/games/{game_id}", headers=headers)
+    response = auth_http.get(f"{BASE_URL}/history/games/{game_id}")
     assert response.status_code == 200, f"Get game failed: {response.text}"
     game_data = response.json()
     # Verify key fields match the archived game
@@ -91,12 +83,11 @@ def test_api_get_archived_game_valid():
 
 
 @pytest.mark.skipif(not config_present, reason="Requires token/UID for User1")
-def test_api_get_user_games():
+def test_api_get_user_games(auth_http):
     """Tests retrieving the list of games for the authenticated user."""
     # This assumes test_api_archive_game_valid ran and archived at least one game
-    headers = get_auth_headers(USER1_TOKEN)
     limit = 5
-    response = requests.get(f"{BASE_URL}/history/users/{USER1_UID}/games?limit={limit}", headers=headers)
+    response = auth_http.get(f"{BASE_URL}/history/users/{USER1_UID}/games?limit={limit}")
     assert response.status_code == 200
     user_games = response.json()
     assert isinstance(user_games, list)
@@ -118,14 +109,13 @@ def test_api_get_user_games():
 
 
 @pytest.mark.skipif(not config_present, reason="Requires token/UID for User1")
-def test_api_get_games_between_players():
+def test_api_get_games_between_players(auth_http):
     """Tests retrieving games between User1 and User2."""
     # Assumes at least one game was archived between USER1_UID and USER2_UID
-    headers = get_auth_headers(USER1_TOKEN)
     limit = 10
     player1 = USER1_UID
     player2 = USER2_UID
-    response = requests.get(f"{BASE_URL}/history/games/between/{player1}/{player2}?limit={limit}", headers=headers)
+    response = auth_http.get(f"{BASE_URL}/history/games/between/{player1}/{player2}?limit={limit}")
     assert response.status_code == 200
     between_games = response.json()
     assert isinstance(between_games, list)
@@ -140,11 +130,10 @@ def test_api_get_games_between_players():
 
 
 @pytest.mark.skipif(not config_present, reason="Requires token/UID for User1")
-def test_api_get_user_stats():
+def test_api_get_user_stats(auth_http):
     """Tests retrieving game statistics for the user."""
-    headers = get_auth_headers(USER1_TOKEN)
     days = 90
-    response = requests.get(f"{BASE_URL}/history/users/{USER1_UID}/stats?days={days}", headers=headers)
+    response = auth_http.get(f"{BASE_URL}/history/users/{USER1_UID}/stats?days={days}")
     assert response.status_code == 200
     stats = response.json()
     # Check structure based on UserGameStats schema
@@ -165,11 +154,10 @@ def test_api_get_user_stats():
 
 
 @pytest.mark.skipif(not config_present, reason="Requires token/UID for User1")
-def test_api_get_popular_openings():
+def test_api_get_popular_openings(auth_http):
     """Tests retrieving popular openings."""
-    headers = get_auth_headers(USER1_TOKEN)
     limit = 5
-    response = requests.get(f"{BASE_URL}/history/openings/popular?limit={limit}", headers=headers)
+    response = auth_http.get(f"{BASE_URL}/history/openings/popular?limit={limit}")
     assert response.status_code == 200
     openings = response.json()
     assert isinstance(openings, list)
@@ -191,9 +179,8 @@ def test_api_get_popular_openings():
 # --- Negative Test Cases ---
 
 @pytest.mark.skipif(not config_present, reason="Requires token/UID for User1")
-def test_api_archive_game_forbidden():
+def test_api_archive_game_forbidden(auth_http):
     """Tests archiving a game where the user did NOT participate."""
-    headers = get_auth_headers(USER1_TOKEN)
     game_id = f"bb_hist_forbidden_{uuid.uuid4().hex}"
     now = datetime.now(timezone.utc)
     game_payload = {
@@ -211,27 +198,25 @@ def test_api_archive_game_forbidden():
         "game_type": "standard",
         "time_control": {"initial": 180, "increment": 0}
     }
-    response = requests.post(f"{BASE_URL}/history/games", headers=headers, json=game_payload)
+    response = auth_http.post(f"{BASE_URL}/history/games", json=game_payload)
     assert response.status_code == 403  # Forbidden
 
 
 @pytest.mark.skipif(not config_present, reason="Requires token/UID for User1")
-def test_api_archive_game_missing_data():
+def test_api_archive_game_missing_data(auth_http):
     """Tests archiving a game with missing required fields."""
-    headers = get_auth_headers(USER1_TOKEN)
     game_payload = {
         "game_id": f"bb_hist_invalid_{uuid.uuid4().hex}",
         "white_player_id": USER1_UID,
         # Missing black_player_id, result, end_time, moves etc.
     }
-    response = requests.post(f"{BASE_URL}/history/games", headers=headers, json=game_payload)
+    response = auth_http.post(f"{BASE_URL}/history/games", json=game_payload)
     assert response.status_code == 422  # Unprocessable Entity
 
 
 @pytest.mark.skipif(not config_present, reason="Requires token/UID for User1")
-def test_api_get_non_existent_game():
+def test_api_get_non_existent_game(auth_http):
     """Tests retrieving a game ID that doesn't exist."""
-    headers = get_auth_headers(USER1_TOKEN)
     non_existent_id = f"non-existent-game-{uuid.uuid4().hex}"
-    response = requests.get(f"{BASE_URL}/history/games/{non_existent_id}", headers=headers)
+    response = auth_http.get(f"{BASE_URL}/history/games/{non_existent_id}")
     assert response.status_code == 404  # Not Found
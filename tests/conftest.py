@@ -8,6 +8,7 @@ from unittest.mock import patch, AsyncMock, MagicMock
 import pytest
 from dotenv import load_dotenv
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from fastapi.testclient import TestClient
 
 from middleware.auth_middleware import FirebaseAuthMiddleware  # Import middleware
@@ -136,7 +137,7 @@ def mock_firebase_admin_init():
 
 @pytest.fixture
 def mock_verify_firebase_token():
-    with patch("firebase_admin.auth.verify_id_token") as mock_verify:
+    with patch("utils.jwt_utils.verify_firebase_token") as mock_verify:
         mock_verify.return_value = {
             "uid": "mock_firebase_uid_from_token", "email": "firebase_user@example.com", "email_verified": True,
             "name": "Firebase Mock User", "picture": "http://example.com/firebase_pic.jpg",
@@ -177,6 +178,7 @@ def mock_friend_service(sample_friend_request, sample_friend_status, test_user_1
     service.get_pending_requests = AsyncMock(return_value=[sample_friend_request])
     service.get_friend_request = AsyncMock(return_value=sample_friend_request)
     service.respond_to_request = AsyncMock(return_value=True)
+    service.respond_to_request_checked = AsyncMock(return_value='ok')
     service.get_friends = AsyncMock(return_value=[sample_friend_status])
     service.remove_friend = AsyncMock(return_value=True)
     service.update_last_interaction = AsyncMock(return_value=True)
@@ -260,7 +262,7 @@ def mock_db_client(mock_firestore_increment, mock_firestore_array_union):
 @pytest.fixture(scope="function")  # Use function scope to ensure clean app state per test
 def app_instance_for_test():
     """Creates a fresh FastAPI app instance for testing."""
-    app = FastAPI()
+    app = FastAPI(default_response_class=ORJSONResponse)  # Same encoder as main.app
     # Include routers
     app.include_router(profile_routes.router)
     app.include_router(friend_routes.router)
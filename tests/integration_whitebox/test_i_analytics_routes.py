@@ -1,6 +1,8 @@
 # Filename: tests/integration_whitebox/test_i_analytics_routes.py
 import uuid
-from datetime import datetime, timezone, timedelta
+from datetime import date, datetime, timezone, timedelta
+
+import pytest
 
 from models.game_history import GameResult  # For result values
 # Import models/schemas for validation
@@ -133,7 +135,7 @@ def test_record_game_analytics_validation_error(client, mock_analytics_service):
 def test_get_daily_stats_success(client, mock_analytics_service):
     """Test getting daily stats when service returns data."""
     # Arrange
-    test_date_str = "2024-02-15T12:00:00Z"  # Valid ISO date string
+    test_date_str = "2024-02-15"  # Valid YYYY-MM-DD date string
     # Mock service to return DailyStats object (use fixture or create instance)
     mock_stats = DailyStats(
         total_games=10, average_duration=500.0, average_moves=55.0, white_wins=4,
@@ -150,13 +152,8 @@ def test_get_daily_stats_success(client, mock_analytics_service):
     assert response_data["total_games"] == mock_stats.total_games
     assert response_data["white_wins"] == mock_stats.white_wins
     assert response_data["game_types"] == mock_stats.game_types
-    # Assert service call (FastAPI parses path date string to datetime)
-    mock_analytics_service.get_daily_stats.assert_called_once()
-    call_arg = mock_analytics_service.get_daily_stats.call_args[0][0]
-    assert isinstance(call_arg, datetime)
-    assert call_arg.year == 2024
-    assert call_arg.month == 2
-    assert call_arg.day == 15
+    # Assert service call (the route parses the path string to a date)
+    mock_analytics_service.get_daily_stats.assert_called_once_with(date(2024, 2, 15))
 
 
 def test_get_daily_stats_invalid_date(client, mock_analytics_service):
@@ -172,6 +169,34 @@ def test_get_daily_stats_invalid_date(client, mock_analytics_service):
     mock_analytics_service.get_daily_stats.assert_not_called()
 
 
+@pytest.mark.parametrize("bad_date", ["2024-02-30", "2024-02-15T25:00:00"])
+def test_get_daily_stats_rejects_non_calendar_day(client, mock_analytics_service, bad_date):
+    """Test impossible days and times are rejected before reaching the service."""
+    # Act
+    response = client.get(f"/analytics/daily/{bad_date}")
+
+    # Assert
+    assert response.status_code == 422
+    mock_analytics_service.get_daily_stats.assert_not_called()
+
+
+@pytest.mark.parametrize("moment", ["2024-02-15T12:00:00", "2024-02-15T12:00:00Z", "2024-02-16T01:00:00+02:00"])
+def test_get_daily_stats_accepts_full_datetime(client, mock_analytics_service, moment):
+    """Test a full ISO datetime (the previous path format) still works, using its UTC calendar day."""
+    # Arrange
+    mock_analytics_service.get_daily_stats.return_value = DailyStats(
+        total_games=0, average_duration=0.0, average_moves=0.0, white_wins=0,
+        black_wins=0, draws=0, abandoned=0, game_types={}, time_controls={}
+    )
+
+    # Act
+    response = client.get(f"/analytics/daily/{moment}")
+
+    # Assert
+    assert response.status_code == 200
+    mock_analytics_service.get_daily_stats.assert_called_once_with(date(2024, 2, 15))
+
+
 # --- Test Cases for /analytics/players/{user_id}/performance GET ---
 
 def test_get_player_performance_success(client, mock_analytics_service, test_user_2_uid):
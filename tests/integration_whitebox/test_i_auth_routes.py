@@ -1,7 +1,10 @@
 # Filename: tests/integration_whitebox/test_i_auth_routes.py
+import base64
+import json
 from unittest.mock import patch
 
 import pytest
+import requests
 from fastapi import HTTPException
 
 from utils import jwt_utils
@@ -15,7 +18,7 @@ from utils import jwt_utils
 def test_get_token_success(
         mocker,  # Mocked jwt_utils function
         client_no_auth_bypass,  # TestClient without auth middleware bypassed
-        mock_verify_firebase_token  # Mocked firebase_admin.auth.verify_id_token
+        mock_verify_firebase_token  # Mocked utils.jwt_utils.verify_firebase_token
 ):
     """Test successfully exchanging a Firebase token for backend tokens."""
     # Arrange: Configure mocks
@@ -71,6 +74,26 @@ def test_get_token_invalid_firebase_token(client_no_auth_bypass, mock_verify_fir
     mock_verify_firebase_token.assert_called_once_with(firebase_token_input)
 
 
+def test_get_token_cert_fetch_failure(client_no_auth_bypass):
+    """Test exchanging a token while Google's signing certificates can't be fetched gives a 401, not a 500."""
+    # Arrange: an RS256 token with a 'kid' (only its header is read before the cert lookup) and a stale cert cache
+    header = base64.urlsafe_b64encode(json.dumps({"alg": "RS256", "kid": "some-kid"}).encode()).rstrip(b"=")
+    firebase_token_input = f"{header.decode()}.e30.c2ln"
+    certs = jwt_utils._firebase_certs
+    fetch_error = requests.ConnectionError("certs endpoint unreachable")
+
+    with patch.object(certs, "_certs", {}), patch.object(certs, "_expires_at", 0.0), \
+            patch.object(certs, "_fetched_at", 0.0), \
+            patch.object(jwt_utils.requests, "get", side_effect=fetch_error) as mock_get:
+        # Act
+        response = client_no_auth_bypass.post("/auth/token", json={"firebase_token": firebase_token_input})
+
+    # Assert
+    assert response.status_code == 401
+    assert "Invalid Firebase token" in response.json().get("detail", "")
+    mock_get.assert_called_once_with(jwt_utils.FIREBASE_CERTS_URL, timeout=10)
+
+
 def test_get_token_missing_payload_field(client_no_auth_bypass):
     """Test calling /auth/token with missing 'firebase_token' field."""
     response = client_no_auth_bypass.post("/auth/token", json={"wrong_field": "some_token"})
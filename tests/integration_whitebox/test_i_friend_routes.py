@@ -1,5 +1,7 @@
 # Filename: tests/integration_whitebox/test_i_friend_routes.py
 
+import pytest
+
 # Import models/schemas used for request/response validation
 
 # Fixtures: client, mock_friend_service, sample_friend_request, sample_friend_status,
@@ -104,12 +106,8 @@ def test_respond_to_request_accept_success(client, mock_friend_service, sample_f
     """Test accepting a pending friend request successfully."""
     # Arrange
     request_id = sample_friend_request.request_id
-    # Ensure the sample request is directed TO the authenticated user
-    sample_friend_request.receiver_id = test_user_1_uid
-    # Mock service calls
-    mock_friend_service.get_friend_request.return_value = sample_friend_request
-    mock_friend_service.respond_to_request.return_value = True
-    respond_payload = {"accept": True}  # Matches schema (used in route logic, not FriendRequestResponse schema)
+    mock_friend_service.respond_to_request_checked.return_value = 'ok'
+    respond_payload = {"accept": True}  # Matches FriendRequestAction schema
 
     # Act
     response = client.post(f"/friends/requests/{request_id}/respond", json=respond_payload)
@@ -118,17 +116,16 @@ def test_respond_to_request_accept_success(client, mock_friend_service, sample_f
     assert response.status_code == 200
     assert response.json()["status"] == "success"
     assert "accepted successfully" in response.json()["message"]
-    mock_friend_service.get_friend_request.assert_called_once_with(request_id)
-    mock_friend_service.respond_to_request.assert_called_once_with(request_id, True)
+    # Single transactional call; the receiver check is done by the service
+    mock_friend_service.respond_to_request_checked.assert_called_once_with(request_id, test_user_1_uid, True)
+    mock_friend_service.get_friend_request.assert_not_called()
 
 
 def test_respond_to_request_reject_success(client, mock_friend_service, sample_friend_request, test_user_1_uid):
     """Test rejecting a pending friend request successfully."""
     # Arrange
     request_id = sample_friend_request.request_id
-    sample_friend_request.receiver_id = test_user_1_uid
-    mock_friend_service.get_friend_request.return_value = sample_friend_request
-    mock_friend_service.respond_to_request.return_value = True
+    mock_friend_service.respond_to_request_checked.return_value = 'ok'
     respond_payload = {"accept": False}
 
     # Act
@@ -138,15 +135,14 @@ def test_respond_to_request_reject_success(client, mock_friend_service, sample_f
     assert response.status_code == 200
     assert response.json()["status"] == "success"
     assert "rejected successfully" in response.json()["message"]
-    mock_friend_service.get_friend_request.assert_called_once_with(request_id)
-    mock_friend_service.respond_to_request.assert_called_once_with(request_id, False)
+    mock_friend_service.respond_to_request_checked.assert_called_once_with(request_id, test_user_1_uid, False)
 
 
-def test_respond_to_request_not_found(client, mock_friend_service):
+def test_respond_to_request_not_found(client, mock_friend_service, test_user_1_uid):
     """Test responding when the request_id doesn't exist."""
     # Arrange
     request_id = "non-existent-req"
-    mock_friend_service.get_friend_request.return_value = None  # Simulate not found
+    mock_friend_service.respond_to_request_checked.return_value = 'not_found'  # Simulate not found
     respond_payload = {"accept": True}
 
     # Act
@@ -155,17 +151,14 @@ def test_respond_to_request_not_found(client, mock_friend_service):
     # Assert: Route should raise 404
     assert response.status_code == 404
     assert "Friend request not found" in response.json().get("detail", "")
-    mock_friend_service.get_friend_request.assert_called_once_with(request_id)
-    mock_friend_service.respond_to_request.assert_not_called()
+    mock_friend_service.respond_to_request_checked.assert_called_once_with(request_id, test_user_1_uid, True)
 
 
 def test_respond_to_request_forbidden(client, mock_friend_service, sample_friend_request, test_user_1_uid):
     """Test responding to a request not intended for the authenticated user."""
     # Arrange
     request_id = sample_friend_request.request_id
-    # Ensure receiver is NOT the authenticated user
-    sample_friend_request.receiver_id = "another_user_id"
-    mock_friend_service.get_friend_request.return_value = sample_friend_request
+    mock_friend_service.respond_to_request_checked.return_value = 'forbidden'  # Receiver is someone else
     respond_payload = {"accept": True}
 
     # Act
@@ -174,17 +167,16 @@ def test_respond_to_request_forbidden(client, mock_friend_service, sample_friend
     # Assert: Route should raise 403
     assert response.status_code == 403
     assert "Cannot respond to requests for other users" in response.json().get("detail", "")
-    mock_friend_service.get_friend_request.assert_called_once_with(request_id)
-    mock_friend_service.respond_to_request.assert_not_called()
+    mock_friend_service.respond_to_request_checked.assert_called_once_with(request_id, test_user_1_uid, True)
 
 
-def test_respond_to_request_service_fails(client, mock_friend_service, sample_friend_request, test_user_1_uid):
-    """Test responding when the service layer fails the operation."""
+@pytest.mark.parametrize("outcome", ['stale', 'error'])
+def test_respond_to_request_service_fails(client, mock_friend_service, sample_friend_request, test_user_1_uid,
+                                          outcome):
+    """Test responding when the request isn't pending or the transaction fails."""
     # Arrange
     request_id = sample_friend_request.request_id
-    sample_friend_request.receiver_id = test_user_1_uid
-    mock_friend_service.get_friend_request.return_value = sample_friend_request
-    mock_friend_service.respond_to_request.return_value = False  # Simulate service failure
+    mock_friend_service.respond_to_request_checked.return_value = outcome  # Simulate service failure
     respond_payload = {"accept": True}
 
     # Act
@@ -192,10 +184,8 @@ def test_respond_to_request_service_fails(client, mock_friend_service, sample_fr
 
     # Assert: Check response reflects service failure
     assert response.status_code == 400
-    # FIX: Assert detail format
     assert response.json() == {"detail": "Failed to respond to friend request (e.g., request not pending or db error)"}
-    mock_friend_service.get_friend_request.assert_called_once_with(request_id)
-    mock_friend_service.respond_to_request.assert_called_once_with(request_id, True)
+    mock_friend_service.respond_to_request_checked.assert_called_once_with(request_id, test_user_1_uid, True)
 
 
 # --- Test Cases for /friends/list GET ---
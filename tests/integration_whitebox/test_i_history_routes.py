@@ -189,7 +189,7 @@ def test_get_user_games_success(client, mock_history_service, sample_game_histor
     assert len(response_data) == 1
     assert response_data[0]["game_id"] == sample_game_history.game_id
     # Assert service call with correct params from path and query
-    mock_history_service.get_user_games.assert_called_once_with(user_id_to_get, limit)
+    mock_history_service.get_user_games.assert_called_once_with(user_id_to_get, limit, start_after=None)
 
 
 def test_get_user_games_default_limit(client, mock_history_service, test_user_1_uid):
@@ -206,7 +206,29 @@ def test_get_user_games_default_limit(client, mock_history_service, test_user_1_
     assert response.status_code == 200
     assert response.json() == []
     # Verify service called with the default limit
-    mock_history_service.get_user_games.assert_called_once_with(user_id_to_get, default_limit)
+    mock_history_service.get_user_games.assert_called_once_with(user_id_to_get, default_limit, start_after=None)
+
+
+def test_get_user_games_next_page(client, mock_history_service, test_user_1_uid):
+    """Test the start_after cursor is parsed and handed to the service."""
+    mock_history_service.get_user_games.return_value = []
+
+    response = client.get(f"/history/users/{test_user_1_uid}/games",
+                          params={"limit": 20, "start_after": "2024-02-15T10:30:00Z"})
+
+    assert response.status_code == 200
+    mock_history_service.get_user_games.assert_called_once_with(
+        test_user_1_uid, 20, start_after=datetime(2024, 2, 15, 10, 30, tzinfo=timezone.utc))
+
+
+def test_get_user_games_limit_too_large(client, mock_history_service, test_user_1_uid):
+    """Test a limit above the schema maximum is rejected before querying."""
+    # Act
+    response = client.get(f"/history/users/{test_user_1_uid}/games?limit=201")
+
+    # Assert
+    assert response.status_code == 422
+    mock_history_service.get_user_games.assert_not_called()
 
 
 # --- Test Cases for /history/games/between/{player1_id}/{player2_id} GET ---
@@ -231,7 +253,7 @@ def test_get_games_between_players_success(client, mock_history_service, sample_
     assert len(response_data) == 1
     assert response_data[0]["game_id"] == sample_game_history.game_id
     # Assert service call with correct params
-    mock_history_service.get_games_between_players.assert_called_once_with(player1, player2, limit)
+    mock_history_service.get_games_between_players.assert_called_once_with(player1, player2, limit, start_after=None)
 
 
 def test_get_games_between_players_default_limit(client, mock_history_service, test_user_1_uid, test_user_2_uid):
@@ -249,7 +271,8 @@ def test_get_games_between_players_default_limit(client, mock_history_service, t
     assert response.status_code == 200
     assert response.json() == []
     # Verify service called with default limit
-    mock_history_service.get_games_between_players.assert_called_once_with(player1, player2, default_limit)
+    mock_history_service.get_games_between_players.assert_called_once_with(player1, player2, default_limit,
+                                                                            start_after=None)
 
 
 # --- Test Cases for /history/users/{user_id}/stats GET ---
@@ -3,6 +3,7 @@ from unittest.mock import patch
 
 # Import models/schemas used for request/response validation if needed
 from models.user_profile import UserProfile
+from routes.profile_routes import PROFILE_VIEW_TTL
 
 
 # Fixtures: client, mock_profile_service, sample_user_profile, test_user_1_uid from conftest.py
@@ -129,7 +130,7 @@ def test_get_profile_found(client, mock_profile_service, sample_user_profile):
     assert response_data["created_at"] == sample_user_profile.created_at.isoformat().replace('+00:00', 'Z')
 
     # Assert service was called correctly
-    mock_profile_service.get_profile.assert_called_once_with(uid_to_get)
+    mock_profile_service.get_profile.assert_called_once_with(uid_to_get, ttl=PROFILE_VIEW_TTL)
 
 
 def test_get_profile_not_found(client, mock_profile_service):
@@ -144,7 +145,7 @@ def test_get_profile_not_found(client, mock_profile_service):
     # Assert: Route should return 404
     assert response.status_code == 404
     assert "Profile not found" in response.json().get("detail", "")
-    mock_profile_service.get_profile.assert_called_once_with(uid_to_get)
+    mock_profile_service.get_profile.assert_called_once_with(uid_to_get, ttl=PROFILE_VIEW_TTL)
 
 
 # --- Test Cases for /profiles/{uid} PATCH ---
@@ -267,6 +268,15 @@ def test_search_profiles_not_found(client, mock_profile_service):
     mock_profile_service.search_profiles.assert_called_once_with(prefix, limit)
 
 
+def test_search_profiles_prefix_too_short(client, mock_profile_service):
+    """Test a single-character prefix is rejected before querying."""
+    response = client.get("/profiles/search/a")
+
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Username prefix must be at least 2 characters"}
+    mock_profile_service.search_profiles.assert_not_called()
+
+
 # --- Test Cases for /profiles/leaderboard/top ---
 
 def test_get_leaderboard_success(client, mock_profile_service, sample_user_profile):
@@ -1,7 +1,7 @@
 # Filename: tests/unit_whitebox/test_u_analytics_service.py
 
 from datetime import datetime, timezone, timedelta
-from unittest.mock import AsyncMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
 
@@ -39,19 +39,17 @@ async def test_record_game_analytics_success(analytics_service, mock_db_client):
         'time_control': {'initial': 600, 'increment': 5}
     }
 
-    # Mock the underlying set_document call
-    mock_set = AsyncMock(return_value=True)
-    # Patch BaseService.set_document used by the service instance
-    with patch.object(AnalyticsService, 'set_document', mock_set):
-        result = await analytics_service.record_game_analytics(game_data)
+    batch = mock_db_client.batch.return_value
+    batch.commit = AsyncMock(return_value=None)
+
+    result = await analytics_service.record_game_analytics(game_data)
 
     assert result is True
-    # Verify the call to set_document
-    mock_set.assert_called_once()
-    call_args = mock_set.call_args[0]
-    assert call_args[0] == 'analytics'  # collection name
-    assert call_args[1] == 'game_ana_game_1'  # doc id format
-    saved_data = call_args[2]  # The data dict saved
+    batch.commit.assert_awaited_once()
+    # One create for the game record, two merge-sets for the daily and all-time counters
+    batch.create.assert_called_once()
+    assert batch.set.call_count == 2
+    saved_data = batch.create.call_args[0][1]  # The game record
     assert saved_data['game_id'] == game_data['game_id']
     assert saved_data['duration'] == duration_secs
     assert saved_data['total_moves'] == 30
@@ -60,11 +58,42 @@ async def test_record_game_analytics_success(analytics_service, mock_db_client):
     assert saved_data['rating_change'] == game_data['rating_change']
     assert saved_data['game_type'] == game_data['game_type']
     assert saved_data['time_control'] == game_data['time_control']
+    assert saved_data['tc_key'] == '600/5'  # Precomputed so aggregations skip the formatting
     assert 'timestamp' in saved_data  # Should be added by the service
+    mock_db_client.collection.assert_any_call('analytics')
+    mock_db_client.collection.return_value.document.assert_any_call('game_ana_game_1')
+
+    for counters_call in batch.set.call_args_list:
+        counters = counters_call[0][1]
+        assert counters_call[1] == {'merge': True}
+        assert set(counters) == {'total_games', 'total_duration', 'total_moves', 'draws', 'game_types',
+                                 'time_controls', 'last_updated'}
+        assert set(counters['game_types']) == {'portal_gambit'}
+        assert set(counters['time_controls']) == {'600/5'}
 
 
 @pytest.mark.asyncio
-async def test_record_game_analytics_failure(analytics_service):
+@pytest.mark.parametrize("game_type,expected_key", [("", "unknown"), ("__name__", "name"), ("____", "unknown")])
+async def test_record_game_analytics_illegal_map_key(analytics_service, mock_db_client, game_type, expected_key):
+    """Test a game_type that is not a legal Firestore field name is counted under a safe key, not failing the write."""
+    now = datetime.now(timezone.utc)
+    game_data = {
+        'game_id': 'ana_game_key', 'white_player_id': 'p_white', 'black_player_id': 'p_black',
+        'start_time': now - timedelta(minutes=5), 'end_time': now, 'result': GameResult.DRAW,
+        'moves': ['e4'], 'rating_change': {'white': 0, 'black': 0}, 'game_type': game_type,
+        'time_control': {'initial': 300, 'increment': 0}
+    }
+    batch = mock_db_client.batch.return_value
+    batch.commit = AsyncMock(return_value=None)
+
+    assert await analytics_service.record_game_analytics(game_data) is True
+
+    assert batch.create.call_args[0][1]['game_type'] == game_type  # The raw record keeps the original
+    for counters_call in batch.set.call_args_list:
+        assert set(counters_call[0][1]['game_types']) == {expected_key}
+
+@pytest.mark.asyncio
+async def test_record_game_analytics_failure(analytics_service, mock_db_client):
     """Test analytics recording when the database operation fails."""
     now = datetime.now(timezone.utc)
     game_data = {  # Add required fields accessed before set_document
@@ -79,12 +108,86 @@ async def test_record_game_analytics_failure(analytics_service):
         'game_type': 'test',  # Add dummy
         'time_control': {},  # Add dummy
     }
-    with patch.object(AnalyticsService, 'set_document', AsyncMock(return_value=False)) as mock_set:
+    batch = mock_db_client.batch.return_value
+    batch.commit = AsyncMock(side_effect=Exception("commit failed"))
+    with patch.object(AnalyticsService, 'get_document', AsyncMock(return_value=None)):  # Not recorded earlier
         result = await analytics_service.record_game_analytics(game_data)
     assert result is False
-    mock_set.assert_called_once()
+    batch.commit.assert_awaited_once()
 
 
+@pytest.mark.asyncio
+async def test_record_game_analytics_retry_is_idempotent(analytics_service, mock_db_client):
+    """Test recording the same game twice reports success both times but increments the counters once."""
+    now = datetime.now(timezone.utc)
+    game_data = {
+        'game_id': 'ana_game_retry', 'white_player_id': 'p_white', 'black_player_id': 'p_black',
+        'start_time': now - timedelta(minutes=5), 'end_time': now, 'result': GameResult.WHITE_WIN,
+        'moves': ['e4', 'e5'], 'rating_change': {'white': 5, 'black': -5}, 'game_type': 'portal_gambit',
+        'time_control': {'initial': 300, 'increment': 0}
+    }
+    # A fresh batch per call; the second commit fails as Firestore does when create() hits an existing doc
+    batches = [MagicMock(), MagicMock()]
+    batches[0].commit = AsyncMock(return_value=None)
+    batches[1].commit = AsyncMock(side_effect=Exception("409 Document already exists"))
+    mock_db_client.batch.side_effect = batches
+
+    first = await analytics_service.record_game_analytics(game_data)
+    stored = batches[0].create.call_args[0][1]
+    with patch.object(AnalyticsService, 'get_document', AsyncMock(return_value=stored)) as mock_get:
+        second = await analytics_service.record_game_analytics(game_data)
+
+    assert first is True and second is True
+    mock_get.assert_awaited_once_with(analytics_service.collection, 'game_ana_game_retry')
+    for batch in batches:
+        batch.create.assert_called_once()  # The record is always written with create, never set
+    committed = [batch for batch in batches if batch.commit.side_effect is None]
+    assert committed == [batches[0]]
+    # Only the committed batch's merge-sets (daily + all-time) reached Firestore
+    assert sum(batch.set.call_count for batch in committed) == 2
+
+
+@pytest.mark.asyncio
+async def test_rebuild_counters(analytics_service):
+    """Test the backfill recomputes each day's counters and the all-time totals from the raw records."""
+    day1 = datetime(2024, 3, 14, 23, 0, tzinfo=timezone.utc)
+    day2 = datetime(2024, 3, 15, 1, 0, tzinfo=timezone.utc)
+    games = [
+        {'timestamp': day1, 'duration': 300, 'total_moves': 40, 'result': GameResult.WHITE_WIN,
+         'game_type': 'standard', 'time_control': {'initial': 300, 'increment': 0}},
+        {'timestamp': day2, 'duration': 600, 'total_moves': 60, 'result': 'draw', 'game_type': '',
+         'time_control': {}},
+        {'timestamp': day2, 'duration': 100, 'total_moves': 10, 'result': 'abandoned',
+         'game_type': 'standard', 'time_control': {'initial': 300, 'increment': 0}, 'tc_key': '300/0'},
+    ]
+
+    with patch.object(AnalyticsService, 'stream_collection', _stream_of(games)), \
+            patch.object(AnalyticsService, 'batch_write', AsyncMock(return_value=True)) as mock_batch:
+        assert await analytics_service.rebuild_counters() == 3
+
+    writes = {(collection, doc_id): data for _, collection, doc_id, data in mock_batch.call_args[0][0]}
+    assert all(op == 'set' for op, *_ in mock_batch.call_args[0][0])  # Overwrite, so reruns don't double-count
+    assert writes[('analytics_daily', '2024-03-14')]['total_games'] == 1
+    assert writes[('analytics_daily', '2024-03-15')] == {
+        'total_games': 2, 'total_duration': 700, 'total_moves': 70,
+        'white_wins': 0, 'black_wins': 0, 'draws': 1, 'abandoned': 1,
+        'game_types': {'unknown': 1, 'standard': 1}, 'time_controls': {'300/0': 1}, 'last_updated': day2,
+    }
+    totals = writes[('analytics_totals', 'global')]
+    assert totals['total_games'] == 3
+    assert totals['white_wins'] == 1
+    assert totals['game_types'] == {'standard': 2, 'unknown': 1}
+    assert totals['last_updated'] == day2
+
+
+@pytest.mark.asyncio
+async def test_rebuild_counters_write_failure_raises(analytics_service):
+    """Test a failed counters write is reported rather than passing as a completed backfill."""
+    with patch.object(AnalyticsService, 'stream_collection', _stream_of([])), \
+            patch.object(AnalyticsService, 'batch_write', AsyncMock(return_value=False)):
+        with pytest.raises(RuntimeError):
+            await analytics_service.rebuild_counters()
+
 # --- Daily Stats Tests ---
 
 @pytest.mark.asyncio
@@ -94,12 +197,14 @@ async def test_get_daily_stats_cache_hit(analytics_service):
     cache_key = f"daily_stats_{test_date.strftime('%Y-%m-%d')}"
     cached_data = {'total_games': 5, 'mock': 'data'}
 
-    with patch.object(AnalyticsService, 'get_document', AsyncMock(return_value=cached_data)) as mock_get, \
+    # No counters doc for the day, so the legacy cache is consulted
+    with patch.object(AnalyticsService, 'get_document', AsyncMock(side_effect=[None, cached_data])) as mock_get, \
             patch.object(AnalyticsService, 'query_collection', new_callable=AsyncMock) as mock_query:
         stats = await analytics_service.get_daily_stats(test_date)
 
     assert stats == cached_data
-    mock_get.assert_called_once_with('analytics_cache', cache_key)
+    mock_get.assert_any_call('analytics_daily', '2024-03-10')
+    mock_get.assert_called_with('analytics_cache', cache_key, ttl=300)
     mock_query.assert_not_called()  # Should not query DB if cache hits
 
 
@@ -114,7 +219,7 @@ async def test_get_daily_stats_cache_miss_no_data(analytics_service):
             patch.object(AnalyticsService, 'set_document', AsyncMock(return_value=True)) as mock_set:
         stats = await analytics_service.get_daily_stats(test_date)
 
-    mock_get.assert_called_once_with('analytics_cache', cache_key)
+    mock_get.assert_called_with('analytics_cache', cache_key, ttl=300)
     mock_query.assert_called_once()  # DB query should happen
     assert stats['total_games'] == 0
     assert stats['white_wins'] == 0
@@ -163,6 +268,28 @@ async def test_get_daily_stats_calculation(analytics_service):
     mock_set.assert_called_once_with('analytics_cache', cache_key, stats)  # Verify caching
 
 
+@pytest.mark.asyncio
+async def test_get_daily_stats_from_counters(analytics_service):
+    """Test daily stats are derived from the day's counters doc without scanning games."""
+    test_date = datetime(2024, 3, 13)
+    counters = {'total_games': 4, 'total_duration': 1500, 'total_moves': 160, 'white_wins': 1, 'black_wins': 1,
+                'draws': 1, 'abandoned': 1, 'game_types': {'standard': 2, 'portal_gambit': 2},
+                'time_controls': {'600/5': 2, '300/0': 1, '180/0': 1}}
+
+    with patch.object(AnalyticsService, 'get_document', AsyncMock(return_value=counters)) as mock_get, \
+            patch.object(AnalyticsService, 'query_collection', new_callable=AsyncMock) as mock_query:
+        stats = await analytics_service.get_daily_stats(test_date)
+
+    mock_get.assert_called_once_with('analytics_daily', '2024-03-13')
+    mock_query.assert_not_called()
+    assert stats['total_games'] == 4
+    assert stats['average_duration'] == pytest.approx(375)
+    assert stats['average_moves'] == pytest.approx(40)
+    assert stats['white_wins'] == stats['black_wins'] == stats['draws'] == stats['abandoned'] == 1
+    assert stats['game_types'] == counters['game_types']
+    assert stats['time_controls'] == counters['time_controls']
+
+
 # --- Player Performance Tests ---
 
 @pytest.mark.asyncio
@@ -173,7 +300,8 @@ async def test_get_player_performance_no_games(analytics_service, test_user_1_ui
     with patch.object(AnalyticsService, 'query_collection', AsyncMock(return_value=[])) as mock_query:
         perf = await analytics_service.get_player_performance(user_id, days)
 
-    assert mock_query.call_count == 2  # Called for white and black games
+    mock_query.assert_called_once()  # One OR query covers white and black games
+    assert mock_query.call_args[1]['any_of'] == [('white_player_id', '==', user_id), ('black_player_id', '==', user_id)]
     assert perf['rating_progression'] == []
     assert perf['win_rate'] == 0
     assert perf['average_game_duration'] == 0
@@ -198,14 +326,11 @@ async def test_get_player_performance_calculation(analytics_service, test_user_1
              'game_type': 'standard', 'time_control': {'initial': 300, 'increment': 0}}
 
     with patch.object(AnalyticsService, 'query_collection', new_callable=AsyncMock) as mock_query:
-        # Simulate query results: user as white -> g1, g3; user as black -> g2
-        mock_query.side_effect = [
-            [game1, game3],  # Games where user_id is white
-            [game2]  # Games where user_id is black
-        ]
+        # Simulate the OR query's results (not in timestamp order): user as white -> g1, g3; as black -> g2
+        mock_query.return_value = [game1, game3, game2]
         perf = await analytics_service.get_player_performance(user_id, days)
 
-    assert mock_query.call_count == 2
+    assert mock_query.call_count == 1
     assert len(perf['rating_progression']) == 3
     # Index 0: Game 1 (Correct)
     assert perf['rating_progression'][0] == {'timestamp': game1['timestamp'], 'rating_change': 8}
@@ -225,8 +350,59 @@ async def test_get_player_performance_calculation(analytics_service, test_user_1
     assert perf['performance_by_color']['black']['wins'] == 1  # Only g2
 
 
+@pytest.mark.asyncio
+async def test_record_game_analytics_evicts_player_performance(analytics_service, mock_db_client):
+    """Test recording a game drops both players' cached performance, for every days window."""
+    now = datetime.now(timezone.utc)
+    game_data = {
+        'game_id': 'ana_game_evict', 'white_player_id': 'p_white', 'black_player_id': 'p_black',
+        'start_time': now - timedelta(minutes=5), 'end_time': now, 'result': GameResult.WHITE_WIN,
+        'moves': ['e4'], 'rating_change': {'white': 5, 'black': -5}, 'game_type': 'standard',
+        'time_control': {'initial': 300, 'increment': 0}
+    }
+    mock_db_client.batch.return_value.commit = AsyncMock(return_value=None)
+
+    with patch.object(AnalyticsService, 'query_collection', AsyncMock(return_value=[])) as mock_query:
+        for user_id, days in (('p_white', 30), ('p_white', 7), ('p_black', 30), ('p_other', 30)):
+            await analytics_service.get_player_performance(user_id, days)
+        assert await analytics_service.record_game_analytics(game_data) is True
+        for user_id, days in (('p_white', 30), ('p_white', 7), ('p_black', 30), ('p_other', 30)):
+            await analytics_service.get_player_performance(user_id, days)
+
+    assert mock_query.await_count == 7  # Only p_other's result was still cached
+
+
 # --- Global Stats Tests ---
 
+def _stream_of(games):
+    """Stand-in for stream_collection that yields the given docs."""
+    async def stream(*args, **kwargs):
+        for game in games:
+            yield game
+
+    return MagicMock(side_effect=stream)
+
+
+@pytest.mark.asyncio
+async def test_get_global_stats_stream_failure_not_persisted(analytics_service):
+    """Test a sample stream that fails part-way raises instead of caching partial global stats."""
+    game = {'duration': 300, 'total_moves': 40, 'result': GameResult.WHITE_WIN, 'game_type': 'standard',
+            'time_control': {'initial': 300, 'increment': 0}}
+
+    def failing_stream(*args, **kwargs):
+        async def stream():
+            yield game
+            raise RuntimeError("stream reset")
+        return stream()
+
+    with patch.object(AnalyticsService, 'get_document', AsyncMock(return_value=None)), \
+            patch.object(AnalyticsService, 'stream_collection', MagicMock(side_effect=failing_stream)), \
+            patch.object(AnalyticsService, 'set_document', AsyncMock(return_value=True)) as mock_set:
+        with pytest.raises(RuntimeError):
+            await analytics_service.get_global_stats()
+
+    mock_set.assert_not_called()
+
 @pytest.mark.asyncio
 async def test_get_global_stats_cache_hit_recent(analytics_service):
     """Test global stats cache hit when data is recent."""
@@ -234,13 +410,15 @@ async def test_get_global_stats_cache_hit_recent(analytics_service):
     # Simulate cached data less than 1 hour old
     cached_data = {'total_games': 100, 'last_updated': datetime.now(timezone.utc) - timedelta(minutes=30)}
 
-    with patch.object(AnalyticsService, 'get_document', AsyncMock(return_value=cached_data)) as mock_get, \
-            patch.object(AnalyticsService, 'query_collection', new_callable=AsyncMock) as mock_query:
+    # No totals doc yet, so the legacy cache is consulted
+    with patch.object(AnalyticsService, 'get_document', AsyncMock(side_effect=[None, cached_data])) as mock_get, \
+            patch.object(AnalyticsService, 'stream_collection') as mock_stream:
         stats = await analytics_service.get_global_stats()
 
     assert stats == cached_data
-    mock_get.assert_called_once_with('analytics_cache', cache_key)
-    mock_query.assert_not_called()
+    mock_get.assert_any_call('analytics_totals', 'global')
+    mock_get.assert_called_with('analytics_cache', cache_key, ttl=300)
+    mock_stream.assert_not_called()
 
 
 @pytest.mark.asyncio
@@ -257,14 +435,14 @@ async def test_get_global_stats_cache_hit_stale(analytics_service):
          'time_control': {'initial': 600, 'increment': 5}},
     ]
 
-    with patch.object(AnalyticsService, 'get_document', AsyncMock(return_value=stale_cached_data)) as mock_get, \
-            patch.object(AnalyticsService, 'query_collection',
-                         AsyncMock(return_value=mock_games_for_recalc)) as mock_query, \
+    with patch.object(AnalyticsService, 'get_document',
+                      AsyncMock(side_effect=[None, stale_cached_data])) as mock_get, \
+            patch.object(AnalyticsService, 'stream_collection', _stream_of(mock_games_for_recalc)) as mock_stream, \
             patch.object(AnalyticsService, 'set_document', AsyncMock(return_value=True)) as mock_set:
         stats = await analytics_service.get_global_stats()
 
-    mock_get.assert_called_once_with('analytics_cache', cache_key)
-    mock_query.assert_called_once()  # Query should run due to stale cache
+    mock_get.assert_called_with('analytics_cache', cache_key, ttl=300)
+    mock_stream.assert_called_once()  # Query should run due to stale cache
     assert stats['total_games'] == 2  # Recalculated total
     assert stats['white_win_rate'] == 0.5  # 1 white win out of 2 games
     assert stats['average_game_duration'] == pytest.approx((300 + 600) / 2)
@@ -285,13 +463,36 @@ async def test_get_global_stats_cache_miss(analytics_service):
          'time_control': {'initial': 600, 'increment': 5}},
     ]
     with patch.object(AnalyticsService, 'get_document', AsyncMock(return_value=None)) as mock_get, \
-            patch.object(AnalyticsService, 'query_collection',
-                         AsyncMock(return_value=mock_games_for_calc)) as mock_query, \
+            patch.object(AnalyticsService, 'stream_collection', _stream_of(mock_games_for_calc)) as mock_stream, \
             patch.object(AnalyticsService, 'set_document', AsyncMock(return_value=True)) as mock_set:
         stats = await analytics_service.get_global_stats()
 
-    mock_get.assert_called_once_with('analytics_cache', cache_key)
-    mock_query.assert_called_once()
+    mock_get.assert_called_with('analytics_cache', cache_key, ttl=300)
+    mock_stream.assert_called_once()
     assert stats['total_games'] == 1
     assert stats['white_win_rate'] == 1.0
     mock_set.assert_called_once_with('analytics_cache', cache_key, stats)
+
+
+@pytest.mark.asyncio
+async def test_get_global_stats_from_counters(analytics_service):
+    """Test global stats are derived from the all-time totals doc without scanning games."""
+    last_updated = datetime.now(timezone.utc) - timedelta(minutes=5)
+    counters = {'total_games': 10, 'total_duration': 5000, 'total_moves': 400, 'white_wins': 4,
+                'game_types': {'standard': 3, 'portal_gambit': 7},
+                'time_controls': {f"{i}/0": i for i in range(1, 8)},  # 7 entries; only the top 5 are kept
+                'last_updated': last_updated}
+
+    with patch.object(AnalyticsService, 'get_document', AsyncMock(return_value=counters)) as mock_get, \
+            patch.object(AnalyticsService, 'query_collection', new_callable=AsyncMock) as mock_query:
+        stats = await analytics_service.get_global_stats()
+
+    mock_get.assert_called_once_with('analytics_totals', 'global')
+    mock_query.assert_not_called()
+    assert stats['total_games'] == 10
+    assert stats['white_win_rate'] == pytest.approx(0.4)
+    assert stats['average_game_duration'] == pytest.approx(500)
+    assert stats['average_moves_per_game'] == pytest.approx(40)
+    assert list(stats['popular_time_controls']) == ['7/0', '6/0', '5/0', '4/0', '3/0']
+    assert stats['popular_game_types'] == {'portal_gambit': 7, 'standard': 3}
+    assert stats['last_updated'] == last_updated
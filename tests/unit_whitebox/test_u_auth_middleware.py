@@ -0,0 +1,68 @@
+# Filename: tests/unit_whitebox/test_u_auth_middleware.py
+from unittest.mock import AsyncMock
+
+import pytest
+from fastapi import HTTPException
+
+from middleware.auth_middleware import (
+    FirebaseAuthMiddleware, _compile_exclude_paths, _bearer_token, _authorization_header
+)
+
+
+# --- Exclude path matching ---
+
+def test_compile_exclude_paths_splits_literals_and_regexes():
+    """Test anchored literal patterns become plain paths and the rest are fused into one regex."""
+    literals, regex = _compile_exclude_paths([r"^/$", r"^/favicon\.ico$", r"^/public/.*", r"^/v\d+/health$"])
+
+    assert literals == frozenset({"/", "/favicon.ico"})
+    assert regex.match("/public/img.png")
+    assert regex.match("/v2/health")
+    assert not regex.match("/private")
+
+
+def test_compile_exclude_paths_all_literal():
+    """Test no regex is compiled when every pattern is a literal path."""
+    literals, regex = _compile_exclude_paths([r"^/docs$", r"^/redoc$"])
+
+    assert literals == frozenset({"/docs", "/redoc"})
+    assert regex is None
+
+
+def test_middleware_is_excluded_defaults_and_custom():
+    """Test the middleware honours both its default and caller-supplied exclusions."""
+    middleware = FirebaseAuthMiddleware(AsyncMock(), exclude_paths=[r"^/status/.*"])
+
+    assert middleware._is_excluded("/auth/token")
+    assert middleware._is_excluded("/openapi.json")
+    assert middleware._is_excluded("/status/live")
+    assert not middleware._is_excluded("/profiles/abc")
+    assert not middleware._is_excluded("/docs/extra")
+
+
+# --- Authorization header parsing ---
+
+def test_authorization_header_from_scope():
+    """Test the header is read from raw ASGI scope headers."""
+    scope = {"headers": [(b"accept", b"*/*"), (b"authorization", b"Bearer tok")]}
+    assert _authorization_header(scope) == "Bearer tok"
+    assert _authorization_header({"headers": []}) is None
+
+
+def test_bearer_token_valid():
+    """Test the token is extracted regardless of the scheme's case."""
+    assert _bearer_token("Bearer abc.def.ghi") == "abc.def.ghi"
+    assert _bearer_token("bearer abc.def.ghi") == "abc.def.ghi"
+
+
+@pytest.mark.parametrize("header, detail", [
+    (None, "Not authenticated"),
+    ("Bearer", "Not authenticated"),
+    ("NotBearer some_token", "Invalid authentication credentials"),
+])
+def test_bearer_token_rejected(header, detail):
+    """Test missing or malformed headers produce the same 403s as fastapi.security.HTTPBearer."""
+    with pytest.raises(HTTPException) as exc_info:
+        _bearer_token(header)
+    assert exc_info.value.status_code == 403
+    assert exc_info.value.detail == detail
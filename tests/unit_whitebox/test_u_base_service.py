@@ -0,0 +1,94 @@
+# Filename: tests/unit_whitebox/test_u_base_service.py
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from services.base_service import BaseService
+
+
+@pytest.fixture
+def base_service(mock_db_client):
+    """Creates a BaseService with the mocked DB client."""
+    return BaseService(mock_db_client)
+
+
+def _doc_ref(mock_db_client):
+    return mock_db_client.collection.return_value.document.return_value
+
+
+@pytest.mark.asyncio
+async def test_get_document_without_ttl_always_reads(base_service, mock_db_client):
+    """Test plain reads go to Firestore every time."""
+    await base_service.get_document('col', 'doc1')
+    await base_service.get_document('col', 'doc1')
+
+    assert _doc_ref(mock_db_client).get.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_get_document_with_ttl_reuses_recent_read(base_service, mock_db_client):
+    """Test a ttl read is served in-process until the document is written through the service."""
+    first = await base_service.get_document('col', 'doc1', ttl=60)
+    second = await base_service.get_document('col', 'doc1', ttl=60)
+
+    assert first == second == {"mock_field": "mock_value_from_db"}
+    assert _doc_ref(mock_db_client).get.await_count == 1
+
+    await base_service.set_document('col', 'doc1', {"mock_field": "new"})
+    await base_service.get_document('col', 'doc1', ttl=60)
+    assert _doc_ref(mock_db_client).get.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_get_document_with_ttl_coalesces_concurrent_misses(base_service, mock_db_client):
+    """Test concurrent misses for one key share a single Firestore read."""
+    snapshot = MagicMock(exists=True)
+    snapshot.to_dict.return_value = {"total_games": 3}
+
+    async def slow_get():
+        await asyncio.sleep(0)
+        return snapshot
+
+    _doc_ref(mock_db_client).get = AsyncMock(side_effect=slow_get)
+
+    results = await asyncio.gather(*(base_service.get_document('col', 'hot', ttl=60) for _ in range(5)))
+
+    assert all(result == {"total_games": 3} for result in results)
+    assert _doc_ref(mock_db_client).get.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_get_document_with_ttl_does_not_cache_missing(base_service, mock_db_client):
+    """Test a missing document (or failed read) is fetched again next time."""
+    _doc_ref(mock_db_client).get.return_value.exists = False
+
+    assert await base_service.get_document('col', 'absent', ttl=60) is None
+    assert await base_service.get_document('col', 'absent', ttl=60) is None
+    assert _doc_ref(mock_db_client).get.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_stream_collection_yields_documents(base_service):
+    """Test streamed query results arrive as plain dicts."""
+    docs = [doc async for doc in base_service.stream_collection('col')]
+
+    assert docs == [{"mock_query_field": "mock_query_value"}]
+
+
+@pytest.mark.asyncio
+async def test_stream_collection_reraises_mid_stream(base_service, mock_db_client):
+    """Test a stream that fails part-way raises instead of ending as if it were complete."""
+    async def failing_stream(*args, **kwargs):
+        snap = MagicMock(exists=True)
+        snap.to_dict.return_value = {"n": 1}
+        yield snap
+        raise RuntimeError("stream reset")
+
+    mock_db_client.collection.return_value.stream = failing_stream
+    docs = []
+    with pytest.raises(RuntimeError):
+        async for doc in base_service.stream_collection('col'):
+            docs.append(doc)
+
+    assert docs == [{"n": 1}]
@@ -21,48 +21,43 @@ def friend_service(mock_db_client):  # Use mock_db_client fixture
     return FriendService(mock_db_client)
 
 
-@pytest.mark.asyncio
-async def test_send_friend_request_success(friend_service, mock_db_client, test_user_1_uid, test_user_2_uid):
-    # ... (Arrange sender_id, etc.) ...
-    sender_id, receiver_id, message = test_user_1_uid, test_user_2_uid, "Hi!"
-    test_uuid_obj = uuid.uuid4()
-    request_id = f"req_{test_uuid_obj.hex}"
-
-    # Mock BaseService.get_document
-    mock_get_friendship = AsyncMock(return_value=None)
-
-    # FIX: Correctly mock the query chain for checking existing requests
-    mock_query_get_method = AsyncMock(return_value=[])  # This is what `await query.get()` returns
+def _mock_pending_queries(mock_db_client, results):
+    """Point both pending-request queries of send_friend_request at one mock chain and return its get()."""
+    mock_query_get_method = AsyncMock(return_value=results)  # This is what `await query.get()` returns
     mock_query_chain = MagicMock(spec=AsyncQuery)
-    # Mock methods called on the query object, ensure they return the mock itself for chaining
-    mock_query_chain.where.return_value = mock_query_chain
     mock_query_chain.limit.return_value = mock_query_chain
-    # Assign the awaitable get method to the final link in the chain
     mock_query_chain.get = mock_query_get_method
-
-    # Ensure the db client returns the start of the mock chain
     # db.collection(...).where(...).where(...).where(...).limit(...) -> mock_query_chain
     mock_db_client.collection.return_value.where.return_value.where.return_value.where.return_value = mock_query_chain
+    return mock_query_get_method
+
 
-    # Mock BaseService.set_document
-    mock_set_request = AsyncMock(return_value=True)
+@pytest.mark.asyncio
+async def test_send_friend_request_success(friend_service, mock_db_client, test_user_1_uid, test_user_2_uid,
+                                           run_transaction_inline):
+    """Test the existence checks and the new request are read and written in one transaction."""
+    sender_id, receiver_id, message = test_user_1_uid, test_user_2_uid, "Hi!"
+    test_uuid_obj = uuid.uuid4()
+    request_id = f"req_{test_uuid_obj.hex}"
 
-    with patch.object(BaseService, 'get_document', mock_get_friendship), \
-            patch.object(BaseService, 'set_document', mock_set_request), \
-            patch('services.friend_service.uuid.uuid4', return_value=test_uuid_obj):
+    doc_ref = mock_db_client.collection.return_value.document.return_value
+    doc_ref.get.return_value.exists = False  # Not friends yet
+    mock_query_get_method = _mock_pending_queries(mock_db_client, [])
+    transaction = mock_db_client.transaction.return_value
 
+    with patch('services.friend_service.uuid.uuid4', return_value=test_uuid_obj):
         result = await friend_service.send_friend_request(sender_id, receiver_id, message)
 
     assert result is True
-    mock_get_friendship.assert_called_once_with(friend_service.friends_collection, f"{sender_id}_{receiver_id}")
-    # Assert the final .get() was awaited twice
+    mock_db_client.collection.return_value.document.assert_any_call(f"{sender_id}_{receiver_id}")
+    mock_db_client.collection.return_value.document.assert_any_call(request_id)
+    doc_ref.get.assert_awaited_once_with(transaction=transaction)
+    # Both direction checks ran inside the transaction
     assert mock_query_get_method.await_count == 2
-    mock_set_request.assert_called_once()
-    # Check args passed to set_document
-    call_args_set = mock_set_request.call_args[0]
-    assert call_args_set[0] == friend_service.requests_collection
-    assert call_args_set[1] == request_id  # Check ID format
-    saved_data = call_args_set[2]
+    mock_query_get_method.assert_awaited_with(transaction=transaction)
+    transaction.set.assert_called_once()
+    saved_data = transaction.set.call_args[0][1]
+    assert saved_data['request_id'] == request_id  # Check ID format
     assert saved_data['sender_id'] == sender_id
     assert saved_data['receiver_id'] == receiver_id
     assert saved_data['message'] == message
@@ -72,33 +67,30 @@ async def test_send_friend_request_success(friend_service, mock_db_client, test_
 
 
 @pytest.mark.asyncio
-async def test_send_friend_request_failure(friend_service, mock_db_client, test_user_1_uid, test_user_2_uid):
-    sender_id, receiver_id = test_user_1_uid, test_user_2_uid
+@pytest.mark.parametrize("already_friends, pending", [(True, []), (False, [MagicMock()])])
+async def test_send_friend_request_rejected(friend_service, mock_db_client, test_user_1_uid, test_user_2_uid,
+                                            run_transaction_inline, already_friends, pending):
+    """Test an existing friendship or pending request blocks the send without writing."""
+    mock_db_client.collection.return_value.document.return_value.get.return_value.exists = already_friends
+    _mock_pending_queries(mock_db_client, pending)
 
-    # Mock BaseService.get_document
-    mock_get_friendship = AsyncMock(return_value=None)
+    result = await friend_service.send_friend_request(test_user_1_uid, test_user_2_uid)
 
-    # FIX: Correctly mock the query chain
-    mock_query_get_method = AsyncMock(return_value=[])
-    mock_query_chain = MagicMock(spec=AsyncQuery)
-    mock_query_chain.where.return_value = mock_query_chain
-    mock_query_chain.limit.return_value = mock_query_chain
-    mock_query_chain.get = mock_query_get_method
-    mock_db_client.collection.return_value.where.return_value.where.return_value.where.return_value = mock_query_chain
+    assert result is False
+    mock_db_client.transaction.return_value.set.assert_not_called()
 
-    # Mock BaseService.set_document to fail
-    mock_set_request = AsyncMock(return_value=False)
 
-    with patch.object(BaseService, 'get_document', mock_get_friendship), \
-            patch.object(BaseService, 'set_document', mock_set_request), \
-            patch('services.friend_service.uuid.uuid4'):
+@pytest.mark.asyncio
+async def test_send_friend_request_failure(friend_service, mock_db_client, test_user_1_uid, test_user_2_uid):
+    """Test a failed transaction is reported as False."""
+    mock_db_client.collection.return_value.document.return_value.get.return_value.exists = False
+    _mock_pending_queries(mock_db_client, [])
 
-        result = await friend_service.send_friend_request(sender_id, receiver_id)
+    with patch('services.friend_service.async_transactional',
+               lambda func: AsyncMock(side_effect=Exception("Commit failed"))):
+        result = await friend_service.send_friend_request(test_user_1_uid, test_user_2_uid)
 
     assert result is False
-    # Assert the final .get() was awaited twice (check happens before set attempt)
-    assert mock_query_get_method.await_count == 2
-    mock_set_request.assert_called_once()  # Ensure it was attempted
 
 
 # --- Tests for get_friend_request ---
@@ -186,82 +178,121 @@ async def test_get_pending_requests(friend_service, mock_db_client, sample_frien
 
 
 # --- Tests for respond_to_request ---
-# ... (respond_to_request tests remain the same) ...
+
 @pytest.mark.asyncio
-async def test_respond_to_request_accept(friend_service, sample_friend_request):
-    request_id = sample_friend_request.request_id
+async def test_respond_to_request_accept(friend_service, mock_db_client, sample_friend_request, run_transaction_inline):
+    """Test accepting updates the request and creates both friendship entries in one transaction."""
     sender_id = sample_friend_request.sender_id
     receiver_id = sample_friend_request.receiver_id
-    status_key1 = f"{sender_id}_{receiver_id}"
-    status_key2 = f"{receiver_id}_{sender_id}"
+    doc_ref = mock_db_client.collection.return_value.document.return_value
     # Use mode='json' to simulate Firestore data
-    mock_request_data = sample_friend_request.model_dump(mode='json')
+    doc_ref.get.return_value.to_dict.return_value = sample_friend_request.model_dump(mode='json')
+    transaction = mock_db_client.transaction.return_value
 
-    # Mock BaseService methods used by respond_to_request
-    with patch.object(BaseService, 'get_document', AsyncMock(return_value=mock_request_data)) as mock_get_req, \
-            patch.object(BaseService, 'update_document', AsyncMock(return_value=True)) as mock_update_req, \
-            patch.object(BaseService, 'set_document', AsyncMock(return_value=True)) as mock_set_status:
-        result = await friend_service.respond_to_request(request_id, accept=True)
+    result = await friend_service.respond_to_request(sample_friend_request.request_id, accept=True)
 
     assert result is True
-    # Verify get_document was called for the request
-    mock_get_req.assert_called_once_with(friend_service.requests_collection, request_id)
-    # Verify update_document call for the request status
-    mock_update_req.assert_called_once()
-    update_call_args = mock_update_req.call_args[0]  # Positional args
-    assert update_call_args[0] == friend_service.requests_collection
-    assert update_call_args[1] == request_id
-    assert update_call_args[2]['status'] == FriendRequestStatus.ACCEPTED.value  # Check enum value
-    assert 'updated_at' in update_call_args[2]
-    # Verify set_document calls for friend status
-    assert mock_set_status.call_count == 2
-    set_calls = mock_set_status.call_args_list
-    # Check that both keys were used for setting friend status
-    keys_called = {call[0][1] for call in set_calls}  # Get the doc_id from each call
-    assert keys_called == {status_key1, status_key2}
-    # Optionally check the data structure passed to set_document
-    assert set_calls[0][0][2]['user_id'] in [sender_id, receiver_id]
-    assert set_calls[0][0][2]['friend_id'] in [sender_id, receiver_id]
+    # The request is read inside the transaction, then updated and both status docs set
+    doc_ref.get.assert_awaited_once_with(transaction=transaction)
+    transaction.update.assert_called_once()
+    update_data = transaction.update.call_args[0][1]
+    assert update_data['status'] == FriendRequestStatus.ACCEPTED.value  # Check enum value
+    assert 'updated_at' in update_data
+    assert transaction.set.call_count == 2
+    mock_db_client.collection.return_value.document.assert_any_call(f"{sender_id}_{receiver_id}")
+    mock_db_client.collection.return_value.document.assert_any_call(f"{receiver_id}_{sender_id}")
 
 
 @pytest.mark.asyncio
-async def test_respond_to_request_reject(friend_service, sample_friend_request):
-    request_id = sample_friend_request.request_id
-    mock_request_data = sample_friend_request.model_dump(mode='json')
+async def test_respond_to_request_reject(friend_service, mock_db_client, sample_friend_request, run_transaction_inline):
+    """Test rejecting only updates the request status."""
+    doc_ref = mock_db_client.collection.return_value.document.return_value
+    doc_ref.get.return_value.to_dict.return_value = sample_friend_request.model_dump(mode='json')
+    transaction = mock_db_client.transaction.return_value
 
-    with patch.object(BaseService, 'get_document', AsyncMock(return_value=mock_request_data)) as mock_get_req, \
-            patch.object(BaseService, 'update_document', AsyncMock(return_value=True)) as mock_update_req, \
-            patch.object(BaseService, 'set_document', AsyncMock()) as mock_set_status:  # Mock set just in case
-
-        result = await friend_service.respond_to_request(request_id, accept=False)
+    result = await friend_service.respond_to_request(sample_friend_request.request_id, accept=False)
 
     assert result is True
-    mock_get_req.assert_called_once_with(friend_service.requests_collection, request_id)
-    # Verify request status update to REJECTED
-    mock_update_req.assert_called_once()
-    update_args = mock_update_req.call_args[0][2]  # Data dict
-    assert update_args['status'] == FriendRequestStatus.REJECTED.value
-    # Verify friend status was NOT created
-    mock_set_status.assert_not_called()
+    assert transaction.update.call_args[0][1]['status'] == FriendRequestStatus.REJECTED.value
+    transaction.set.assert_not_called()  # Verify friend status was NOT created
 
 
 @pytest.mark.asyncio
-async def test_respond_to_request_not_found(friend_service):
+async def test_respond_to_request_not_found(friend_service, mock_db_client, run_transaction_inline):
     """Test responding to a request that doesn't exist."""
-    request_id = "fake_req"
-    with patch.object(BaseService, 'get_document', AsyncMock(return_value=None)):
-        result = await friend_service.respond_to_request(request_id, accept=True)
+    mock_db_client.collection.return_value.document.return_value.get.return_value.exists = False
+
+    result = await friend_service.respond_to_request("fake_req", accept=True)
+
     assert result is False
+    mock_db_client.transaction.return_value.update.assert_not_called()
 
 
 @pytest.mark.asyncio
-async def test_respond_to_request_parsing_error(friend_service, sample_friend_request):
+async def test_respond_to_request_parsing_error(friend_service, mock_db_client, run_transaction_inline):
     """Test responding when the fetched data is invalid."""
-    request_id = sample_friend_request.request_id
-    invalid_data = {"wrong_field": "some_value"}  # Missing required fields
-    with patch.object(BaseService, 'get_document', AsyncMock(return_value=invalid_data)):
-        result = await friend_service.respond_to_request(request_id, accept=True)
+    doc_ref = mock_db_client.collection.return_value.document.return_value
+    doc_ref.get.return_value.to_dict.return_value = {"wrong_field": "some_value"}  # Missing required fields
+
+    result = await friend_service.respond_to_request("bad_req", accept=True)
+
     assert result is False  # Service should handle parsing error and return False
+    mock_db_client.transaction.return_value.update.assert_not_called()
+
+
+# --- Tests for respond_to_request_checked ---
+
+@pytest.fixture
+def run_transaction_inline():
+    """Runs the transactional body directly against the mock transaction (no Firestore begin/commit)."""
+    with patch('services.friend_service.async_transactional', lambda func: func):
+        yield
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("accept, expected_sets", [(True, 2), (False, 0)])
+async def test_respond_to_request_checked_ok(friend_service, mock_db_client, sample_friend_request, test_user_1_uid,
+                                             run_transaction_inline, accept, expected_sets):
+    """Test a pending request for the caller is updated (and friendships created) in one transaction."""
+    doc_ref = mock_db_client.collection.return_value.document.return_value
+    doc_ref.get.return_value.to_dict.return_value = sample_friend_request.model_dump(mode='json')
+    transaction = mock_db_client.transaction.return_value
+
+    outcome = await friend_service.respond_to_request_checked(sample_friend_request.request_id, test_user_1_uid,
+                                                              accept)
+
+    assert outcome == 'ok'
+    doc_ref.get.assert_awaited_once_with(transaction=transaction)
+    transaction.update.assert_called_once()
+    expected_status = FriendRequestStatus.ACCEPTED if accept else FriendRequestStatus.REJECTED
+    assert transaction.update.call_args[0][1]['status'] == expected_status.value
+    assert transaction.set.call_count == expected_sets
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("exists, receiver_override, status_override, expected", [
+    (False, None, None, 'not_found'),
+    (True, "another_user_id", None, 'forbidden'),
+    (True, None, FriendRequestStatus.ACCEPTED, 'stale'),
+])
+async def test_respond_to_request_checked_rejected(friend_service, mock_db_client, sample_friend_request,
+                                                   test_user_1_uid, run_transaction_inline,
+                                                   exists, receiver_override, status_override, expected):
+    """Test missing, foreign and non-pending requests are reported without writing anything."""
+    if receiver_override:
+        sample_friend_request.receiver_id = receiver_override
+    if status_override:
+        sample_friend_request.status = status_override
+    snapshot = mock_db_client.collection.return_value.document.return_value.get.return_value
+    snapshot.exists = exists
+    snapshot.to_dict.return_value = sample_friend_request.model_dump(mode='json')
+    transaction = mock_db_client.transaction.return_value
+
+    outcome = await friend_service.respond_to_request_checked(sample_friend_request.request_id, test_user_1_uid, True)
+
+    assert outcome == expected
+    transaction.update.assert_not_called()
+    transaction.set.assert_not_called()
 
 
 # --- Tests for get_friends ---
@@ -301,6 +332,31 @@ async def test_get_friends(friend_service, mock_db_client, sample_friend_status,
     mock_query_get_method.assert_awaited_once()
 
 
+@pytest.mark.asyncio
+async def test_get_pending_request_ids(friend_service, test_user_1_uid):
+    docs = [{'request_id': 'req_a'}, {'request_id': 'req_b'}]
+    with patch.object(BaseService, 'query_collection', AsyncMock(return_value=docs)) as mock_query:
+        request_ids = await friend_service.get_pending_request_ids(test_user_1_uid)
+
+    assert request_ids == ['req_a', 'req_b']
+    mock_query.assert_awaited_once_with(
+        friend_service.requests_collection,
+        filters=[('receiver_id', '==', test_user_1_uid), ('status', '==', FriendRequestStatus.PENDING.value)],
+        select=['request_id']
+    )
+
+
+@pytest.mark.asyncio
+async def test_get_friend_ids(friend_service, test_user_1_uid, test_user_2_uid):
+    with patch.object(BaseService, 'query_collection',
+                      AsyncMock(return_value=[{'friend_id': test_user_2_uid}])) as mock_query:
+        friend_ids = await friend_service.get_friend_ids(test_user_1_uid)
+
+    assert friend_ids == [test_user_2_uid]
+    mock_query.assert_awaited_once_with(friend_service.friends_collection,
+                                        filters=[('user_id', '==', test_user_1_uid)], select=['friend_id'])
+
+
 # --- Tests for remove_friend ---
 @pytest.mark.asyncio
 async def test_remove_friend_success(friend_service, mock_db_client, test_user_1_uid, test_user_2_uid):
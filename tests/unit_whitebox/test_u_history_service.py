@@ -1,5 +1,5 @@
 from datetime import datetime, timezone, timedelta
-from unittest.mock import AsyncMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
 
@@ -7,6 +7,7 @@ from models.game_history import GameHistory, GameResult  # Import model and enum
 from services.base_service import BaseService  # Import BaseService
 # Import the class to test and its dependencies/models
 from services.history_service import HistoryService
+from services.profile_service import ProfileService
 
 
 @pytest.fixture
@@ -15,36 +16,133 @@ def history_service(mock_db_client):
     return HistoryService(mock_db_client)
 
 
+def _stream_of(games):
+    """Stand-in for stream_collection that yields the given docs."""
+    async def stream(*args, **kwargs):
+        for game in games:
+            yield game
+
+    return MagicMock(side_effect=stream)
+
+
 # --- Test Cases ---
 
 @pytest.mark.asyncio
 async def test_archive_game_success(history_service, mock_db_client, sample_game_history):
-    """Test successfully archiving a game."""
-    game_data = sample_game_history
-    # Mock the underlying set_document call used by archive_game
-    with patch.object(BaseService, 'set_document', new_callable=AsyncMock) as mock_set:
-        mock_set.return_value = True
+    """Test the game and its opening counters are written in one batch."""
+    game_data = sample_game_history  # White wins with "e4 e5 Nf3 ..."
+    # Mock the underlying batch_write call used by archive_game
+    with patch.object(BaseService, 'batch_write', new_callable=AsyncMock) as mock_batch, \
+            patch.object(ProfileService, 'get_profile', AsyncMock(return_value=None)), \
+            patch('services.history_service.Increment', return_value="INCREMENT_OBJECT"):
+        mock_batch.return_value = True
         result = await history_service.archive_game(game_data)
 
     assert result is True
-    # Assert BaseService.set_document was called correctly
-    mock_set.assert_called_once_with(
-        history_service.collection,  # 'game_history'
-        game_data.game_id,
-        game_data.model_dump()  # Changed from dict() to model_dump()
-    )
+    # Assert the game was set with the denormalized lookup keys added
+    expected_data = game_data.model_dump()  # Changed from dict() to model_dump()
+    expected_data['player_ids'] = [game_data.white_player_id, game_data.black_player_id]
+    expected_data['player_pair'] = sorted([game_data.white_player_id, game_data.black_player_id])
+    expected_data['total_moves'] = len(game_data.moves)
+    mock_batch.assert_awaited_once_with([
+        ('create', history_service.collection, game_data.game_id, expected_data),
+        ('merge', history_service.openings_collection, 'e4%20e5%20Nf3',
+         {'moves': 'e4 e5 Nf3', 'count': "INCREMENT_OBJECT", 'wins': "INCREMENT_OBJECT"}),
+    ])
+
+
+@pytest.mark.asyncio
+async def test_archive_game_short_game_has_no_opening(history_service, sample_game_history):
+    """Test games with fewer than three moves don't touch the opening counters."""
+    sample_game_history.moves = ["e4", "e5"]
+    with patch.object(BaseService, 'batch_write', AsyncMock(return_value=True)) as mock_batch, \
+            patch.object(ProfileService, 'get_profile', AsyncMock(return_value=None)):
+        await history_service.archive_game(sample_game_history)
+
+    writes = mock_batch.call_args[0][0]
+    assert [op[:2] for op in writes] == [('create', history_service.collection)]
+
+
+@pytest.mark.asyncio
+async def test_archive_game_updates_ratings_in_one_batch(history_service, sample_game_history, sample_user_profile):
+    """Test both profiles are read, then both rating updates are committed in a single batch."""
+    game = sample_game_history  # White wins, rating_change white +8 / black -8
+    profiles = {game.white_player_id: sample_user_profile,
+                game.black_player_id: sample_user_profile.model_copy(update={'uid': game.black_player_id})}
+    with patch.object(ProfileService, 'get_profile', AsyncMock(side_effect=profiles.get)) as mock_get_profile, \
+            patch.object(BaseService, 'batch_write', AsyncMock(return_value=True)) as mock_batch:
+        result = await history_service.archive_game(game)
+
+    assert result is True
+    assert mock_get_profile.await_count == 2
+    # First the game itself, then both rating updates together
+    assert mock_batch.await_count == 2
+    (white_op, black_op), = mock_batch.call_args_list[1][0]
+    rating = sample_user_profile.rating
+    assert white_op[:3] == ('update', 'user_profiles', game.white_player_id)
+    assert white_op[3]['rating'] == rating + game.rating_change['white']
+    assert 'wins' in white_op[3]
+    assert black_op[:3] == ('update', 'user_profiles', game.black_player_id)
+    assert black_op[3]['rating'] == rating + game.rating_change['black']
+    assert 'losses' in black_op[3]
+
+
+@pytest.mark.asyncio
+async def test_archive_game_evicts_shared_profile_cache(mock_db_client, sample_game_history, sample_user_profile):
+    """Test rating updates go through the injected ProfileService, so its cached profiles are evicted."""
+    profile_service = ProfileService(mock_db_client)
+    history_service = HistoryService(mock_db_client, profile_service=profile_service)
+    mock_db_client.batch.return_value.commit = AsyncMock()
+    key = (profile_service.collection, sample_game_history.white_player_id)
+    profile_service._doc_cache[key] = (0.0, sample_user_profile.model_dump())
+
+    with patch.object(ProfileService, 'get_profile', AsyncMock(return_value=sample_user_profile)):
+        result = await history_service.archive_game(sample_game_history)
+
+    assert result is True
+    assert history_service.profile_service is profile_service
+    assert key not in profile_service._doc_cache
+
+
+@pytest.mark.asyncio
+async def test_archive_game_skips_missing_profiles(history_service, sample_game_history):
+    """Test players without a profile are left out of the rating batch."""
+    with patch.object(ProfileService, 'get_profile', AsyncMock(return_value=None)), \
+            patch.object(BaseService, 'batch_write', AsyncMock(return_value=True)) as mock_batch:
+        result = await history_service.archive_game(sample_game_history)
+
+    assert result is True
+    mock_batch.assert_awaited_once()  # Only the game write
 
 
 @pytest.mark.asyncio
 async def test_archive_game_failure(history_service, mock_db_client, sample_game_history):
-    """Test game archiving when the database set operation fails."""
+    """Test game archiving when the database write fails."""
     game_data = sample_game_history
-    with patch.object(BaseService, 'set_document', new_callable=AsyncMock) as mock_set:
-        mock_set.return_value = False  # Simulate failure
+    with patch.object(BaseService, 'batch_write', new_callable=AsyncMock) as mock_batch, \
+            patch.object(BaseService, 'get_document', AsyncMock(return_value=None)), \
+            patch.object(ProfileService, 'get_profile', new_callable=AsyncMock) as mock_get_profile:
+        mock_batch.return_value = False  # Simulate failure
         result = await history_service.archive_game(game_data)
 
     assert result is False
-    mock_set.assert_called_once()  # Ensure it was attempted
+    mock_batch.assert_called_once()  # Ensure it was attempted
+    mock_get_profile.assert_not_called()  # Ratings are only touched once the game is archived
+
+
+@pytest.mark.asyncio
+async def test_archive_game_retry_is_idempotent(history_service, sample_game_history):
+    """Test re-archiving a stored game reports success without re-applying ratings or counters."""
+    stored = sample_game_history.model_dump()
+    with patch.object(BaseService, 'batch_write', AsyncMock(return_value=False)) as mock_batch, \
+            patch.object(BaseService, 'get_document', AsyncMock(return_value=stored)) as mock_get, \
+            patch.object(ProfileService, 'get_profile', new_callable=AsyncMock) as mock_get_profile:
+        result = await history_service.archive_game(sample_game_history)
+
+    assert result is True
+    mock_batch.assert_awaited_once()  # Only the rejected create (with its counters) was attempted
+    mock_get.assert_awaited_once_with(history_service.collection, sample_game_history.game_id)
+    mock_get_profile.assert_not_called()
 
 
 @pytest.mark.asyncio
@@ -84,11 +182,7 @@ async def test_get_user_games(history_service, sample_game_history, test_user_1_
 
     # Mock BaseService.query_collection
     with patch.object(BaseService, 'query_collection', new_callable=AsyncMock) as mock_query_coll:
-        # FIX: Simulate results for *two* calls
-        mock_query_coll.side_effect = [
-            mock_return_data,  # Games where user is white
-            []  # Games where user is black
-        ]
+        mock_query_coll.return_value = mock_return_data
         results = await history_service.get_user_games(user_id, limit)
 
     assert len(results) == 1
@@ -96,20 +190,27 @@ async def test_get_user_games(history_service, sample_game_history, test_user_1_
     assert results[0].game_id == sample_game_history.game_id
     assert user_id == results[0].white_player_id  # In this specific mock setup
 
-    # FIX: Verify the calls to the mocked BaseService.query_collection
-    assert mock_query_coll.call_count == 2
-    # Check first call (user as white)
-    call1_args, call1_kwargs = mock_query_coll.call_args_list[0]
-    assert call1_args[0] == history_service.collection  # Positional collection arg
-    assert call1_kwargs['filters'] == [('white_player_id', '==', user_id)]
-    assert call1_kwargs['order_by'] == ('end_time', 'DESCENDING')
-    assert call1_kwargs['limit'] == limit
-    # Check second call (user as black)
-    call2_args, call2_kwargs = mock_query_coll.call_args_list[1]
-    assert call2_args[0] == history_service.collection  # Positional collection arg
-    assert call2_kwargs['filters'] == [('black_player_id', '==', user_id)]
-    assert call2_kwargs['order_by'] == ('end_time', 'DESCENDING')
-    assert call2_kwargs['limit'] == limit
+    # Verify a single query matches the user in either colour
+    mock_query_coll.assert_called_once()
+    call_args, call_kwargs = mock_query_coll.call_args
+    assert call_args[0] == history_service.collection  # Positional collection arg
+    assert call_kwargs['filters'] == [('player_ids', 'array_contains', user_id)]
+    assert call_kwargs['order_by'] == ('end_time', 'DESCENDING')
+    assert call_kwargs['limit'] == limit
+
+
+@pytest.mark.asyncio
+async def test_get_user_games_next_page(history_service, test_user_1_uid):
+    """Test a page cursor is passed to the query as the end_time to resume after."""
+    cursor = datetime(2024, 2, 15, 10, 30, tzinfo=timezone.utc)
+    with patch.object(BaseService, 'query_collection', AsyncMock(return_value=[])) as mock_query_coll:
+        await history_service.get_user_games(test_user_1_uid, 20)
+        await history_service.get_user_games(test_user_1_uid, 20, start_after=cursor)
+
+    first_page, next_page = mock_query_coll.call_args_list
+    assert first_page[1]['start_after'] is None
+    assert next_page[1]['start_after'] == {'end_time': cursor}
+    assert next_page[1]['order_by'] == ('end_time', 'DESCENDING')
 
 
 @pytest.mark.asyncio
@@ -122,7 +223,7 @@ async def test_get_games_between_players(history_service, sample_game_history, t
     mock_return_data = [sample_game_history.model_dump(mode='json')]  # Use mode='json'
 
     with patch.object(BaseService, 'query_collection', new_callable=AsyncMock) as mock_query_coll:
-        mock_query_coll.side_effect = [mock_return_data, []]
+        mock_query_coll.return_value = mock_return_data
         results = await history_service.get_games_between_players(player1_id, player2_id, limit)
 
     assert len(results) == 1
@@ -130,23 +231,24 @@ async def test_get_games_between_players(history_service, sample_game_history, t
     assert results[0].game_id == sample_game_history.game_id
     assert (results[0].white_player_id == player1_id and results[0].black_player_id == player2_id)
 
-    # Verify query_collection was called twice with appropriate filters
-    assert mock_query_coll.call_count == 2
-    # FIX: Check positional args and kwargs for filters, limit, order_by
-    # Call 1
-    call1_args, call1_kwargs = mock_query_coll.call_args_list[0]
-    expected_filters1 = [('white_player_id', '==', player1_id), ('black_player_id', '==', player2_id)]
-    assert call1_args[0] == history_service.collection
-    assert call1_kwargs['filters'] == expected_filters1
-    assert call1_kwargs['limit'] == limit
-    assert call1_kwargs['order_by'] == ('end_time', 'DESCENDING')
-    # Call 2
-    call2_args, call2_kwargs = mock_query_coll.call_args_list[1]
-    expected_filters2 = [('white_player_id', '==', player2_id), ('black_player_id', '==', player1_id)]
-    assert call2_args[0] == history_service.collection
-    assert call2_kwargs['filters'] == expected_filters2
-    assert call2_kwargs['limit'] == limit
-    assert call2_kwargs['order_by'] == ('end_time', 'DESCENDING')
+    # Verify a single query covers both colour assignments
+    mock_query_coll.assert_called_once()
+    call_args, call_kwargs = mock_query_coll.call_args
+    assert call_args[0] == history_service.collection
+    assert call_kwargs['filters'] == [('player_pair', '==', sorted([player1_id, player2_id]))]
+    assert call_kwargs['limit'] == limit
+    assert call_kwargs['order_by'] == ('end_time', 'DESCENDING')
+
+
+@pytest.mark.asyncio
+async def test_get_games_between_players_is_order_independent(history_service, test_user_1_uid, test_user_2_uid):
+    """Test both argument orders look up the same pairing key."""
+    with patch.object(BaseService, 'query_collection', AsyncMock(return_value=[])) as mock_query_coll:
+        await history_service.get_games_between_players(test_user_1_uid, test_user_2_uid, 5)
+        await history_service.get_games_between_players(test_user_2_uid, test_user_1_uid, 5)
+
+    first_call, second_call = mock_query_coll.call_args_list
+    assert first_call[1]['filters'] == second_call[1]['filters']
 
 
 @pytest.mark.asyncio
@@ -171,10 +273,20 @@ async def test_get_user_stats_calculation(history_service, test_user_1_uid):
         moves=["c4"] * 10, rating_change={'white': 0, 'black': 0}, white_rating=0, black_rating=0, time_control={}
     ).model_dump(mode='json')  # Use mode='json'
 
-    with patch.object(BaseService, 'query_collection', new_callable=AsyncMock) as mock_query_coll:
-        mock_query_coll.side_effect = [[game1_data, game3_data], [game2_data]]
+    # Stored by archive_game; the query projects it instead of the move list
+    for game_data in (game1_data, game2_data, game3_data):
+        game_data['total_moves'] = len(game_data.pop('moves'))
+
+    with patch.object(BaseService, 'stream_collection', _stream_of([game1_data, game2_data, game3_data])) as mock_stream:
         stats = await history_service.get_user_stats(user_id, days)
 
+    # One streamed query for both colours, restricted to the period and projected to the fields stats read
+    filters = mock_stream.call_args[1]['filters']
+    assert filters[0] == ('player_ids', 'array_contains', user_id)
+    assert filters[1][:2] == ('end_time', '>=')
+    assert 'moves' not in mock_stream.call_args[1]['select']
+    assert stats['total_moves'] == 60
+
     # ... (Verify stats totals) ...
     assert stats['total_games'] == 3
     assert stats['wins'] == 2
@@ -193,7 +305,68 @@ async def test_get_user_stats_calculation(history_service, test_user_1_uid):
 
 
 @pytest.mark.asyncio
-async def test_get_popular_openings(history_service):
+async def test_get_user_stats_skips_malformed_rows(history_service, sample_game_history, test_user_1_uid):
+    """Test a row missing a field is left out entirely rather than partially counted."""
+    good = sample_game_history.model_dump(mode='json')
+    good['total_moves'] = len(good['moves'])
+    bad = dict(good, game_id="broken")
+    del bad['end_time']
+    with patch.object(BaseService, 'stream_collection', _stream_of([good, bad])):
+        stats = await history_service.get_user_stats(test_user_1_uid)
+
+    assert stats['total_games'] == 1
+    assert stats['white_games'] == 1
+    assert stats['wins'] == 1
+    assert stats['rating_change'] == sample_game_history.rating_change['white']
+    assert stats['total_moves'] == len(sample_game_history.moves)
+
+
+@pytest.mark.asyncio
+async def test_get_user_stats_stream_failure_not_cached(history_service, sample_game_history, test_user_1_uid):
+    """Test a stream that fails part-way raises, and the partial totals are neither returned nor cached."""
+    game = sample_game_history.model_dump(mode='json')
+    game['total_moves'] = len(game['moves'])
+
+    def failing_stream(*args, **kwargs):
+        async def stream():
+            yield game
+            raise RuntimeError("stream reset")
+        return stream()
+
+    with patch.object(BaseService, 'stream_collection', MagicMock(side_effect=failing_stream)):
+        with pytest.raises(RuntimeError):
+            await history_service.get_user_stats(test_user_1_uid)
+    with patch.object(BaseService, 'stream_collection', _stream_of([game, game])):
+        stats = await history_service.get_user_stats(test_user_1_uid)
+
+    assert stats['total_games'] == 2  # Recomputed from a complete read
+
+@pytest.mark.asyncio
+async def test_rebuild_history_aggregates(history_service):
+    """Test the backfill adds lookup fields to old games only and overwrites every opening's counters."""
+    old_game = {'game_id': 'g_old', 'white_player_id': 'u2', 'black_player_id': 'u1',
+                'moves': ['e4', 'e5', 'Nf3', 'Nc6'], 'result': GameResult.WHITE_WIN}
+    new_game = {'game_id': 'g_new', 'white_player_id': 'u1', 'black_player_id': 'u3',
+                'moves': ['e4', 'e5', 'Nf3'], 'result': GameResult.DRAW,
+                'player_ids': ['u1', 'u3'], 'player_pair': ['u1', 'u3'], 'total_moves': 3}
+    short_game = {'game_id': 'g_short', 'white_player_id': 'u1', 'black_player_id': 'u2',
+                  'moves': ['d4'], 'result': GameResult.ABANDONED,
+                  'player_ids': ['u1', 'u2'], 'player_pair': ['u1', 'u2'], 'total_moves': 1}
+
+    with patch.object(BaseService, 'stream_collection', _stream_of([old_game, new_game, short_game])), \
+            patch.object(BaseService, 'batch_write', AsyncMock(return_value=True)) as mock_batch:
+        counts = await history_service.rebuild_history_aggregates()
+
+    assert counts == {'games': 3, 'games_updated': 1, 'openings': 1}
+    writes = mock_batch.call_args[0][0]
+    assert writes[0] == ('update', 'game_history', 'g_old',
+                         {'player_ids': ['u2', 'u1'], 'player_pair': ['u1', 'u2'], 'total_moves': 4})
+    # Overwritten rather than incremented, so rerunning the backfill doesn't double-count
+    assert writes[1] == ('set', 'opening_counters', 'e4%20e5%20Nf3', {'moves': 'e4 e5 Nf3', 'count': 2, 'wins': 1})
+    assert len(writes) == 2
+
+@pytest.mark.asyncio
+async def test_get_popular_openings_without_counters(history_service):
     # ... (Arrange game data, using mode='json') ...
     limit = 2
     now = datetime.now(timezone.utc)
@@ -216,8 +389,10 @@ async def test_get_popular_openings(history_service):
                              white_player_id="p9", black_player_id="p10", start_time=now - timedelta(minutes=1),
                              white_rating=0, black_rating=0, rating_change={}, time_control={}).model_dump(mode='json')
 
-    with patch.object(BaseService, 'query_collection', new_callable=AsyncMock) as mock_query_coll:
-        mock_query_coll.return_value = [game1_data, game2_data, game3_data, game4_data, game5_data]
+    # No opening counters yet, so recent games are sampled instead
+    with patch.object(BaseService, 'query_collection', AsyncMock(return_value=[])), \
+            patch.object(BaseService, 'stream_collection',
+                         _stream_of([game1_data, game2_data, game3_data, game4_data, game5_data])) as mock_stream:
         openings = await history_service.get_popular_openings(limit)
 
     assert len(openings) == limit
@@ -232,3 +407,18 @@ async def test_get_popular_openings(history_service):
     assert opening2['wins'] == 0  # Draw is not counted as win in updated logic example
     assert openings[0]['count'] >= openings[1]['count']
     assert openings[0]['moves'] == "e4 e5 Nf3"
+    assert mock_stream.call_args[1]['select'] == ['game_id', 'moves', 'result']
+
+
+@pytest.mark.asyncio
+async def test_get_popular_openings_from_counters(history_service):
+    """Test openings are read from the counters collection, most played first."""
+    counters = [{'moves': "e4 e5 Nf3", 'count': 120, 'wins': 65}, {'moves': "d4 d5 c4", 'count': 40}]
+    with patch.object(BaseService, 'query_collection', AsyncMock(return_value=counters)) as mock_query_coll:
+        openings = await history_service.get_popular_openings(2)
+
+    assert openings == [{'moves': "e4 e5 Nf3", 'count': 120, 'wins': 65},
+                        {'moves': "d4 d5 c4", 'count': 40, 'wins': 0}]  # No decisive games yet
+    mock_query_coll.assert_awaited_once_with(history_service.openings_collection,
+                                             order_by=('count', 'DESCENDING'), limit=2,
+                                             select=['moves', 'count', 'wins'])
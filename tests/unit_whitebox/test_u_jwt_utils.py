@@ -86,6 +86,31 @@ def test_verify_token_valid():
     assert "exp" in payload
 
 
+def test_verify_token_cached():
+    """Test that a repeat verification of the same token skips decoding."""
+    token = jwt_utils.create_access_token({"uid": "cache_me"})
+    first = jwt_utils.verify_token(token)
+
+    with patch.object(jwt_utils.jwt, "decode") as mock_decode:
+        second = jwt_utils.verify_token(token)
+
+    mock_decode.assert_not_called()
+    assert second == first
+
+
+@pytest.mark.asyncio
+async def test_verify_token_async_cache_hit_skips_pool():
+    """Test that the async wrapper answers cached tokens without dispatching to the worker pool."""
+    token = jwt_utils.create_access_token({"uid": "async_user"})
+    first = await jwt_utils.verify_token_async(token)  # Miss: verified on the pool
+
+    with patch.object(jwt_utils._VERIFY_POOL, "submit") as mock_submit:
+        second = await jwt_utils.verify_token_async(token)
+
+    mock_submit.assert_not_called()
+    assert first["uid"] == second["uid"] == "async_user"
+
+
 def test_verify_token_invalid_signature():
     """Test verifying a token signed with a different secret."""
     data = {"uid": "bad_sig"}
@@ -176,3 +201,112 @@ def test_create_tokens_for_user_minimal_firebase_data():
     assert payload["uid"] == "minimal_fb_user"
     assert payload.get("email") is None  # Check default handling
     assert payload.get("email_verified") is False  # Check default handling
+
+
+# --- Firebase ID token verification ---
+
+FIREBASE_TEST_PROJECT = "portal-gambit-test"
+FIREBASE_TEST_KID = "test-kid"
+
+
+@pytest.fixture(scope="module")
+def firebase_signing_keys():
+    """
+    Generates an RSA key and a self-signed x509 certificate for it, standing in for Google's
+    securetoken signing key (the certs endpoint serves certificates, not bare public keys).
+    """
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    from cryptography.x509.oid import NameOID
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    private_pem = key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                    serialization.NoEncryption()).decode()
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "securetoken.system.gserviceaccount.com")])
+    now = datetime.now(timezone.utc)
+    cert = (x509.CertificateBuilder()
+            .subject_name(name).issuer_name(name)
+            .public_key(key.public_key())
+            .serial_number(x509.random_serial_number())
+            .not_valid_before(now - timedelta(days=1)).not_valid_after(now + timedelta(days=1))
+            .sign(key, hashes.SHA256()))
+    cert_pem = cert.public_bytes(serialization.Encoding.PEM).decode()
+    return private_pem, cert_pem
+
+
+def _make_firebase_token(private_pem, **overrides):
+    now = int(time.time())
+    claims = {
+        "iss": f"https://securetoken.google.com/{FIREBASE_TEST_PROJECT}",
+        "aud": FIREBASE_TEST_PROJECT,
+        "sub": "firebase_uid_123",
+        "email": "fb@example.com",
+        "auth_time": now - 60,
+        "iat": now - 60,
+        "exp": now + 3600,
+    }
+    claims.update(overrides)
+    claims = {name: value for name, value in claims.items() if value is not None}  # None drops a claim
+    return jwt_utils.jwt.encode(claims, private_pem, algorithm="RS256", headers={"kid": FIREBASE_TEST_KID})
+
+
+@pytest.fixture
+def mock_firebase_certs(firebase_signing_keys):
+    _, cert_pem = firebase_signing_keys
+    with patch.dict(jwt_utils.os.environ, {"FIREBASE_PROJECT_ID": FIREBASE_TEST_PROJECT}), \
+            patch.object(jwt_utils._firebase_certs, "get",
+                         side_effect=lambda kid: cert_pem if kid == FIREBASE_TEST_KID else None):
+        yield
+
+
+def test_verify_firebase_token_valid(firebase_signing_keys, mock_firebase_certs):
+    """Test a correctly signed Firebase ID token is accepted and 'uid' is populated from 'sub'."""
+    token = _make_firebase_token(firebase_signing_keys[0])
+
+    payload = jwt_utils.verify_firebase_token(token)
+
+    assert payload["uid"] == "firebase_uid_123"
+    assert payload["email"] == "fb@example.com"
+
+
+def test_verify_firebase_token_cached(firebase_signing_keys, mock_firebase_certs):
+    """Test a re-presented Firebase ID token is answered from the cache without another RSA check."""
+    token = _make_firebase_token(firebase_signing_keys[0])
+    first = jwt_utils.verify_firebase_token(token)
+
+    with patch.object(jwt_utils.jwt, "decode") as mock_decode:
+        second = jwt_utils.verify_firebase_token(token)
+
+    mock_decode.assert_not_called()
+    assert second == first
+
+
+def test_verify_firebase_token_wrong_audience(firebase_signing_keys, mock_firebase_certs):
+    """Test a token issued for another project is rejected."""
+    token = _make_firebase_token(firebase_signing_keys[0], aud="some-other-project")
+
+    with pytest.raises(JWTError):
+        jwt_utils.verify_firebase_token(token)
+
+
+@pytest.mark.parametrize("overrides", [
+    {"iat": int(time.time()) + 600},
+    {"iat": None},
+    {"auth_time": int(time.time()) + 600},
+], ids=["future_iat", "missing_iat", "future_auth_time"])
+def test_verify_firebase_token_rejects_bad_timestamps(firebase_signing_keys, mock_firebase_certs, overrides):
+    """Test tokens issued (or authenticated) in the future, or without 'iat', are rejected."""
+    token = _make_firebase_token(firebase_signing_keys[0], **overrides)
+
+    with pytest.raises(JWTError):
+        jwt_utils.verify_firebase_token(token)
+
+
+def test_verify_firebase_token_unknown_kid(firebase_signing_keys, mock_firebase_certs):
+    """Test a token signed with an unknown key id is rejected."""
+    token = jwt_utils.jwt.encode({"sub": "x"}, firebase_signing_keys[0], algorithm="RS256",
+                                 headers={"kid": "rotated-away"})
+
+    with pytest.raises(JWTError):
+        jwt_utils.verify_firebase_token(token)
@@ -80,7 +80,7 @@ async def test_get_profile_found(profile_service, sample_user_profile):
     assert profile is not None
     assert isinstance(profile, UserProfile)
     assert profile.uid == uid
-    mock_get.assert_called_once_with(profile_service.collection, uid)
+    mock_get.assert_called_once_with(profile_service.collection, uid, ttl=0)
 
 
 @pytest.mark.asyncio
@@ -92,7 +92,18 @@ async def test_get_profile_not_found(profile_service, test_user_1_uid):
         profile = await profile_service.get_profile(uid)
 
     assert profile is None
-    mock_get.assert_called_once_with(profile_service.collection, uid)
+    mock_get.assert_called_once_with(profile_service.collection, uid, ttl=0)
+
+
+@pytest.mark.asyncio
+async def test_get_profile_with_ttl(profile_service, sample_user_profile):
+    """Test a display read passes its ttl through to the document cache."""
+    with patch.object(BaseService, 'get_document',
+                      AsyncMock(return_value=sample_user_profile.model_dump())) as mock_get:
+        profile = await profile_service.get_profile(sample_user_profile.uid, ttl=30)
+
+    assert profile.uid == sample_user_profile.uid
+    mock_get.assert_called_once_with(profile_service.collection, sample_user_profile.uid, ttl=30)
 
 
 @pytest.mark.asyncio
@@ -142,9 +153,8 @@ async def test_update_rating_win(profile_service, test_user_1_uid, mock_fs_incre
     uid = test_user_1_uid
     new_rating = 1258
     game_result = {"result": "win"}
-    with patch.object(BaseService, 'update_document', new_callable=AsyncMock) as mock_update, \
-            patch('services.profile_service.firestore.Increment',  # Mock Increment where it's used
-                  return_value=mock_fs_increment):
+    # The update skeletons are built at import, so compare against real (equal-by-value) Increment sentinels
+    with patch.object(BaseService, 'update_document', new_callable=AsyncMock) as mock_update:
         mock_update.return_value = True
         result = await profile_service.update_rating(uid, new_rating, game_result)
 
@@ -163,8 +173,8 @@ async def test_update_rating_loss(profile_service, test_user_1_uid, mock_fs_incr
     uid = test_user_1_uid
     new_rating = 1242
     game_result = {"result": "loss"}
-    with patch.object(BaseService, 'update_document', new_callable=AsyncMock) as mock_update, \
-            patch('services.profile_service.firestore.Increment', return_value=mock_fs_increment):
+    # The update skeletons are built at import, so compare against real (equal-by-value) Increment sentinels
+    with patch.object(BaseService, 'update_document', new_callable=AsyncMock) as mock_update:
         mock_update.return_value = True
         result = await profile_service.update_rating(uid, new_rating, game_result)
 
@@ -183,8 +193,8 @@ async def test_update_rating_draw(profile_service, test_user_1_uid, mock_fs_incr
     uid = test_user_1_uid
     new_rating = 1250
     game_result = {"result": "draw"}
-    with patch.object(BaseService, 'update_document', new_callable=AsyncMock) as mock_update, \
-            patch('services.profile_service.firestore.Increment', return_value=mock_fs_increment):
+    # The update skeletons are built at import, so compare against real (equal-by-value) Increment sentinels
+    with patch.object(BaseService, 'update_document', new_callable=AsyncMock) as mock_update:
         mock_update.return_value = True
         result = await profile_service.update_rating(uid, new_rating, game_result)
 
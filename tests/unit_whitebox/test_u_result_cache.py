@@ -0,0 +1,110 @@
+# Filename: tests/unit_whitebox/test_u_result_cache.py
+import asyncio
+from unittest.mock import AsyncMock
+
+import pytest
+
+from utils.result_cache import cached_result
+
+
+class _StatsService:
+    def __init__(self, backend: AsyncMock):
+        self.backend = backend
+
+    @cached_result(ttl=60)
+    async def get_stats(self, user_id: str, days: int = 30):
+        return await self.backend(user_id, days)
+
+
+@pytest.mark.asyncio
+async def test_repeat_call_served_from_cache():
+    """Test the wrapped method runs once per distinct argument set."""
+    backend = AsyncMock(side_effect=lambda user_id, days: {"user_id": user_id, "days": days})
+    service = _StatsService(backend)
+
+    first = await service.get_stats("u1", 30)
+    second = await service.get_stats("u1", 30)
+    other = await service.get_stats("u1", 7)
+
+    assert first is second
+    assert other == {"user_id": "u1", "days": 7}
+    assert backend.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_cache_is_per_instance():
+    """Test separate service instances do not share cached results."""
+    backend = AsyncMock(return_value={"total": 1})
+
+    await _StatsService(backend).get_stats("u1")
+    await _StatsService(backend).get_stats("u1")
+
+    assert backend.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_exceptions_not_cached():
+    """Test a failed call is retried on the next request."""
+    backend = AsyncMock(side_effect=[RuntimeError("firestore down"), {"total": 3}])
+    service = _StatsService(backend)
+
+    with pytest.raises(RuntimeError):
+        await service.get_stats("u1")
+    assert await service.get_stats("u1") == {"total": 3}
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_share_one_call():
+    """Test simultaneous requests for the same arguments wait on a single computation."""
+    async def slow_backend(user_id, days):
+        await asyncio.sleep(0.01)
+        return {"user_id": user_id}
+
+    backend = AsyncMock(side_effect=slow_backend)
+    service = _StatsService(backend)
+
+    results = await asyncio.gather(*(service.get_stats("u1") for _ in range(5)))
+
+    assert all(result == {"user_id": "u1"} for result in results)
+    assert backend.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_evict_drops_matching_entries():
+    """Test evict recomputes only the entries whose argument key matches the predicate."""
+    backend = AsyncMock(side_effect=lambda user_id, days: {"user_id": user_id, "days": days})
+    service = _StatsService(backend)
+    await service.get_stats("u1", 30)
+    await service.get_stats("u1", 7)
+    await service.get_stats("u2", 30)
+
+    _StatsService.get_stats.evict(service, lambda key: key[0] == "u1")
+    await service.get_stats("u1", 30)
+    await service.get_stats("u1", 7)
+    await service.get_stats("u2", 30)
+
+    assert backend.await_count == 5  # Both u1 windows recomputed; u2 still cached
+
+
+@pytest.mark.asyncio
+async def test_evict_invalidates_inflight_computation():
+    """Test a computation evicted while suspended still answers its caller but is not cached."""
+    release = asyncio.Event()
+
+    async def backend_side_effect(user_id, days):
+        if backend.await_count == 1:
+            await release.wait()  # The first computation reads "before" the write and is held here
+            return {"total": "stale"}
+        return {"total": "fresh"}
+
+    backend = AsyncMock(side_effect=backend_side_effect)
+    service = _StatsService(backend)
+
+    pending = asyncio.ensure_future(service.get_stats("u1"))
+    await asyncio.sleep(0)  # Let the computation start and suspend
+    _StatsService.get_stats.evict(service, lambda key: key[0] == "u1")
+    release.set()
+
+    assert await pending == {"total": "stale"}  # The caller that was already waiting gets its answer
+    assert await service.get_stats("u1") == {"total": "fresh"}  # ...but the next call recomputes
+    assert backend.await_count == 2
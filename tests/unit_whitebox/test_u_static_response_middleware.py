@@ -0,0 +1,47 @@
+# Filename: tests/unit_whitebox/test_u_static_response_middleware.py
+from unittest.mock import AsyncMock
+
+import orjson
+import pytest
+
+from middleware.static_response_middleware import StaticResponseMiddleware
+
+ROOT_CONTENT = {"name": "Portal Gambit Backend API", "status": "running"}
+
+
+def _scope(path="/", method="GET", headers=None):
+    return {"type": "http", "path": path, "method": method, "headers": headers or []}
+
+
+@pytest.mark.asyncio
+async def test_prebuilt_response_sent_without_calling_app():
+    """Test a configured GET path is answered from the pre-encoded body."""
+    inner_app = AsyncMock()
+    send = AsyncMock()
+    middleware = StaticResponseMiddleware(inner_app, responses={"/": ROOT_CONTENT})
+
+    await middleware(_scope(), AsyncMock(), send)
+
+    inner_app.assert_not_called()
+    start, body = (call.args[0] for call in send.await_args_list)
+    assert start["status"] == 200
+    assert (b"content-type", b"application/json") in start["headers"]
+    assert orjson.loads(body["body"]) == ROOT_CONTENT
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("scope", [
+    _scope(path="/profiles/abc"),
+    _scope(method="POST"),
+    _scope(headers=[(b"origin", b"https://example.com")]),  # CORS must still apply
+])
+async def test_other_requests_delegated(scope):
+    """Test other paths, methods and cross-origin requests fall through to the app."""
+    inner_app = AsyncMock()
+    middleware = StaticResponseMiddleware(inner_app, responses={"/": ROOT_CONTENT})
+    receive, send = AsyncMock(), AsyncMock()
+
+    await middleware(scope, receive, send)
+
+    inner_app.assert_awaited_once_with(scope, receive, send)
+    send.assert_not_called()
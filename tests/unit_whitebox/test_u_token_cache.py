@@ -0,0 +1,43 @@
+# Filename: tests/unit_whitebox/test_u_token_cache.py
+import time
+from unittest.mock import patch
+
+from utils.token_cache import TokenCache
+
+
+def test_put_then_get_returns_payload():
+    """Test a cached payload is returned for the same token."""
+    cache = TokenCache()
+    payload = {"uid": "cached_user", "exp": int(time.time()) + 600}
+    cache.put("token-a", payload)
+
+    assert cache.get("token-a") == payload
+    assert cache.get("token-b") is None
+
+
+def test_entry_expires_with_token_exp():
+    """Test an entry is dropped once the token's own exp has passed, even within the TTL."""
+    cache = TokenCache(ttl=300)
+    now = time.time()
+    cache.put("short-lived", {"uid": "u1", "exp": now + 10})
+
+    with patch("utils.token_cache.time.time", return_value=now + 11):
+        assert cache.get("short-lived") is None
+
+
+def test_expired_or_exp_less_payload_not_cached():
+    """Test payloads that are already expired or carry no exp claim are never cached."""
+    cache = TokenCache()
+    cache.put("expired", {"uid": "u1", "exp": int(time.time()) - 1})
+    cache.put("no-exp", {"uid": "u2"})
+
+    assert cache.get("expired") is None
+    assert cache.get("no-exp") is None
+
+
+def test_clear():
+    """Test clear() empties the cache."""
+    cache = TokenCache()
+    cache.put("token", {"uid": "u1", "exp": int(time.time()) + 600})
+    cache.clear()
+    assert cache.get("token") is None
@@ -1,21 +1,23 @@
 from fastapi import HTTPException, Security
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from google.cloud.firestore_v1.async_client import AsyncClient
 
-from config.firebase_config import initialize_firebase
+from config.firebase_config import get_db
 from schemas.auth_schemas import TokenData
 from services.analytics_service import AnalyticsService
 from services.friend_service import FriendService
 from services.history_service import HistoryService
 from services.profile_service import ProfileService
-from utils.jwt_utils import verify_token
+from utils.jwt_utils import verify_token_async
 
-# Initialize Firebase and get Firestore client
-db_client = initialize_firebase()
+# Initialize Firebase and get the shared Firestore client
+# (one AsyncClient per process: every service, and every collection, shares its gRPC channels)
+db_client = get_db()
 
-# Initialize services
+# Initialize services once; they are reused across requests
 profile_service = ProfileService(db_client)
 friend_service = FriendService(db_client)
-history_service = HistoryService(db_client)
+history_service = HistoryService(db_client, profile_service=profile_service)
 analytics_service = AnalyticsService(db_client)
 
 # Security scheme
@@ -25,8 +27,9 @@ security = HTTPBearer()
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Security(security)) -> TokenData:
     """Verify JWT token and return user data."""
     try:
-        payload = verify_token(credentials.credentials)
-        return TokenData(
+        payload = await verify_token_async(credentials.credentials)
+        # Claims come from our own signature-verified token, so skip re-validating them on every request
+        return TokenData.model_construct(
             uid=payload["uid"],
             email=payload.get("email"),
             email_verified=payload.get("email_verified", False)
@@ -39,21 +42,28 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Security(
         )
 
 
-def get_profile_service() -> ProfileService:
+# Provider dependencies are async so FastAPI calls them inline instead of via the threadpool
+
+async def get_db_client() -> AsyncClient:
+    """Dependency for the shared Firestore client (never build a per-collection client)."""
+    return db_client
+
+
+async def get_profile_service() -> ProfileService:
     """Dependency for profile service."""
     return profile_service
 
 
-def get_friend_service() -> FriendService:
+async def get_friend_service() -> FriendService:
     """Dependency for friend service."""
     return friend_service
 
 
-def get_history_service() -> HistoryService:
+async def get_history_service() -> HistoryService:
     """Dependency for history service."""
     return history_service
 
 
-def get_analytics_service() -> AnalyticsService:
+async def get_analytics_service() -> AnalyticsService:
     """Dependency for analytics service."""
     return analytics_service
@@ -1,12 +1,22 @@
+import asyncio
 import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone  # Use timezone-aware objects
-from typing import Optional
+from typing import Optional, Dict
 
+import firebase_admin
+import requests
 from dotenv import load_dotenv
 from fastapi import HTTPException
 from jose import JWTError, jwt
 
-load_dotenv()
+from utils.token_cache import TokenCache
+
+if not os.getenv("DISABLE_DOTENV"):
+    load_dotenv()
 
 # Get JWT settings from environment variables
 SECRET_KEY = os.getenv("JWT_SECRET_KEY")
@@ -16,6 +26,64 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 60  # 1 hour
 if not SECRET_KEY:
     raise ValueError("JWT_SECRET_KEY must be set in environment variables")
 
+# Verified access-token payloads, so repeat requests skip signature verification
+JWT_CACHE_TTL = int(os.getenv("JWT_CACHE_TTL", "300"))  # Seconds; entries never outlive the token's exp
+_token_cache = TokenCache(ttl=JWT_CACHE_TTL)
+# Verified Firebase ID-token claims, so clients re-presenting a token skip the RSA check
+_firebase_token_cache = TokenCache(maxsize=5_000)
+
+# Signature checks are CPU-bound; the async wrappers below run them here, off the event loop
+_VERIFY_POOL = ThreadPoolExecutor(max_workers=32, thread_name_prefix="token-verify")
+
+# Firebase ID tokens are RS256 JWTs signed by one of Google's rotating securetoken keys
+FIREBASE_CERTS_URL = "https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com"
+FIREBASE_ISSUER_PREFIX = "https://securetoken.google.com/"
+FIREBASE_CERTS_DEFAULT_MAX_AGE = 6 * 60 * 60  # Used when the response has no Cache-Control max-age
+FIREBASE_CERTS_MIN_REFRESH_INTERVAL = 60  # Don't let unknown 'kid's trigger a fetch storm
+_MAX_AGE_PATTERN = re.compile(r"max-age=(\d+)")
+# Allowed clock drift on 'iat'/'exp'/'auth_time'; firebase_admin.auth.verify_id_token's clock_skew_seconds default
+FIREBASE_CLOCK_SKEW_SECONDS = 0
+
+
+class _FirebaseCertCache:
+    """Google's x509 signing certificates for Firebase ID tokens, keyed by 'kid'."""
+
+    def __init__(self, url: str):
+        self.url = url
+        self._certs: Dict[str, str] = {}
+        self._expires_at = 0.0
+        self._fetched_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self, kid: str) -> Optional[str]:
+        """Return the PEM certificate for a key id, refreshing the set when stale."""
+        now = time.time()
+        if now >= self._expires_at or (
+                kid not in self._certs and now - self._fetched_at >= FIREBASE_CERTS_MIN_REFRESH_INTERVAL):
+            self._refresh()
+        return self._certs.get(kid)
+
+    def _refresh(self) -> None:
+        with self._lock:
+            now = time.time()
+            if now - self._fetched_at < FIREBASE_CERTS_MIN_REFRESH_INTERVAL and now < self._expires_at:
+                return  # Another thread refreshed while we waited
+            response = requests.get(self.url, timeout=10)
+            response.raise_for_status()
+            match = _MAX_AGE_PATTERN.search(response.headers.get("Cache-Control", ""))
+            max_age = int(match.group(1)) if match else FIREBASE_CERTS_DEFAULT_MAX_AGE
+            self._certs = response.json()
+            self._fetched_at = now
+            self._expires_at = now + max_age
+
+
+_firebase_certs = _FirebaseCertCache(FIREBASE_CERTS_URL)
+
+
+def _firebase_project_id() -> str:
+    """Project ID that Firebase ID tokens must be issued for."""
+    return os.getenv("FIREBASE_PROJECT_ID") or firebase_admin.get_app().project_id
+
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create a new JWT access token."""
@@ -38,6 +106,10 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
 
 def verify_token(token: str) -> dict:
     """Verify a JWT token and return its payload."""
+    cached_payload = _token_cache.get(token)
+    if cached_payload is not None:
+        return cached_payload
+
     try:
         # Decode the token, ignoring audience verification for internal use
         # Explicitly pass options to disable audience verification
@@ -53,6 +125,7 @@ def verify_token(token: str) -> dict:
         # exp = payload.get("exp")
         # if exp is None or datetime.fromtimestamp(exp, timezone.utc) < datetime.now(timezone.utc):
         #     raise ExpiredSignatureError("Token has expired.")
+        _token_cache.put(token, payload)
         return payload
     except JWTError as e:  # Catch specific JOSE errors first
         raise HTTPException(
@@ -68,6 +141,67 @@ def verify_token(token: str) -> dict:
         )
 
 
+async def verify_token_async(token: str) -> dict:
+    """Async verify_token: cache hits return inline, misses are verified on the worker pool."""
+    cached_payload = _token_cache.get(token)
+    if cached_payload is not None:
+        return cached_payload
+    return await asyncio.get_running_loop().run_in_executor(_VERIFY_POOL, verify_token, token)
+
+
+def verify_firebase_token(token: str) -> dict:
+    """Verify a Firebase ID token locally and return its claims.
+
+    Checks what firebase_admin.auth.verify_id_token checks when check_revoked is off: the RS256
+    signature against Google's x509 signing certificates, audience, issuer, expiry, an 'iat' and
+    'auth_time' that aren't in the future, and the subject, with the SDK's default clock skew.
+    The certificates are cached, so no network round trip is needed per call. Raises JWTError on
+    an invalid token, and the requests error if the certificates can't be fetched.
+    """
+    cached_payload = _firebase_token_cache.get(token)
+    if cached_payload is not None:
+        return cached_payload
+
+    header = jwt.get_unverified_header(token)
+    if header.get("alg") != "RS256":
+        raise JWTError(f"Unexpected algorithm '{header.get('alg')}' in Firebase ID token.")
+    cert = _firebase_certs.get(header.get("kid"))
+    if cert is None:
+        raise JWTError("Firebase ID token has no valid 'kid' claim.")
+
+    project_id = _firebase_project_id()
+    payload = jwt.decode(
+        token,
+        cert,
+        algorithms=["RS256"],
+        audience=project_id,
+        issuer=FIREBASE_ISSUER_PREFIX + project_id,
+        options={"leeway": FIREBASE_CLOCK_SKEW_SECONDS},
+    )
+    subject = payload.get("sub")
+    if not subject or len(subject) > 128:
+        raise JWTError("Firebase ID token has an invalid 'sub' claim.")
+    # jose only checks that 'iat' is numeric, not that it has passed
+    latest_valid = time.time() + FIREBASE_CLOCK_SKEW_SECONDS
+    issued_at = payload.get("iat")
+    if not isinstance(issued_at, (int, float)) or issued_at > latest_valid:
+        raise JWTError("Firebase ID token has a missing or future 'iat' claim.")
+    if payload.get("auth_time", 0) > latest_valid:
+        raise JWTError("Firebase ID token has an 'auth_time' in the future.")
+    # Match the shape returned by firebase_admin.auth.verify_id_token
+    payload["uid"] = subject
+    _firebase_token_cache.put(token, payload)
+    return payload
+
+
+async def verify_firebase_token_async(token: str) -> dict:
+    """Async verify_firebase_token: cache hits return inline, misses run on the worker pool."""
+    cached_payload = _firebase_token_cache.get(token)
+    if cached_payload is not None:
+        return cached_payload
+    return await asyncio.get_running_loop().run_in_executor(_VERIFY_POOL, verify_firebase_token, token)
+
+
 def create_tokens_for_user(firebase_user: dict) -> dict:
     """Create access token from Firebase user data."""
     # Extract relevant user data
@@ -0,0 +1,13 @@
+from typing import Any
+
+from fastapi import Response
+from pydantic import TypeAdapter
+
+
+def validated_json_response(adapter: TypeAdapter, content: Any) -> Response:
+    """Serialize content that is already validated (e.g. models built by a service) in one pass.
+
+    Returning a Response bypasses FastAPI's response_model re-validation and jsonable_encoder;
+    keep response_model on the route so the OpenAPI schema is unchanged.
+    """
+    return Response(content=adapter.dump_json(content), media_type="application/json")
@@ -0,0 +1,68 @@
+import asyncio
+import functools
+from typing import Any, Awaitable, Callable, TypeVar
+
+from cachetools import TTLCache
+from cachetools.keys import hashkey
+
+T = TypeVar("T")
+
+
+def cached_result(ttl: int, maxsize: int = 256) -> Callable[[Callable[..., Awaitable[T]]], Callable[..., Awaitable[T]]]:
+    """Cache an async service method's result for `ttl` seconds, keyed by its arguments.
+
+    For read-only endpoints that tolerate slightly stale data. Each service instance gets
+    its own cache, created on first call; all access happens on the event loop, so no lock
+    is needed. Concurrent misses for the same arguments share one call (single flight).
+    Exceptions are not cached. Writers can drop stale entries with
+    `Service.method.evict(self, predicate)`, where predicate receives each cached argument key;
+    a matching computation still in flight finishes for its waiters but its result is not cached.
+    """
+
+    def decorator(method: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
+        cache_attr = f"_{method.__name__}_results"
+        inflight_attr = f"_{method.__name__}_inflight"
+
+        @functools.wraps(method)
+        async def wrapper(self, *args: Any, **kwargs: Any) -> T:
+            cache = self.__dict__.get(cache_attr)
+            if cache is None:
+                cache = self.__dict__[cache_attr] = TTLCache(maxsize=maxsize, ttl=ttl)
+            key = hashkey(*args, **kwargs)
+            try:
+                return cache[key]
+            except KeyError:
+                pass
+
+            inflight = self.__dict__.setdefault(inflight_attr, {})
+            task = inflight.get(key)
+            if task is None:
+                async def compute() -> T:
+                    try:
+                        result = await method(self, *args, **kwargs)
+                        if inflight.get(key) is task:  # Not evicted while running, so the result is current
+                            cache[key] = result
+                        return result
+                    finally:
+                        if inflight.get(key) is task:  # Leave a newer computation started after an evict alone
+                            del inflight[key]
+
+                task = inflight[key] = asyncio.ensure_future(compute())
+            # Shielded, so one cancelled caller doesn't cancel the computation the others are waiting on
+            return await asyncio.shield(task)
+
+        def evict(self, predicate: Callable[[tuple], bool]) -> None:
+            cache = self.__dict__.get(cache_attr)
+            if cache:
+                for key in [key for key in cache if predicate(key)]:
+                    cache.pop(key, None)
+            # A computation that started before the write may have read the old data; don't let it be cached
+            inflight = self.__dict__.get(inflight_attr)
+            if inflight:
+                for key in [key for key in inflight if predicate(key)]:
+                    del inflight[key]
+
+        wrapper.evict = evict
+        return wrapper
+
+    return decorator
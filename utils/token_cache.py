@@ -0,0 +1,53 @@
+import hashlib
+import threading
+import time
+from typing import Optional
+
+from cachetools import TTLCache
+
+DEFAULT_MAX_SIZE = 10_000
+DEFAULT_TTL_SECONDS = 300
+
+
+class TokenCache:
+    """In-process LRU+TTL cache of verified token payloads.
+
+    Entries are keyed by a short digest of the raw token (the token itself is never
+    stored) and expire at the earlier of the cache TTL and the token's own 'exp' claim.
+    """
+
+    def __init__(self, maxsize: int = DEFAULT_MAX_SIZE, ttl: int = DEFAULT_TTL_SECONDS):
+        self.ttl = ttl
+        self._cache: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()  # TTLCache is not thread-safe
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.blake2b(token.encode(), digest_size=16).digest()
+
+    def get(self, token: str) -> Optional[dict]:
+        """Return the cached payload for a token, or None if absent or expired."""
+        key = self._key(token)
+        with self._lock:
+            entry = self._cache.get(key)
+        if entry is None:
+            return None
+        payload, expires_at = entry
+        if expires_at <= time.time():
+            with self._lock:
+                self._cache.pop(key, None)
+            return None
+        return payload
+
+    def put(self, token: str, payload: dict) -> None:
+        """Cache a verified payload until min(exp, now + ttl)."""
+        now = time.time()
+        expires_at = min(payload.get("exp", 0), now + self.ttl)
+        if expires_at <= now:
+            return  # Already expired (or no exp claim); nothing worth caching
+        with self._lock:
+            self._cache[self._key(token)] = (payload, expires_at)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()